@@ -1,11 +1,20 @@
 from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
 
 import anthropic
+import httpx
+from anthropic.types import CacheControlEphemeralParam
 from anthropic.types import MessageParam
 from anthropic.types import ModelParam
 from anthropic.types import TextBlock
+from anthropic.types import TextBlockParam
 
 from dotchatbot.client.services import ServiceClient
+from dotchatbot.client.services import Usage
+from dotchatbot.client.transport import http_client
+from dotchatbot.input.include import split_includes
 from dotchatbot.input.transformer import Message
 
 
@@ -24,34 +33,91 @@ def _message_param(
         raise ValueError(f"Invalid role: {message.role}")
 
 
+def _message_params(messages: List[Message]) -> List[MessageParam]:
+    """
+    Included files are sent inline in every request (the SDK has no file
+    API), with a cache breakpoint after the last one so that the
+    conversation up to it is served from the prompt cache on later turns.
+    """
+    params: List[MessageParam] = []
+    last_include: Optional[TextBlockParam] = None
+    for message in messages:
+        if message.role != "user" or not message.includes:
+            params.append(_message_param(message))
+            continue
+        blocks: List[TextBlockParam] = []
+        for part in split_includes(message.content, message.directory):
+            if isinstance(part, str):
+                blocks.append(TextBlockParam(type="text", text=part))
+            else:
+                last_include = TextBlockParam(type="text", text=part.inline())
+                blocks.append(last_include)
+        params.append(MessageParam(content=blocks, role="user"))
+    if last_include is not None:
+        last_include["cache_control"] = CacheControlEphemeralParam(
+            type="ephemeral"
+        )
+    return params
+
+
 class Anthropic(ServiceClient):
     def __init__(
         self,
         system_prompt: str,
         api_key: str,
         max_tokens: int,
-        model: ModelParam
+        model: ModelParam,
+        client: Optional[httpx.Client] = None,
+        base_url: Optional[str] = None,
+        max_retries: Optional[int] = None
     ):
         super().__init__(system_prompt=system_prompt)
         self.model = model
-        self.client = anthropic.Anthropic(api_key=api_key)
+        self.client = anthropic.Anthropic(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=client or http_client("Anthropic"),
+            max_retries=(
+                anthropic.DEFAULT_MAX_RETRIES if max_retries is None
+                else max_retries
+            )
+        )
         self.max_tokens = max_tokens
 
     def create_chat_completion(self, messages: list[Message]) -> Message:
-        messages: Iterable[MessageParam] = map(
-            _message_param, messages
-        )
-        response = self.client.messages.create(
-            max_tokens=self.max_tokens, messages=messages, model=self.model
-        )
+        messages: Iterable[MessageParam] = _message_params(messages)
+        with self.timed():
+            response = self.client.messages.create(
+                max_tokens=self.max_tokens, messages=messages, model=self.model
+            )
         if not response.content or type(response.content[0]) is not TextBlock:
             raise ValueError(
                 "Unexpected response: {}".format(response.content)
             )
         content = response.content[0].text
         role = response.role
+        self.usage = Usage(
+            input_tokens=response.usage.input_tokens,
+            output_tokens=response.usage.output_tokens
+        )
 
         if not content:
             raise ValueError("Empty response")
 
         return Message(role=role, content=content)
+
+    def stream_chat_completion(
+        self, messages: list[Message]
+    ) -> Iterator[str]:
+        params = _message_params(messages)
+        with self.timed(), self.client.messages.stream(
+            max_tokens=self.max_tokens,
+            messages=params,
+            model=self.model
+        ) as stream:
+            yield from stream.text_stream
+            usage = stream.get_final_message().usage
+        self.usage = Usage(
+            input_tokens=usage.input_tokens,
+            output_tokens=usage.output_tokens
+        )
@@ -0,0 +1,340 @@
+import hashlib
+import json
+import os
+import time
+from abc import ABC
+from abc import abstractmethod
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Literal
+from typing import Optional
+from typing import Tuple
+from typing import TYPE_CHECKING
+
+from dotchatbot.client.services import ServiceClient
+from dotchatbot.input.parser import Parser
+from dotchatbot.input.transformer import Message
+from dotchatbot.input.transformer import resolve_includes
+from dotchatbot.output.atomic import atomic_write
+from dotchatbot.output.store import is_manifest
+
+if TYPE_CHECKING:
+    from dotchatbot.client.anthropic import Anthropic
+    from dotchatbot.client.openai import OpenAI
+
+BatchServiceName = Literal["OpenAI", "Anthropic"]
+
+OPENAI_DONE = ("completed", "failed", "expired", "cancelled")
+
+
+@dataclass
+class Result:
+    custom_id: str
+    message: Optional[Message] = None
+    error: Optional[str] = None
+
+
+class BatchClient(ABC):
+    """Submits conversations to a provider batch API and collects them"""
+
+    @abstractmethod
+    def submit(self, requests: Dict[str, List[Message]]) -> str:
+        """Submits a job answering each conversation, returns its ID"""
+
+    @abstractmethod
+    def poll(self, job_id: str) -> Tuple[str, bool]:
+        """The status of a job, and whether it is done"""
+
+    @abstractmethod
+    def results(self, job_id: str) -> Iterator[Result]: ...
+
+
+class OpenAIBatch(BatchClient):
+    def __init__(self, client: "OpenAI") -> None:
+        self.client = client
+
+    def submit(self, requests: Dict[str, List[Message]]) -> str:
+        lines = (
+            json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.client.model,
+                    "messages": self.client._request(messages)
+                }
+            }) + "\n"
+            for custom_id, messages in requests.items()
+        )
+        file = self.client.client.files.create(
+            file=("batch.jsonl", "".join(lines).encode("utf-8")),
+            purpose="batch"
+        )
+        batch = self.client.client.batches.create(
+            input_file_id=file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        return batch.id
+
+    def poll(self, job_id: str) -> Tuple[str, bool]:
+        status = self.client.client.batches.retrieve(job_id).status
+        return status, status in OPENAI_DONE
+
+    def results(self, job_id: str) -> Iterator[Result]:
+        """Results of the requests that finished, even if the job did not"""
+        batch = self.client.client.batches.retrieve(job_id)
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = self.client.client.files.content(file_id).text
+            for line in content.splitlines():
+                if line.strip():
+                    yield _openai_result(json.loads(line))
+
+
+def _openai_result(line: Dict[str, Any]) -> Result:
+    custom_id = line["custom_id"]
+    response = line.get("response") or {}
+    body = response.get("body") or {}
+    if line.get("error"):
+        return Result(custom_id, error=line["error"].get("message"))
+    if response.get("status_code") != 200:
+        error = body.get("error") or {}
+        return Result(
+            custom_id,
+            error=error.get("message") or f"HTTP {response.get('status_code')}"
+        )
+    message = body["choices"][0]["message"]
+    if not message.get("content"):
+        return Result(custom_id, error="Empty response")
+    return Result(
+        custom_id, message=Message(message["role"], message["content"])
+    )
+
+
+class AnthropicBatch(BatchClient):
+    def __init__(self, client: "Anthropic") -> None:
+        self.client = client
+
+    def submit(self, requests: Dict[str, List[Message]]) -> str:
+        from dotchatbot.client.anthropic import _message_params
+        batch = self.client.client.messages.batches.create(requests=[
+            {
+                "custom_id": custom_id,
+                "params": {
+                    "max_tokens": self.client.max_tokens,
+                    "messages": _message_params(messages),
+                    "model": self.client.model,
+                }
+            }
+            for custom_id, messages in requests.items()
+        ])
+        return batch.id
+
+    def poll(self, job_id: str) -> Tuple[str, bool]:
+        batch = self.client.client.messages.batches.retrieve(job_id)
+        return batch.processing_status, batch.processing_status == "ended"
+
+    def results(self, job_id: str) -> Iterator[Result]:
+        for response in self.client.client.messages.batches.results(job_id):
+            result = response.result
+            if result.type == "errored":
+                yield Result(
+                    response.custom_id, error=result.error.error.message
+                )
+            elif result.type != "succeeded":
+                yield Result(response.custom_id, error=result.type)
+            elif (
+                not result.message.content
+                or result.message.content[0].type != "text"
+                or not result.message.content[0].text
+            ):
+                yield Result(response.custom_id, error="Empty response")
+            else:
+                yield Result(
+                    response.custom_id,
+                    message=Message(
+                        result.message.role, result.message.content[0].text
+                    )
+                )
+
+
+def batch_client(client: ServiceClient) -> BatchClient:
+    # the SDKs are imported on first use, like in the client factory
+    from dotchatbot.client.anthropic import Anthropic
+    from dotchatbot.client.openai import OpenAI
+    if isinstance(client, OpenAI):
+        return OpenAIBatch(client)
+    elif isinstance(client, Anthropic):
+        return AnthropicBatch(client)
+    else:
+        raise ValueError(
+            f"Batches are not supported by {type(client).__name__}"
+        )
+
+
+def session_files(paths: Iterable[str], extension: str) -> Iterator[str]:
+    """The given files, and the session files in the given directories"""
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(extension):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def _read(filename: str) -> Tuple[str, str]:
+    with open(filename, "rb") as f:
+        data = f.read()
+    return data.decode("utf-8"), hashlib.sha256(data).hexdigest()
+
+
+@dataclass
+class Job:
+    id: str
+    service_name: str
+    created: float
+    # custom ID of each request: the session file and its digest
+    sessions: Dict[str, Tuple[str, str]] = field(default_factory=dict)
+    status: str = "submitted"
+
+
+@dataclass
+class Answer:
+    filename: str
+    # the session with its response, if it got one
+    messages: List[Message]
+    error: Optional[str] = None
+
+
+class BatchJobs:
+    """
+    Batch jobs submitted from session files, tracked in a JSON file until
+    their responses are written back to the sessions.
+    """
+
+    def __init__(self, filename: str, parser: Parser) -> None:
+        self.filename = filename
+        self.parser = parser
+        self._jobs: Optional[List[Job]] = None
+
+    @property
+    def jobs(self) -> List[Job]:
+        if self._jobs is None:
+            self._jobs = []
+            if os.path.exists(self.filename):
+                with open(self.filename, "r") as f:
+                    for job in json.load(f):
+                        job["sessions"] = {
+                            custom_id: tuple(session)
+                            for custom_id, session in job["sessions"].items()
+                        }
+                        self._jobs.append(Job(**job))
+        return self._jobs
+
+    def _save(self) -> None:
+        with atomic_write(self.filename) as f:
+            json.dump([asdict(job) for job in self.jobs], f, indent=2)
+
+    def pending(
+        self, filenames: Iterable[str]
+    ) -> Iterator[Tuple[str, str, List[Message]]]:
+        """
+        Sessions that end in a user message and are not already part of a
+        job, with their digest and messages
+        """
+        submitted = {
+            session for job in self.jobs for session in job.sessions.values()
+        }
+        for filename in dict.fromkeys(map(os.path.abspath, filenames)):
+            if is_manifest(filename):
+                continue
+            text, digest = _read(filename)
+            if (filename, digest) in submitted:
+                continue
+            messages = resolve_includes(
+                self.parser.parse(text), os.path.dirname(filename)
+            )
+            if (
+                messages
+                and messages[-1].role == "user"
+                and messages[-1].content.strip()
+            ):
+                yield filename, digest, messages
+
+    def submit(
+        self, service_name: str, client: BatchClient, filenames: Iterable[str]
+    ) -> Optional[Job]:
+        """Submits the pending sessions as one job, if there are any"""
+        sessions: Dict[str, Tuple[str, str]] = {}
+        requests: Dict[str, List[Message]] = {}
+        for index, (filename, digest, messages) in enumerate(
+            self.pending(filenames)
+        ):
+            custom_id = f"session-{index}"
+            sessions[custom_id] = (filename, digest)
+            requests[custom_id] = messages
+        if not requests:
+            return None
+        job = Job(
+            id=client.submit(requests),
+            service_name=service_name,
+            created=time.time(),
+            sessions=sessions
+        )
+        self.jobs.append(job)
+        self._save()
+        return job
+
+    def poll(self, clients: Callable[[str], BatchClient]) -> Iterator[Job]:
+        """Updates the status of every job"""
+        for job in self.jobs:
+            job.status, _ = clients(job.service_name).poll(job.id)
+            yield job
+        self._save()
+
+    def collect(
+        self, clients: Callable[[str], BatchClient]
+    ) -> Iterator[Answer]:
+        """
+        The responses of the jobs that are done, with the sessions they
+        answer re-read from disk. Sessions that changed since they were
+        submitted are not answered. Jobs are forgotten once collected.
+        """
+        for job in list(self.jobs):
+            client = clients(job.service_name)
+            job.status, done = client.poll(job.id)
+            if not done:
+                continue
+            answered = set()
+            for result in client.results(job.id):
+                if result.custom_id not in job.sessions:
+                    continue
+                answered.add(result.custom_id)
+                filename, digest = job.sessions[result.custom_id]
+                yield self._answer(filename, digest, result)
+            for custom_id in job.sessions.keys() - answered:
+                filename, _ = job.sessions[custom_id]
+                yield Answer(filename, [], f"No result ({job.status})")
+            self.jobs.remove(job)
+            self._save()
+        self._save()
+
+    def _answer(self, filename: str, digest: str, result: Result) -> Answer:
+        if result.message is None:
+            return Answer(filename, [], result.error)
+        if not os.path.exists(filename):
+            return Answer(filename, [], "Session file was removed")
+        text, current = _read(filename)
+        if current != digest:
+            return Answer(filename, [], "Session changed since it was sent")
+        return Answer(filename, [*self.parser.parse(text), result.message])
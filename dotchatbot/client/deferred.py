@@ -0,0 +1,36 @@
+from concurrent.futures import Future
+from typing import Iterator
+from typing import List
+
+from dotchatbot.client.services import ServiceClient
+from dotchatbot.input.transformer import Message
+
+
+class Deferred(ServiceClient):
+    """
+    A client that is still being set up in the background; requests wait
+    for the setup to finish and raise its error if it failed.
+    """
+
+    def __init__(
+        self, system_prompt: str, future: "Future[ServiceClient]"
+    ) -> None:
+        super().__init__(system_prompt=system_prompt)
+        self.future = future
+
+    @property
+    def client(self) -> ServiceClient:
+        return self.future.result()
+
+    def create_chat_completion(self, messages: List[Message]) -> Message:
+        self.usage = self.latency = None
+        message = self.client.create_chat_completion(messages)
+        self.copy_stats(self.client)
+        return message
+
+    def stream_chat_completion(
+        self, messages: List[Message]
+    ) -> Iterator[str]:
+        self.usage = self.latency = None
+        yield from self.client.stream_chat_completion(messages)
+        self.copy_stats(self.client)
@@ -1,41 +1,61 @@
 from typing import Literal
+from typing import Optional
+from typing import TYPE_CHECKING
 
-from anthropic.types import ModelParam
-from openai.types import ChatModel
-
-from dotchatbot.client.anthropic import Anthropic
-from dotchatbot.client.google import Google
-from dotchatbot.client.openai import OpenAI
 from dotchatbot.client.services import ServiceClient
 
+if TYPE_CHECKING:
+    from anthropic.types import ModelParam
+    from openai.types import ChatModel
+
 ServiceName = Literal["OpenAI", "Anthropic", "Google",]
+SummaryServiceName = Literal[ServiceName, "Local"]
 
 
 def create_client(
-    service_name: ServiceName,
+    service_name: SummaryServiceName,
     system_prompt: str,
     api_key: str,
-    openai_model: ChatModel,
-    anthropic_model: ModelParam,
+    openai_model: "ChatModel",
+    anthropic_model: "ModelParam",
     anthropic_max_tokens: int,
     google_model: str,
+    base_url: Optional[str] = None,
+    max_retries: Optional[int] = None,
 ) -> ServiceClient:
+    """
+    ``max_retries`` overrides the retries of the SDK, e.g. 0 when the
+    caller retries rate limited requests itself
+    """
+    # the SDKs are imported on first use, they take most of the startup time
     if service_name == "OpenAI":
+        from dotchatbot.client.openai import OpenAI
         return OpenAI(
-            api_key=api_key, system_prompt=system_prompt, model=openai_model
+            api_key=api_key,
+            system_prompt=system_prompt,
+            model=openai_model,
+            base_url=base_url,
+            max_retries=max_retries
         )
     elif service_name == "Anthropic":
+        from dotchatbot.client.anthropic import Anthropic
         return Anthropic(
             api_key=api_key,
             system_prompt=system_prompt,
             model=anthropic_model,
-            max_tokens=anthropic_max_tokens
+            max_tokens=anthropic_max_tokens,
+            base_url=base_url,
+            max_retries=max_retries
         )
     elif service_name == "Google":
+        from dotchatbot.client.google import Google
         return Google(
             api_key=api_key,
             system_prompt=system_prompt,
             model=google_model,
         )
+    elif service_name == "Local":
+        from dotchatbot.client.local import Local
+        return Local(system_prompt=system_prompt)
     else:
         raise ValueError(f"Invalid service name: {service_name}")
@@ -0,0 +1,57 @@
+import time
+from concurrent.futures import as_completed
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+from dotchatbot.client.services import ServiceClient
+from dotchatbot.client.services import Usage
+from dotchatbot.input.transformer import Message
+
+
+@dataclass
+class FanOutResult:
+    label: str
+    latency: float
+    message: Optional[Message] = None
+    usage: Optional[Usage] = None
+    error: Optional[Exception] = None
+
+
+def _complete(
+    label: str, client: ServiceClient, messages: List[Message]
+) -> FanOutResult:
+    start = time.perf_counter()
+    try:
+        message = client.create_chat_completion(messages)
+    except Exception as e:
+        return FanOutResult(
+            label=label, latency=time.perf_counter() - start, error=e
+        )
+    return FanOutResult(
+        label=label,
+        latency=time.perf_counter() - start,
+        message=message,
+        usage=client.usage
+    )
+
+
+def fan_out(
+    clients: Dict[str, ServiceClient], messages: List[Message]
+) -> Iterator[FanOutResult]:
+    """
+    Sends the same messages to every client concurrently, yielding the
+    results in the order they complete.
+    """
+    if not clients:
+        return
+    with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+        futures = [
+            executor.submit(_complete, label, client, list(messages))
+            for label, client in clients.items()
+        ]
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import time
+from typing import Callable
+from typing import ContextManager
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+import click
+
+from dotchatbot.input.include import Include
+from dotchatbot.output.atomic import atomic_write
+from dotchatbot.output.atomic import locked
+
+DEFAULT_FILE_CACHE = os.path.join(
+    click.get_app_dir("dotchatbot"), "files.json"
+)
+
+# uploads this close to expiring are uploaded again
+EXPIRY_MARGIN = 300
+
+Upload = Callable[[Include], Tuple[str, Optional[float]]]
+
+
+def account(service: str, api_key: str) -> str:
+    """
+    The cache key of the files of an account: file IDs are only valid for
+    the API key (or one of the same account) they were uploaded with.
+    """
+    digest = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    return f"{service}:{digest}"
+
+
+class FileCache:
+    """
+    Remembers which provider file ID each included file (by content digest)
+    was uploaded as, so every file is uploaded once per account (see
+    ``account``). The cache file is locked while it is updated, as every
+    client (and process) that includes files shares it, but not during
+    uploads: a file uploaded by two processes at once is uploaded twice,
+    and both use the ID stored first.
+    """
+
+    def __init__(self, filename: str = DEFAULT_FILE_CACHE) -> None:
+        self.filename = filename
+
+    def _locked(self) -> ContextManager[None]:
+        return locked(f"{self.filename}.lock")
+
+    def _load(self) -> Dict[str, Dict[str, Dict]]:
+        if not os.path.exists(self.filename):
+            return {}
+        with open(self.filename, "r") as f:
+            return json.load(f)
+
+    def _save(self, entries: Dict[str, Dict[str, Dict]]) -> None:
+        with atomic_write(self.filename) as f:
+            json.dump(entries, f)
+
+    def get(self, service: str, digest: str) -> Optional[str]:
+        # the cache file is replaced atomically, reading needs no lock
+        entry = self._load().get(service, {}).get(digest)
+        if not entry:
+            return None
+        expires = entry.get("expires")
+        if expires and expires - EXPIRY_MARGIN < time.time():
+            return None
+        return entry["id"]
+
+    def _set(
+        self,
+        service: str,
+        digest: str,
+        file_id: str,
+        expires: Optional[float]
+    ) -> None:
+        entries = self._load()
+        entries.setdefault(service, {})[digest] = {
+            "id": file_id, "expires": expires
+        }
+        self._save(entries)
+
+    def set(
+        self,
+        service: str,
+        digest: str,
+        file_id: str,
+        expires: Optional[float] = None
+    ) -> None:
+        with self._locked():
+            self._set(service, digest, file_id, expires)
+
+    def upload(self, service: str, include: Include, upload: Upload) -> str:
+        file_id = self.get(service, include.digest)
+        if file_id:
+            return file_id
+        uploaded, expires = upload(include)
+        with self._locked():
+            # someone else may have uploaded it in the meantime
+            file_id = self.get(service, include.digest)
+            if not file_id:
+                file_id = uploaded
+                self._set(service, include.digest, file_id, expires)
+        return file_id
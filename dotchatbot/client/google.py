@@ -1,10 +1,24 @@
-from typing import Iterable
+import io
+from typing import Iterator
 from typing import List
+from typing import Optional
+from typing import Tuple
 
 from google.genai import Client
 from google.genai.types import GenerateContentConfig
+from google.genai.types import GenerateContentResponse
+from google.genai.types import HttpOptions
+from google.genai.types import Part
+from google.genai.types import UploadFileConfig
 
+from dotchatbot.client.files import account
+from dotchatbot.client.files import FileCache
 from dotchatbot.client.services import ServiceClient
+from dotchatbot.client.services import Usage
+from dotchatbot.client.transport import options
+from dotchatbot.client.transport import transport
+from dotchatbot.input.include import Include
+from dotchatbot.input.include import split_includes
 from dotchatbot.input.transformer import Message
 
 
@@ -14,31 +28,104 @@ def _message_param(
     return message.content
 
 
+def _mime_type(include: Include) -> str:
+    if include.mime_type.startswith("text/"):
+        return "text/plain"
+    return include.mime_type
+
+
 class Google(ServiceClient):
     def __init__(
         self,
         system_prompt: str,
         api_key: str,
-        model: str
+        model: str,
+        file_cache: Optional[FileCache] = None
     ):
         super().__init__(system_prompt=system_prompt)
         self.model = model
-        self.client = Client(api_key=api_key)
+        self.client = Client(
+            api_key=api_key,
+            http_options=HttpOptions(
+                client_args={"transport": transport("Google")},
+                timeout=int(options().timeout * 1000)
+            )
+        )
         self.config = GenerateContentConfig(
             system_instruction=system_prompt
         )
+        self.file_cache = file_cache or FileCache()
+        self.account = account("Google", api_key)
 
-    def create_chat_completion(self, messages: list[Message]) -> Message:
-        messages: Iterable[str] = map(_message_param, messages)
-        messages: List[str] = list(messages)
-        response = self.client.models.generate_content(
-            model=self.model,
-            config=self.config,
-            contents=messages,
+    def _upload(self, include: Include) -> Tuple[str, Optional[float]]:
+        file = self.client.files.upload(
+            file=io.BytesIO(include.data),
+            config=UploadFileConfig(
+                mime_type=_mime_type(include), display_name=include.name
+            )
         )
+        if not file.uri:
+            raise ValueError(f"Upload failed: {include.path}")
+        expires = None
+        if file.expiration_time:
+            expires = file.expiration_time.timestamp()
+        return file.uri, expires
+
+    def _parts(self, message: Message) -> List[str | Part]:
+        """Included files are uploaded once and referenced by URI"""
+        if message.role != "user" or not message.includes:
+            return [_message_param(message)]
+        parts: List[str | Part] = []
+        for part in split_includes(message.content, message.directory):
+            if isinstance(part, str):
+                parts.append(part)
+            else:
+                parts.append(Part.from_uri(
+                    file_uri=self.file_cache.upload(
+                        self.account, part, self._upload
+                    ),
+                    mime_type=_mime_type(part)
+                ))
+        return parts
+
+    def _contents(self, messages: list[Message]) -> List[str | Part]:
+        return [part for m in messages for part in self._parts(m)]
+
+    def _update_usage(self, response: GenerateContentResponse) -> None:
+        if response.usage_metadata:
+            self.usage = Usage(
+                input_tokens=response.usage_metadata.prompt_token_count or 0,
+                output_tokens=(
+                    response.usage_metadata.candidates_token_count or 0
+                )
+            )
+
+    def create_chat_completion(self, messages: list[Message]) -> Message:
+        contents = self._contents(messages)
+        with self.timed():
+            response = self.client.models.generate_content(
+                model=self.model,
+                config=self.config,
+                contents=contents,  # type: ignore[arg-type]
+            )
         content = response.text
+        self._update_usage(response)
 
         if not content:
             raise ValueError("Empty response")
 
         return Message(role="assistant", content=content)
+
+    def stream_chat_completion(
+        self, messages: list[Message]
+    ) -> Iterator[str]:
+        contents = self._contents(messages)
+        with self.timed():
+            for chunk in self.client.models.generate_content_stream(
+                model=self.model,
+                config=self.config,
+                contents=contents,  # type: ignore[arg-type]
+            ):
+                self._update_usage(chunk)
+                if chunk.text:
+                    yield chunk.text
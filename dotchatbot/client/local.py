@@ -0,0 +1,72 @@
+import math
+import re
+from collections import Counter
+from typing import List
+
+from dotchatbot.client.services import ServiceClient
+from dotchatbot.input.transformer import Message
+
+STOPWORDS = frozenset(
+    """
+    about above after again against all also and any are aren because been
+    before being below between both but can cannot could did didn does
+    doesn doing don down during each few for from further had hasn has have
+    haven having her here hers herself him himself his how into isn its
+    itself just let more most mustn myself nor not now off once only other
+    our ours ourselves out over own same shan she should shouldn some such
+    than that the their theirs them themselves then there these they this
+    those through too under until use used using very was wasn were weren
+    what when where which while who whom why will with won would wouldn
+    you your yours yourself yourselves assistant user like want need get
+    make please thanks thank help yes
+    """.split()
+)
+
+WORD = re.compile(r"[a-z][a-z0-9]{2,}")
+
+
+def words(content: str) -> List[str]:
+    return [
+        word for word in WORD.findall(content.lower())
+        if word not in STOPWORDS
+    ]
+
+
+def summarize(messages: List[Message], word_count: int) -> str:
+    """
+    Picks the ``word_count`` highest scoring words by TF-IDF, treating
+    every message as a document.
+    """
+    documents = [words(message.content) for message in messages]
+    frequencies: Counter[str] = Counter()
+    document_frequencies: Counter[str] = Counter()
+    first_seen: dict[str, int] = {}
+    for document in documents:
+        frequencies.update(document)
+        document_frequencies.update(set(document))
+        for word in document:
+            first_seen.setdefault(word, len(first_seen))
+
+    def score(word: str) -> tuple[float, int]:
+        idf = math.log((1 + len(documents)) / (1 + document_frequencies[word]))
+        return -frequencies[word] * (1 + idf), first_seen[word]
+
+    keywords = sorted(frequencies, key=score)[:word_count]
+    return " ".join(keywords) or "untitled"
+
+
+class Local(ServiceClient):
+    """
+    Summarizes a conversation locally without calling a model. The last
+    message holds the instructions (the summary prompt) and is ignored.
+    """
+
+    def __init__(self, system_prompt: str, word_count: int = 4) -> None:
+        super().__init__(system_prompt=system_prompt)
+        self.word_count = word_count
+
+    def create_chat_completion(self, messages: List[Message]) -> Message:
+        return Message(
+            role="assistant",
+            content=summarize(messages[:-1], self.word_count)
+        )
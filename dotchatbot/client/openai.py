@@ -1,13 +1,28 @@
 from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
 
+import httpx
 import openai
 from openai.types import ChatModel
 from openai.types.chat import ChatCompletionAssistantMessageParam
+from openai.types.chat import ChatCompletionContentPartParam
+from openai.types.chat import ChatCompletionContentPartTextParam
 from openai.types.chat import ChatCompletionMessageParam
 from openai.types.chat import ChatCompletionSystemMessageParam
 from openai.types.chat import ChatCompletionUserMessageParam
+from openai.types.chat.chat_completion_content_part_param import File
+from openai.types.chat.chat_completion_content_part_param import FileFile
 
+from dotchatbot.client.files import account
+from dotchatbot.client.files import FileCache
 from dotchatbot.client.services import ServiceClient
+from dotchatbot.client.services import Usage
+from dotchatbot.client.transport import http_client
+from dotchatbot.input.include import Include
+from dotchatbot.input.include import split_includes
 from dotchatbot.input.transformer import Message
 
 SupportedChatCompletionType = (
@@ -36,26 +51,114 @@ def _chat_completion_message_param(
 
 class OpenAI(ServiceClient):
     def __init__(
-        self, system_prompt: str, api_key: str, model: ChatModel
+        self,
+        system_prompt: str,
+        api_key: str,
+        model: ChatModel,
+        file_cache: Optional[FileCache] = None,
+        client: Optional[httpx.Client] = None,
+        base_url: Optional[str] = None,
+        max_retries: Optional[int] = None
     ):
         super().__init__(system_prompt=system_prompt)
         self.model = model
-        self.client = openai.OpenAI(api_key=api_key)
+        self.client = openai.OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=client or http_client("OpenAI"),
+            max_retries=(
+                openai.DEFAULT_MAX_RETRIES if max_retries is None
+                else max_retries
+            )
+        )
+        self.file_cache = file_cache or FileCache()
+        self.account = account("OpenAI", api_key)
 
-    def create_chat_completion(self, messages: list[Message]) -> Message:
+    def _upload(self, include: Include) -> Tuple[str, Optional[float]]:
+        file = self.client.files.create(
+            file=(include.name, include.data, include.mime_type),
+            purpose="user_data"
+        )
+        return file.id, None
+
+    def _content_parts(
+        self, message: Message
+    ) -> List[ChatCompletionContentPartParam]:
+        """
+        Chat completions only accept PDF file inputs, those are uploaded once
+        and referenced by ID. Other included files are sent inline, in every
+        request of the conversation, as only the Assistants and Responses
+        APIs can search uploaded files of other types.
+        """
+        parts: List[ChatCompletionContentPartParam] = []
+        for part in split_includes(message.content, message.directory):
+            if isinstance(part, str):
+                text = part
+            elif part.mime_type == "application/pdf":
+                file_id = self.file_cache.upload(
+                    self.account, part, self._upload
+                )
+                parts.append(File(type="file", file=FileFile(file_id=file_id)))
+                continue
+            else:
+                text = part.inline()
+            parts.append(
+                ChatCompletionContentPartTextParam(type="text", text=text)
+            )
+        return parts
+
+    def _message_param(self, message: Message) -> SupportedChatCompletionType:
+        if message.role == "user" and message.includes:
+            return ChatCompletionUserMessageParam(
+                content=self._content_parts(message), role="user"
+            )
+        return _chat_completion_message_param(message)
+
+    def _request(
+        self, messages: list[Message]
+    ) -> List[ChatCompletionMessageParam]:
         request: Iterable[Message] = [
             Message(role="system", content=self.system_prompt), *messages, ]
         request: Iterable[ChatCompletionMessageParam] = map(
-            _chat_completion_message_param, request
-        )
-        request: Iterable[ChatCompletionMessageParam] = list(request)
-        response = self.client.chat.completions.create(
-            model=self.model, messages=request
+            self._message_param, request
         )
+        return list(request)
+
+    def create_chat_completion(self, messages: list[Message]) -> Message:
+        request = self._request(messages)
+        with self.timed():
+            response = self.client.chat.completions.create(
+                model=self.model, messages=request
+            )
         content = response.choices[0].message.content
         role = response.choices[0].message.role
+        if response.usage:
+            self.usage = Usage(
+                input_tokens=response.usage.prompt_tokens,
+                output_tokens=response.usage.completion_tokens
+            )
 
         if not content:
             raise ValueError("Empty response")
 
         return Message(role=role, content=content)
+
+    def stream_chat_completion(
+        self, messages: list[Message]
+    ) -> Iterator[str]:
+        request = self._request(messages)
+        with self.timed():
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=request,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            for chunk in stream:
+                if chunk.usage:
+                    self.usage = Usage(
+                        input_tokens=chunk.usage.prompt_tokens,
+                        output_tokens=chunk.usage.completion_tokens
+                    )
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
@@ -0,0 +1,123 @@
+import json
+import threading
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from typing import Any
+from typing import Callable
+from typing import cast
+from typing import Dict
+from typing import Generator
+from typing import get_args
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from dotchatbot.client.services import ServiceClient
+from dotchatbot.input.transformer import Message
+from dotchatbot.input.transformer import Role
+
+Loader = Callable[[str], List[Message]]
+Result = Dict[str, Any]
+
+
+def parse_line(line: str, load: Loader) -> List[Message]:
+    """
+    A conversation from a JSON line: either a list of role/content objects
+    or the path of a session file, as a JSON string. ``@@<`` lines of the
+    objects are sent as they are, never read as local files.
+    """
+    value = json.loads(line)
+    if isinstance(value, str):
+        return load(value)
+    if not isinstance(value, list):
+        raise ValueError("Expected a list of messages or a session path")
+    messages = []
+    for item in value:
+        if not isinstance(item, dict):
+            raise ValueError(f"Invalid message: {item!r}")
+        role, content = item.get("role"), item.get("content")
+        if role not in get_args(Role):
+            raise ValueError(f"Invalid role: {role}")
+        if not isinstance(content, str):
+            raise ValueError(f"Invalid content: {content!r}")
+        messages.append(Message(
+            role=cast(Role, role), content=content, read_includes=False
+        ))
+    return messages
+
+
+def _complete(
+    client: ServiceClient, line: str, load: Loader
+) -> Message:
+    messages = parse_line(line, load)
+    if not messages or messages[-1].role != "user":
+        raise ValueError("The conversation must end with a user message")
+    return client.create_chat_completion(messages)
+
+
+def _result(index: int, future: "Future[Message]") -> Result:
+    try:
+        message = future.result()
+    except Exception as e:
+        return {"index": index, "error": str(e) or type(e).__name__}
+    return {
+        "index": index,
+        "message": {"role": message.role, "content": message.content}
+    }
+
+
+def complete_lines(
+    client: ServiceClient,
+    lines: Iterable[str],
+    load: Loader,
+    concurrency: int = 8
+) -> Generator[Result, None, None]:
+    """
+    Answers one conversation per line with at most ``concurrency`` requests
+    in flight, yielding results in input order as soon as they are ready.
+    Results are indexed by line number; blank lines are skipped.
+
+    Lines are read on a separate thread, so a slow input does not hold back
+    results that are already complete. If the caller stops iterating, no
+    more lines are read and the requests that did not start are cancelled.
+    """
+    queue: Queue[Optional[Tuple[int, Future[Message]]]] = Queue()
+    slots = threading.BoundedSemaphore(concurrency)
+    errors: List[BaseException] = []
+    stopped = threading.Event()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        def submit() -> None:
+            try:
+                for index, line in enumerate(lines):
+                    if not line.strip():
+                        continue
+                    slots.acquire()
+                    if stopped.is_set():
+                        break
+                    queue.put((
+                        index, executor.submit(_complete, client, line, load)
+                    ))
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                queue.put(None)
+
+        threading.Thread(target=submit, daemon=True).start()
+        held = False
+        try:
+            while (item := queue.get()) is not None:
+                held = True
+                yield _result(*item)
+                slots.release()
+                held = False
+        finally:
+            stopped.set()
+            if held:
+                # the submitting thread may be waiting for this slot
+                slots.release()
+            executor.shutdown(wait=True, cancel_futures=True)
+    if errors:
+        raise errors[0]
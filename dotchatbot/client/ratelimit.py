@@ -0,0 +1,202 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+import httpx
+
+from dotchatbot.client.services import ServiceClient
+from dotchatbot.input.transformer import Message
+from dotchatbot.output.atomic import locked
+
+State = Dict[str, float]
+
+# the statuses the SDKs retry, besides 429
+TRANSIENT_STATUSES = (408, 409)
+
+
+def _status(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    status = status or getattr(error, "code", None)
+    return status if isinstance(status, int) else None
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """
+    Seconds to wait after a rate limited (429) response, taken from its
+    retry-after headers, 0 when the response has none and None for any other
+    error. Works with the errors of all three SDKs.
+    """
+    if _status(error) != 429:
+        return None
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    if value := headers.get("retry-after-ms"):
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    if value := headers.get("retry-after"):
+        try:
+            return float(value)
+        except ValueError:
+            try:
+                return parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                pass
+    return 0
+
+
+def transient(error: BaseException) -> bool:
+    """
+    Whether a request failed in a way worth retrying other than being rate
+    limited: a server error or timeout, or a connection error (wrapped or
+    not, depending on the SDK).
+    """
+    status = _status(error)
+    if status is not None:
+        return status in TRANSIENT_STATUSES or status >= 500
+    cause: Optional[BaseException] = error
+    while cause is not None:
+        if isinstance(cause, httpx.TransportError):
+            return True
+        cause = cause.__cause__
+    return False
+
+
+class TokenBucket:
+    """
+    A requests-per-minute token bucket whose state lives in a file, so all
+    processes using the same file share it. Updates happen under an
+    exclusive lock; callers reserve a slot and sleep until it comes up, so
+    concurrent processes queue behind each other instead of bursting.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        rate: float,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep
+    ) -> None:
+        self.filename = filename
+        self.rate = rate
+        self.clock = clock
+        self.sleep = sleep
+
+    @contextmanager
+    def _state(self) -> Iterator[State]:
+        with locked(f"{self.filename}.lock"):
+            state: State = {}
+            if os.path.exists(self.filename):
+                with open(self.filename, "r") as f:
+                    try:
+                        state = json.load(f)
+                    except ValueError:
+                        state = {}
+            yield state
+            with open(self.filename, "w") as f:
+                json.dump(state, f)
+
+    def acquire(self) -> float:
+        """Takes a token, sleeping until it is available; returns the wait"""
+        with self._state() as state:
+            now = self.clock()
+            tokens = state.get("tokens", self.rate)
+            updated = state.get("updated", now)
+            tokens = min(self.rate, tokens + (now - updated) * self.rate / 60)
+            tokens -= 1
+            state["tokens"], state["updated"] = tokens, now
+            wait = max(
+                state.get("blocked_until", 0) - now,
+                -tokens * 60 / self.rate
+            )
+        if wait > 0:
+            self.sleep(wait)
+        return max(wait, 0)
+
+    def block(self, seconds: float) -> None:
+        """Holds back every process for ``seconds``, e.g. after a 429"""
+        with self._state() as state:
+            now = self.clock()
+            state["blocked_until"] = max(
+                state.get("blocked_until", 0), now + seconds
+            )
+            state["tokens"] = min(state.get("tokens", 0), 0)
+            state["updated"] = now
+
+
+class RateLimited(ServiceClient):
+    """
+    Wraps a client so that every request first takes a token from the
+    bucket. Rate limited responses block the bucket for their retry-after
+    period (or an exponential backoff without one) before retrying; server
+    and connection errors back off only the request that failed. The SDKs
+    are meant to be created without retries of their own.
+    """
+
+    def __init__(
+        self,
+        client: ServiceClient,
+        bucket: TokenBucket,
+        retries: int = 3
+    ) -> None:
+        super().__init__(system_prompt=client.system_prompt)
+        self.client = client
+        self.bucket = bucket
+        self.retries = retries
+
+    def _backoff(self, error: Exception, attempt: int) -> bool:
+        """Waits before retrying a failed request, if it can be retried"""
+        seconds = retry_after(error)
+        if seconds is not None:
+            # holds back every process sharing the bucket, retrying or not
+            self.bucket.block(seconds or 2 ** attempt)
+        elif not transient(error):
+            return False
+        if attempt >= self.retries:
+            return False
+        if seconds is None:
+            self.bucket.sleep(2 ** attempt)
+        return True
+
+    def create_chat_completion(self, messages: List[Message]) -> Message:
+        self.usage = self.latency = None
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                message = self.client.create_chat_completion(messages)
+            except Exception as e:
+                if not self._backoff(e, attempt):
+                    raise
+                attempt += 1
+                continue
+            self.copy_stats(self.client)
+            return message
+
+    def stream_chat_completion(
+        self, messages: List[Message]
+    ) -> Iterator[str]:
+        self.usage = self.latency = None
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            streamed = False
+            try:
+                for chunk in self.client.stream_chat_completion(messages):
+                    streamed = True
+                    yield chunk
+            except Exception as e:
+                # a response that was partly streamed cannot be retried
+                if not self._backoff(e, self.retries if streamed else attempt):
+                    raise
+                attempt += 1
+                continue
+            self.copy_stats(self.client)
+            return
@@ -0,0 +1,212 @@
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict
+from typing import List
+from typing import Literal
+from typing import Optional
+
+from dotchatbot.client.services import Usage
+from dotchatbot.input.include import INCLUDE
+from dotchatbot.input.transformer import Message
+from dotchatbot.output.atomic import atomic_write
+
+Route = Literal["both", "auto", "quick", "main"]
+
+CODE = re.compile(r"```|^(?: {4}|\t)\S", re.MULTILINE)
+HEAVY = re.compile(
+    r"\b(?:analy[sz]e|compare|debug|design|explain|implement|prove"
+    r"|refactor|review|step by step|write)\b",
+    re.IGNORECASE
+)
+
+EWMA_WEIGHT = 0.2
+# routes to main in a row before the quick model is tried again
+SAMPLE_EVERY = 10
+
+
+@dataclass
+class Features:
+    words: int
+    code: bool
+    heavy: bool
+    includes: bool
+    depth: int
+
+    @classmethod
+    def of(cls, messages: List[Message]) -> "Features":
+        prompt = messages[-1].content if messages else ""
+        return cls(
+            words=len(prompt.split()),
+            code=CODE.search(prompt) is not None,
+            heavy=HEAVY.search(prompt) is not None,
+            includes=INCLUDE.search(prompt) is not None,
+            depth=len(messages)
+        )
+
+
+Model = Literal["quick", "main"]
+
+
+@dataclass
+class Decision:
+    model: Model
+    reason: str
+
+
+class LatencyStats:
+    """
+    Exponentially weighted averages of the response time and output tokens
+    of each model, kept in a JSON file across runs, and how many times in a
+    row a model was passed over. Responses without usage only count
+    towards the total response time, not the time per output token.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self._stats: Optional[Dict[str, Dict[str, float]]] = None
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        if self._stats is not None:
+            return self._stats
+        stats: Dict[str, Dict[str, float]] = {}
+        if os.path.exists(self.filename):
+            with open(self.filename, "r") as f:
+                try:
+                    loaded = json.load(f)
+                except ValueError:
+                    loaded = None
+            if isinstance(loaded, dict):
+                # entries written by other versions are dropped
+                stats = {
+                    label: entry for label, entry in loaded.items()
+                    if isinstance(entry, dict) and all(
+                        isinstance(value, (int, float))
+                        for value in entry.values()
+                    ) and "latency" in entry
+                }
+        self._stats = stats
+        return stats
+
+    def latency(self, label: str) -> Optional[float]:
+        stats = self.stats.get(label)
+        return stats["latency"] if stats else None
+
+    def per_token(self, label: str) -> Optional[float]:
+        """The average response time per output token"""
+        stats = self.stats.get(label)
+        if not stats or "per_token" not in stats:
+            return None
+        return stats["per_token"]
+
+    def skipped(self, label: str) -> int:
+        return int(self.stats.get(label, {}).get("skipped", 0))
+
+    def skip(self, label: str) -> None:
+        if label in self.stats:
+            self.stats[label]["skipped"] = self.skipped(label) + 1
+            self._save()
+
+    def record(
+        self, label: str, latency: float, usage: Optional[Usage] = None
+    ) -> None:
+        stats = self.stats.get(label)
+        if stats is None:
+            stats = {"count": 0, "latency": latency}
+        stats["count"] += 1
+        stats["latency"] += EWMA_WEIGHT * (latency - stats["latency"])
+        if usage and usage.output_tokens:
+            tokens = usage.output_tokens
+            per_token = latency / tokens
+            stats.setdefault("tokens", tokens)
+            stats.setdefault("per_token", per_token)
+            stats["tokens"] += EWMA_WEIGHT * (tokens - stats["tokens"])
+            stats["per_token"] += EWMA_WEIGHT * (
+                per_token - stats["per_token"]
+            )
+        stats["skipped"] = 0
+        self.stats[label] = stats
+        self._save()
+
+    def _save(self) -> None:
+        with atomic_write(self.filename) as f:
+            json.dump(self.stats, f)
+
+
+class Router:
+    """
+    Decides whether the quick or the main model answers a request, using
+    only local features of the conversation and the recorded latencies.
+    Latencies are recorded per route, so the two routes never share them
+    even when they use the same model, and compared per output token. A
+    quick model that has not been faster is still tried every
+    ``sample_every`` requests, so its stats can recover.
+    """
+
+    def __init__(
+        self,
+        quick: str,
+        main: str,
+        stats: LatencyStats,
+        max_words: int = 60,
+        max_depth: int = 12,
+        sample_every: int = SAMPLE_EVERY
+    ) -> None:
+        self.quick = quick
+        self.main = main
+        self.stats = stats
+        self.max_words = max_words
+        self.max_depth = max_depth
+        self.sample_every = sample_every
+
+    def label(self, model: Model) -> str:
+        """The stats of ``model``, e.g. ``quick/OpenAI:gpt-4o-mini``"""
+        return f"{model}/{self.quick if model == 'quick' else self.main}"
+
+    def record(
+        self, model: Model, latency: float, usage: Optional[Usage] = None
+    ) -> None:
+        self.stats.record(self.label(model), latency, usage)
+
+    def route(self, messages: List[Message]) -> Decision:
+        if self.quick == self.main:
+            return Decision("main", f"the quick model is also {self.main}")
+        features = Features.of(messages)
+        if features.code:
+            return Decision("main", "the prompt contains code")
+        if features.includes:
+            return Decision("main", "the prompt includes files")
+        if features.heavy:
+            return Decision("main", "the prompt asks for reasoning")
+        if features.words > self.max_words:
+            return Decision(
+                "main", f"the prompt is long ({features.words} words)"
+            )
+        if features.depth > self.max_depth:
+            return Decision(
+                "main",
+                f"the conversation is long ({features.depth} messages)"
+            )
+        label = self.label("quick")
+        quick = self.stats.per_token(label)
+        main = self.stats.per_token(self.label("main"))
+        unit = " per output token"
+        if quick is None or main is None:
+            # without usage for both, only the total times compare
+            quick = self.stats.latency(label)
+            main = self.stats.latency(self.label("main"))
+            unit = ""
+        if quick is not None and main is not None and quick >= main:
+            if self.stats.skipped(label) >= self.sample_every:
+                return Decision(
+                    "quick", f"{self.quick} has not been tried for a while"
+                )
+            self.stats.skip(label)
+            return Decision(
+                "main",
+                f"{self.quick} has not been faster ({quick * 1000:.0f}ms vs "
+                f"{main * 1000:.0f}ms{unit})"
+            )
+        return Decision("quick", f"short prompt ({features.words} words)")
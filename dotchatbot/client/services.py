@@ -1,13 +1,51 @@
+import time
 from abc import ABC
 from abc import abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
 from typing import List
+from typing import Optional
 
 from dotchatbot.input.transformer import Message
 
 
+@dataclass
+class Usage:
+    input_tokens: int
+    output_tokens: int
+
+
 class ServiceClient(ABC):
     def __init__(self, system_prompt: str) -> None:
         self.system_prompt = system_prompt
+        # of the last request, None if the provider did not report it
+        self.usage: Optional[Usage] = None
+        # seconds the provider took to answer the last request
+        self.latency: Optional[float] = None
+
+    @contextmanager
+    def timed(self) -> Iterator[None]:
+        """
+        Times a request to the provider, clearing what was recorded for the
+        previous one first
+        """
+        self.usage = None
+        self.latency = None
+        start = time.perf_counter()
+        yield
+        self.latency = time.perf_counter() - start
+
+    def copy_stats(self, client: "ServiceClient") -> None:
+        """Takes the usage and latency of a wrapped client's last request"""
+        self.usage = client.usage
+        self.latency = client.latency
 
     @abstractmethod
     def create_chat_completion(self, messages: List[Message]) -> Message: ...
+
+    def stream_chat_completion(
+        self, messages: List[Message]
+    ) -> Iterator[str]:
+        """Clients without streaming support yield the whole response"""
+        yield self.create_chat_completion(messages).content
@@ -0,0 +1,115 @@
+import atexit
+import importlib.util
+import threading
+from dataclasses import dataclass
+from typing import Dict
+from typing import Iterable
+from typing import List
+
+import httpx
+
+BASE_URLS = {
+    "OpenAI": "https://api.openai.com",
+    "Anthropic": "https://api.anthropic.com",
+    "Google": "https://generativelanguage.googleapis.com",
+}
+
+
+@dataclass
+class TransportOptions:
+    timeout: float = 600.0
+    connect_timeout: float = 10.0
+    http2: bool = True
+    max_connections: int = 10
+    keepalive_expiry: float = 120.0
+
+    @property
+    def httpx_timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+
+class SharedTransport(httpx.BaseTransport):
+    """
+    A connection pool shared by every SDK client of a provider. SDK clients
+    close their transport when they are garbage collected, so closing is
+    deferred to interpreter exit.
+    """
+
+    def __init__(self, options: TransportOptions) -> None:
+        self.http2 = (
+            options.http2 and importlib.util.find_spec("h2") is not None
+        )
+        self.transport = httpx.HTTPTransport(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=options.max_connections,
+                max_keepalive_connections=options.max_connections,
+                keepalive_expiry=options.keepalive_expiry
+            )
+        )
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self.transport.handle_request(request)
+
+    def close(self) -> None:
+        pass
+
+
+_options = TransportOptions()
+_transports: Dict[str, SharedTransport] = {}
+_lock = threading.Lock()
+
+
+def configure(options: TransportOptions) -> None:
+    """Sets the options of the transports created from now on"""
+    global _options
+    _options = options
+
+
+def options() -> TransportOptions:
+    return _options
+
+
+def transport(service_name: str) -> SharedTransport:
+    with _lock:
+        if service_name not in _transports:
+            _transports[service_name] = SharedTransport(_options)
+        return _transports[service_name]
+
+
+def http_client(service_name: str) -> httpx.Client:
+    """An httpx client using the shared transport of the provider"""
+    return httpx.Client(
+        transport=transport(service_name), timeout=_options.httpx_timeout
+    )
+
+
+def _warm_up(service_name: str) -> None:
+    try:
+        with http_client(service_name) as client:
+            client.head(BASE_URLS[service_name])
+    except httpx.HTTPError:
+        pass
+
+
+def warm_up(service_names: Iterable[str]) -> List[threading.Thread]:
+    """
+    Opens a connection to each provider in the background, so the TLS
+    handshake is done by the time a request is sent.
+    """
+    threads = [
+        threading.Thread(target=_warm_up, args=(service_name,), daemon=True)
+        for service_name in dict.fromkeys(service_names)
+        if service_name in BASE_URLS
+    ]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+@atexit.register
+def close() -> None:
+    with _lock:
+        for shared in _transports.values():
+            shared.transport.close()
+        _transports.clear()
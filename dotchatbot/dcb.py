@@ -1,13 +1,29 @@
+import json
 import os
+import re
 import sys
+import threading
+from concurrent.futures import Executor
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from dataclasses import field
 from datetime import datetime
 from getpass import getpass
+from itertools import islice
+from typing import Callable
+from typing import cast
+from typing import Dict
 from typing import get_args
+from typing import Iterable
+from typing import Iterator
+from typing import List
 from typing import Optional
+from typing import Tuple
+from typing import TYPE_CHECKING
 
 import click
 import keyring
-from anthropic.types import ModelParam
 from click import Choice
 from click import UsageError
 from click._termui_impl import Editor
@@ -20,73 +36,522 @@ from click_extra import VerboseOption
 from click_extra import VerbosityOption
 from cloup import option
 from cloup import option_group
-from openai.types import ChatModel
 from rich.console import JustifyMethod
 
+from dotchatbot.client.batch import batch_client
+from dotchatbot.client.batch import BatchClient
+from dotchatbot.client.batch import BatchJobs
+from dotchatbot.client.batch import BatchServiceName
+from dotchatbot.client.batch import session_files
+from dotchatbot.client.deferred import Deferred
 from dotchatbot.client.factory import create_client
 from dotchatbot.client.factory import ServiceName
+from dotchatbot.client.factory import SummaryServiceName
+from dotchatbot.client.fanout import fan_out
+from dotchatbot.client.pipeline import complete_lines
+from dotchatbot.client.ratelimit import RateLimited
+from dotchatbot.client.ratelimit import TokenBucket
+from dotchatbot.client.router import LatencyStats
+from dotchatbot.client.router import Route
+from dotchatbot.client.router import Router
+from dotchatbot.client.services import ServiceClient
+from dotchatbot.client.transport import configure
+from dotchatbot.client.transport import TransportOptions
+from dotchatbot.client.transport import warm_up
+from dotchatbot.history.archive import SessionArchive
+from dotchatbot.history.browser import browse as browse_history
+from dotchatbot.history.browser import HistoryPager
+from dotchatbot.history.related import RelatedIndex
 from dotchatbot.input.parser import Parser
+from dotchatbot.input.reader import SessionReader
+from dotchatbot.input.tracked import append_section
+from dotchatbot.input.tracked import TrackedSession
 from dotchatbot.input.transformer import Message
+from dotchatbot.input.watch import Watcher
 from dotchatbot.output.file import generate_file_content
-from dotchatbot.output.file import generate_filename
 from dotchatbot.output.file import NEW_USER_MESSAGE
+from dotchatbot.output.file import write_file_content
 from dotchatbot.output.markdown import Renderer
+from dotchatbot.output.store import is_manifest
+from dotchatbot.output.store import ManifestReader
+from dotchatbot.output.store import MessageStore
+from dotchatbot.session import check_includes
+from dotchatbot.session import DEFAULT_MODELS
+from dotchatbot.session import DEFAULT_SUMMARY_PROMPT
+from dotchatbot.session import DEFAULT_SYSTEM_PROMPT
+from dotchatbot.session import open_session
+from dotchatbot.session import record_session
+from dotchatbot.session import Session
+from dotchatbot.session import session_exists
+from dotchatbot.session import write_session
+
+if TYPE_CHECKING:
+    from anthropic.types import ModelParam
+    from openai.types import ChatModel
 
 APP_NAME = "dotchatbot"
 os.makedirs(click.get_app_dir(APP_NAME), exist_ok=True)
 
-DEFAULT_SYSTEM_PROMPT = """\
-You are a helpful assistant."""
-
-DEFAULT_SUMMARY_PROMPT = """\
-Given the conversation so far, summarize it in just 4 words. \
-Only respond with these 4 words"""
-
 DEFAULT_SESSION_HISTORY_FILE = os.path.join(
     click.get_app_dir(APP_NAME), ".dotchatbot-history"
 )
+DEFAULT_SESSION_ARCHIVE_LOCATION = os.path.join(
+    click.get_app_dir(APP_NAME), "sessions"
+)
 DEFAULT_SESSION_FILE_LOCATION = os.path.join(
-    click.get_app_dir(APP_NAME), "sessions", datetime.now().date().isoformat()
+    DEFAULT_SESSION_ARCHIVE_LOCATION, datetime.now().date().isoformat()
 )
 os.makedirs(DEFAULT_SESSION_FILE_LOCATION, exist_ok=True)
 DEFAULT_SESSION_FILE_EXT = ".dcb"
+DEFAULT_CONTENT_STORE_LOCATION = os.path.join(
+    click.get_app_dir(APP_NAME), "store"
+)
+DEFAULT_RELATED_INDEX_LOCATION = os.path.join(
+    click.get_app_dir(APP_NAME), "related"
+)
+DEFAULT_RATE_LIMIT_LOCATION = os.path.join(
+    click.get_app_dir(APP_NAME), "ratelimit"
+)
+DEFAULT_ROUTE_STATS_FILE = os.path.join(
+    click.get_app_dir(APP_NAME), "route-stats.json"
+)
+DEFAULT_BATCH_STATE_FILE = os.path.join(
+    click.get_app_dir(APP_NAME), "batches.json"
+)
 
 
-def _edit(text: str, extension: str, reverse: bool) -> Optional[str]:
+# set while background setup may prompt for credentials on the terminal:
+# not while the editor is open, nor before the first message is sent
+_may_prompt = threading.Event()
+_may_prompt.set()
+_setup_abandoned = threading.Event()
+
+
+@contextmanager
+def _editing() -> Iterator[None]:
+    allowed = _may_prompt.is_set()
+    _may_prompt.clear()
+    try:
+        yield
+    finally:
+        if allowed:
+            _may_prompt.set()
+
+
+def _start_setup(interactive: bool) -> ThreadPoolExecutor:
+    """
+    The executor setting clients up in the background. In interactive mode
+    it may only prompt for credentials once the first message is sent.
+    """
+    _setup_abandoned.clear()
+    if interactive:
+        _may_prompt.clear()
+    else:
+        _may_prompt.set()
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="dcb-setup")
+
+
+def _stop_setup(setup: Executor) -> None:
+    """Cancels the setup that is not done yet, without prompting"""
+    _setup_abandoned.set()
+    _may_prompt.set()
+    setup.shutdown(wait=True, cancel_futures=True)
+    _setup_abandoned.clear()
+
+
+def _editor(reverse: bool) -> str:
     editor = Editor().get_editor()
     print(editor)
     if editor in ("vim", "vi"):
         line_offset = 2 if reverse else ""
         editor += f" +{line_offset}"
-    file_content = click.edit(
-        editor=editor,
-        text=text,
-        extension=extension,
-    )
+    return editor
+
+
+def _edit(text: str, extension: str, reverse: bool) -> Optional[str]:
+    with _editing():
+        file_content = click.edit(
+            editor=_editor(reverse),
+            text=text,
+            extension=extension,
+        )
     return file_content
 
 
+def _edit_in_place(filename: str) -> None:
+    # the last header is found without parsing, the parser may not be ready
+    with SessionReader(filename) as reader:
+        last = reader.tail(1)
+    added = not last or last[-1].role != "user"
+    if added:
+        append_section(filename, NEW_USER_MESSAGE)
+    with _editing():
+        click.edit(editor=_editor(reverse=False), filename=filename)
+    if added:
+        _remove_empty_message(filename)
+
+
+def _remove_empty_message(filename: str) -> None:
+    """Drops the user header added for an edit that was left empty"""
+    with SessionReader(filename) as reader:
+        last = reader.tail(1)
+        offset = reader.tail_offset(1)
+    if last and last[-1].role == "user" and not last[-1].content.strip():
+        os.truncate(filename, offset)
+
+
+def _watch_turn(
+    session: Session, tracked: TrackedSession
+) -> Optional[Message]:
+    """Answers a watched session file that ends in a user message"""
+    messages = tracked.refresh()
+    if (
+        not messages
+        or messages[-1].role != "user"
+        or not messages[-1].content.strip()
+    ):
+        return None
+    session.messages = list(messages)
+    session.filename = tracked.filename
+    response = session.complete()
+    tracked.append(
+        f"@@> {response.role}:\n{response.content.strip()}\n\n"
+        f"{NEW_USER_MESSAGE}"
+    )
+    session.record(tracked.filename, session.messages)
+    return response
+
+
+def _watch(paths: Tuple[str, ...], session: Session) -> None:
+    watcher = Watcher(paths, session.extension)
+    tracked: Dict[str, TrackedSession] = {}
+    click.echo(
+        f"Watching {', '.join(paths)} using {watcher.backend}",
+        file=sys.stderr
+    )
+    try:
+        for filenames in watcher:
+            for filename in filenames:
+                if not os.path.exists(filename) or is_manifest(filename):
+                    tracked.pop(filename, None)
+                    continue
+                if filename not in tracked:
+                    tracked[filename] = TrackedSession(
+                        filename, session.parser
+                    )
+                try:
+                    if _watch_turn(session, tracked[filename]):
+                        click.echo(f"Answered {filename}", file=sys.stderr)
+                except Exception as e:
+                    click.echo(
+                        f"Failed to answer {filename}: {e}", file=sys.stderr
+                    )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+def _complete_jsonl(session: Session, concurrency: int) -> None:
+    def load(filename: str) -> List[Message]:
+        with session.open(filename) as reader:
+            return check_includes(list(reader), filename)
+
+    for result in complete_lines(
+        session.client, sys.stdin, load, concurrency
+    ):
+        click.echo(json.dumps(result))
+
+
+def _batch_clients(
+    base_url: Optional[str],
+    system_prompt: str,
+    openai_model: "ChatModel",
+    anthropic_model: "ModelParam",
+    anthropic_max_tokens: int
+) -> Callable[[str], BatchClient]:
+    clients: Dict[str, BatchClient] = {}
+
+    def get(service_name: str) -> BatchClient:
+        if service_name not in get_args(BatchServiceName):
+            raise UsageError(f"{service_name} does not support batches")
+        if service_name not in clients:
+            clients[service_name] = batch_client(create_client(
+                service_name=service_name,  # type: ignore[arg-type]
+                system_prompt=system_prompt,
+                api_key=_get_api_key(
+                    service_name  # type: ignore[arg-type]
+                ),
+                openai_model=openai_model,
+                anthropic_model=anthropic_model,
+                anthropic_max_tokens=anthropic_max_tokens,
+                google_model="",
+                base_url=base_url
+            ))
+        return clients[service_name]
+
+    return get
+
+
+def _batch(
+    jobs: BatchJobs,
+    clients: Callable[[str], BatchClient],
+    service_name: ServiceName,
+    submit: Tuple[str, ...],
+    poll: bool,
+    collect: bool,
+    extension: str,
+    store: MessageStore,
+    history_file: str,
+    related_index: RelatedIndex
+) -> None:
+    if submit:
+        job = jobs.submit(
+            service_name,
+            clients(service_name),
+            session_files(submit, extension)
+        )
+        if job is None:
+            click.echo("No pending sessions to submit", file=sys.stderr)
+        else:
+            click.echo(
+                f"Submitted {len(job.sessions)} sessions as {job.id}",
+                file=sys.stderr
+            )
+    if poll:
+        for job in jobs.poll(clients):
+            click.echo(
+                f"{job.id} {job.service_name} {job.status} "
+                f"{len(job.sessions)} sessions"
+            )
+    if collect:
+        for answer in jobs.collect(clients):
+            if answer.error is not None:
+                click.echo(
+                    f"Not answered {answer.filename}: {answer.error}",
+                    file=sys.stderr
+                )
+                continue
+            write_session(answer.filename, answer.messages, store)
+            record_session(
+                answer.filename, answer.messages, history_file, related_index
+            )
+            click.echo(f"Answered {answer.filename}", file=sys.stderr)
+
+
+def _split_messages(
+    messages: List[Message] | SessionReader | ManifestReader,
+    tail: Optional[int]
+) -> Tuple[List[Message], Iterable[Message]]:
+    """
+    The messages to show in the editor and the ones hidden by --tail, both
+    in file order. Session files are read from the end for the tail, the
+    hidden ones are only decoded when iterated.
+    """
+    if not tail:
+        return list(messages), []
+    shown = list(islice(reversed(messages), tail))[::-1]
+    if not shown:
+        return [], []
+    if isinstance(messages, list):
+        return shown, messages[:-len(shown)]
+    return shown, messages.before(len(shown))
+
+
+def _prompt_api_key(service_name: ServiceName) -> str:
+    api_key = getpass(f"Enter your {service_name} API key: ")
+    keyring.set_password(service_name.lower(), "api_key", api_key)
+    return api_key
+
+
 def _get_api_key(service_name: ServiceName) -> str:
     api_key = keyring.get_password(service_name.lower(), "api_key")
     if not api_key:
-        api_key = getpass(f"Enter your {service_name} API key: ")
-        keyring.set_password(service_name.lower(), "api_key", api_key)
+        _may_prompt.wait()
+        if _setup_abandoned.is_set():
+            raise click.Abort()
+        # the main thread may have asked for it in the meantime
+        api_key = keyring.get_password(service_name.lower(), "api_key")
+        if not api_key:
+            api_key = _prompt_api_key(service_name)
     return api_key
 
 
-def _print_history(session_history_file: str) -> None:
+def _ask_for_api_keys(service_names: Iterable[Optional[str]]) -> None:
+    """
+    Prompts for every missing API key on this thread, before background
+    setup may prompt, so it never prompts while a response is shown
+    """
+    for service_name in dict.fromkeys(service_names):
+        if not service_name or service_name == "Local":
+            continue
+        if not keyring.get_password(service_name.lower(), "api_key"):
+            _prompt_api_key(service_name)  # type: ignore[arg-type]
+
+
+def _create_client_in_background(
+    executor: Executor,
+    service_name: SummaryServiceName,
+    system_prompt: str,
+    openai_model: "ChatModel",
+    anthropic_model: "ModelParam",
+    anthropic_max_tokens: int,
+    google_model: str,
+    max_retries: Optional[int] = None
+) -> ServiceClient:
+    def create() -> ServiceClient:
+        api_key = ""
+        if service_name != "Local":
+            api_key = _get_api_key(service_name)
+        return create_client(
+            service_name=service_name,
+            system_prompt=system_prompt,
+            api_key=api_key,
+            openai_model=openai_model,
+            anthropic_model=anthropic_model,
+            anthropic_max_tokens=anthropic_max_tokens,
+            google_model=google_model,
+            max_retries=max_retries,
+        )
+
+    return Deferred(system_prompt, executor.submit(create))
+
+
+def _rate_limited(
+    client: ServiceClient,
+    service_name: SummaryServiceName,
+    rate_limit: Optional[float],
+    rate_limit_location: str
+) -> ServiceClient:
+    if not rate_limit or service_name == "Local":
+        return client
+    bucket = TokenBucket(
+        os.path.join(rate_limit_location, f"{service_name.lower()}.json"),
+        rate_limit
+    )
+    return RateLimited(client, bucket)
+
+
+def _previous_session(session_history_file: str) -> Optional[str]:
+    if os.path.exists(session_history_file):
+        with open(session_history_file, "r") as f:
+            lines = f.readlines()
+            if lines:
+                return lines[-1].strip()
+    return None
+
+
+def _history_sessions(
+    session_history_file: str,
+    store: MessageStore,
+    archive: SessionArchive
+) -> Iterator[Tuple[str, List[Message]]]:
+    if not os.path.exists(session_history_file):
+        return
+    with open(session_history_file, "r") as f:
+        filenames = dict.fromkeys(line.strip() for line in f)
+    for filename in filenames:
+        if filename and session_exists(filename, archive):
+            with open_session(filename, store, archive) as reader:
+                yield filename, list(reader)
+
+
+def _print_related(
+    related_index: RelatedIndex, text: str, count: int, exclude: Optional[str]
+) -> None:
+    exclude = os.path.abspath(exclude) if exclude else None
+    for filename, score in related_index.query(text, count + 1):
+        if filename != exclude:
+            click.echo(f"{score:.3f} {filename}")
+            count -= 1
+        if not count:
+            break
+
+
+def _related_text(
+    filename: Optional[str],
+    store: MessageStore,
+    archive: SessionArchive,
+    extension: str
+) -> str:
+    """The session to find related sessions for, STDIN or a new message"""
+    if filename and session_exists(filename, archive):
+        with open_session(filename, store, archive) as reader:
+            return "\n".join(message.content for message in reader)
+    if not sys.stdin.isatty():
+        return sys.stdin.read()
+    return _edit(text="", extension=extension, reverse=False) or ""
+
+
+def _fork_or_export(
+    filename: Optional[str],
+    fork: Optional[str],
+    store: MessageStore,
+    archive: SessionArchive,
+    history_file: str
+) -> None:
+    """Forks the session into the content store, or prints it"""
+    if not filename or not session_exists(filename, archive):
+        raise UsageError("FILENAME is required to fork or export")
+    with open_session(filename, store, archive) as reader:
+        if fork:
+            if session_exists(fork, archive):
+                raise UsageError(f"Cannot fork to the existing session {fork}")
+            store.fork(reader, fork)
+            click.echo(f"Forked to {fork}", file=sys.stderr)
+            with open(history_file, "a") as f:
+                f.write(os.path.abspath(fork) + "\n")
+        else:
+            write_file_content(reader, click.get_text_stream("stdout"))
+
+
+def _print_history(
+    session_history_file: str, archive: SessionArchive
+) -> None:
     with open(session_history_file, "r") as f:
         previous = ''
         for line in f:
             filename = line.strip()
-            if os.path.exists(filename):
-                mtime = os.path.getmtime(filename)
-                mtime = datetime.fromtimestamp(mtime)
+            if session_exists(filename, archive):
+                if os.path.exists(filename):
+                    mtime = os.path.getmtime(filename)
+                else:
+                    mtime = archive.getmtime(filename)
+                modified = datetime.fromtimestamp(mtime)
                 if previous != filename:
-                    click.echo(f"{mtime} {filename}")
+                    click.echo(f"{modified} {filename}")
                     previous = filename
 
 
+def _browse(
+    session_history_file: str,
+    store: MessageStore,
+    archive: SessionArchive,
+    renderer: Callable[[int], Renderer]
+) -> Optional[str]:
+    def load(filename: str, count: int) -> List[Message]:
+        with open_session(filename, store, archive) as reader:
+            return reader.tail(count)
+
+    def label(filename: str) -> str:
+        if os.path.exists(filename):
+            mtime = os.path.getmtime(filename)
+        else:
+            mtime = archive.getmtime(filename)
+        modified = datetime.fromtimestamp(mtime)
+        return f"{modified:%Y-%m-%d %H:%M} {os.path.basename(filename)}"
+
+    return browse_history(
+        HistoryPager(
+            session_history_file,
+            exists=lambda filename: session_exists(filename, archive)
+        ),
+        load,
+        renderer,
+        label
+    )
+
+
 def _print_response(
     no_rich: bool,
     no_pager: bool,
@@ -105,6 +570,278 @@ def _print_response(
         click.echo_via_pager(output, color=True)
 
 
+def _print_responses(
+    no_rich: bool,
+    clients: Dict[str, ServiceClient],
+    messages: List[Message],
+    markdown_renderer: Renderer
+) -> Dict[str, Message]:
+    responses = {}
+    for result in fan_out(clients, messages):
+        if result.error or not result.message:
+            click.echo(
+                f"==> {result.label} failed after {result.latency:.2f}s: "
+                f"{result.error}",
+                file=sys.stderr
+            )
+            continue
+        usage = ""
+        if result.usage:
+            usage = (
+                f", {result.usage.input_tokens} input tokens"
+                f", {result.usage.output_tokens} output tokens"
+            )
+        click.echo(
+            f"==> {result.label} ({result.latency:.2f}s{usage})",
+            file=sys.stderr
+        )
+        _print_response(no_rich, True, result.message, markdown_renderer)
+        responses[result.label] = result.message
+    return responses
+
+
+def _sibling_filename(filename: str, label: str) -> str:
+    root, extension = os.path.splitext(filename)
+    label = re.sub(r"[^A-Za-z0-9.\-]", "-", label.lower())
+    return f"{root}-{label}{extension}"
+
+
+@dataclass
+class Clients:
+    main: ServiceClient
+    summary: ServiceClient
+    quick: Optional[ServiceClient] = None
+    router: Optional[Router] = None
+    compare: Dict[str, ServiceClient] = field(default_factory=dict)
+
+
+def _create_clients(
+    setup: Executor,
+    system_prompt: str,
+    service_name: ServiceName,
+    summary_service_name: SummaryServiceName,
+    quick_service_name: Optional[ServiceName],
+    compare: Tuple[str, ...],
+    models: Dict[str, str],
+    summary_models: Dict[str, str],
+    quick_models: Dict[str, str],
+    anthropic_max_tokens: int,
+    route_stats_file: str,
+    rate_limit: Optional[float],
+    rate_limit_location: str
+) -> Clients:
+    """
+    Every client the options ask for, set up in the background by ``setup``
+    (and rate limited) in the order they are listed here
+    """
+    # RateLimited retries instead of the SDK: rate limited requests against
+    # the bucket shared by every process, server and network errors alone
+    max_retries = 0 if rate_limit else None
+
+    def client(
+        service_name: SummaryServiceName, models: Dict[str, str]
+    ) -> ServiceClient:
+        return _rate_limited(
+            _create_client_in_background(
+                setup,
+                service_name,
+                system_prompt,
+                openai_model=cast("ChatModel", models.get("OpenAI", "")),
+                anthropic_model=models.get("Anthropic", ""),
+                anthropic_max_tokens=anthropic_max_tokens,
+                google_model=models.get("Google", ""),
+                max_retries=max_retries,
+            ),
+            service_name,
+            rate_limit,
+            rate_limit_location
+        )
+
+    clients = Clients(
+        main=client(service_name, models),
+        summary=client(summary_service_name, summary_models)
+    )
+    if quick_service_name:
+        clients.quick = client(quick_service_name, quick_models)
+        clients.router = Router(
+            quick=f"{quick_service_name}:{quick_models[quick_service_name]}",
+            main=f"{service_name}:{models[service_name]}",
+            stats=LatencyStats(route_stats_file)
+        )
+    for target in compare:
+        compare_service_name, _, model = target.partition(":")
+        model = model or models[compare_service_name]
+        clients.compare[f"{compare_service_name}:{model}"] = client(
+            compare_service_name,  # type: ignore[arg-type]
+            dict.fromkeys(get_args(ServiceName), model)
+        )
+    return clients
+
+
+def _check_in_place(filename: Optional[str], archive: SessionArchive) -> str:
+    """The session file to edit in place, created if it does not exist"""
+    if not filename:
+        raise UsageError("FILENAME is required to edit in place")
+    if os.path.exists(filename) and is_manifest(filename):
+        raise UsageError(f"Cannot edit the manifest {filename}")
+    if not os.path.exists(filename):
+        if session_exists(filename, archive):
+            raise UsageError(f"Cannot edit the archived {filename}")
+        open(filename, "a").close()
+    return filename
+
+
+def _prompt_in_place(
+    filename: str,
+    tracked: Optional[TrackedSession],
+    parser: Callable[[], Parser]
+) -> Tuple[TrackedSession, List[Message]]:
+    """
+    The conversation in the session file, edited in place when STDIN is a
+    terminal and followed by STDIN otherwise. The file is only parsed once
+    the editor is closed.
+    """
+    if sys.stdin.isatty():
+        _edit_in_place(filename)
+    tracked = tracked or TrackedSession(filename, parser())
+    messages = list(tracked.refresh())
+    if not sys.stdin.isatty():
+        messages += parser().parse(sys.stdin.read())
+    return tracked, messages
+
+
+def _prompt_messages(
+    session: Optional[Session],
+    filename: Optional[str],
+    store: MessageStore,
+    archive: SessionArchive,
+    parser: Callable[[], Parser],
+    reverse: bool,
+    tail: Optional[int],
+    extension: str
+) -> List[Message]:
+    """
+    The conversation to send: the session so far with the new message, from
+    the editor when STDIN is a terminal and from STDIN otherwise. The parser
+    is only needed once the editor is closed.
+    """
+    messages: List[Message] = []
+    hidden_messages: Iterable[Message] = []
+    show_tail = tail if sys.stdin.isatty() else None
+    if session is not None and session.messages:
+        # continuing: the session was just saved, no need to re-read it
+        messages, hidden_messages = _split_messages(
+            session.messages, show_tail
+        )
+    elif filename and session_exists(filename, archive):
+        with open_session(filename, store, archive) as reader:
+            messages, hidden_messages = _split_messages(reader, show_tail)
+
+    if not sys.stdin.isatty():
+        return [*messages, *parser().parse(sys.stdin.read())]
+    if not reverse:
+        file_content = _edit(
+            text=f"{generate_file_content(messages)}{NEW_USER_MESSAGE}",
+            extension=extension,
+            reverse=reverse
+        )
+    else:
+        file_content = _edit(
+            text=f"{NEW_USER_MESSAGE}{generate_file_content(messages[::-1])}",
+            extension=extension,
+            reverse=reverse
+        )
+    # quitting without saving must not send (and save) the hidden messages
+    if file_content is None:
+        return []
+    edited = parser().parse(file_content)
+    if not edited:
+        return []
+    return [*hidden_messages, *(edited[::-1] if reverse else edited)]
+
+
+def _compare(
+    session: Session,
+    clients: Dict[str, ServiceClient],
+    no_rich: bool,
+    save: Optional[bool],
+    location: str,
+    content_store: bool
+) -> None:
+    """
+    Sends the conversation to every client at once, saving each response
+    to its own session file; ``save`` is asked for when it is None
+    """
+    responses = _print_responses(
+        no_rich, clients, session.messages, session.renderer
+    )
+    if save is None:
+        save = click.confirm("Save responses?", default=True)
+    if not save or not responses:
+        return
+    filename = session.filename or session.new_filename(location)
+    for label, response in responses.items():
+        saved = session.save(
+            _sibling_filename(filename, label),
+            content_store=content_store,
+            messages=[*session.messages, response]
+        )
+        click.echo(f"Saved to {saved}", file=sys.stderr)
+
+
+def _answer(
+    session: Session,
+    clients: Clients,
+    route: Route,
+    no_rich: bool,
+    no_pager: bool
+) -> Message:
+    """
+    Answers with the main or quick model (or both) as routed, recording
+    their latencies, and prints the response
+    """
+    quick, router = clients.quick, clients.router
+    selected = route if quick else "main"
+    if selected == "auto" and router:
+        decision = router.route(session.messages)
+        click.echo(
+            f"Routing to the {decision.model} model: {decision.reason}",
+            file=sys.stderr
+        )
+        selected = decision.model
+
+    # latencies only cover the provider calls: not setup, rate limit waits
+    # or retries
+    if quick and router and selected == "both":
+        quick_response = quick.create_chat_completion(session.messages)
+        if quick.latency is not None:
+            router.record("quick", quick.latency, quick.usage)
+        _print_response(no_rich, True, quick_response, session.renderer)
+    answering = quick if quick and selected == "quick" else clients.main
+    response = session.complete(answering)
+    if router and answering.latency is not None:
+        router.record(
+            "quick" if selected == "quick" else "main",
+            answering.latency,
+            answering.usage
+        )
+    _print_response(no_rich, no_pager, response, session.renderer)
+    return response
+
+
+def _confirm_save(prompt_user: bool, assume_yes: bool) -> Tuple[bool, bool]:
+    """Whether to save the response, and whether to continue the session"""
+    if not prompt_user:
+        return assume_yes, False
+    result = click.prompt(
+        "Save response?",
+        default="Y",
+        type=Choice(["y", "n", "c"], case_sensitive=False),
+        show_choices=True
+    )
+    return result.lower() in ("y", "yes", "c"), result.lower() == "c"
+
+
 @extra_command(
     params=[
         ConfigOption(strict=True),
@@ -140,6 +877,45 @@ def _print_response(
         help="Reverse the conversation in the editor",
         is_flag=True,
         default=False
+    ), option(
+        "--tail",
+        "-t",
+        help="Only show the last N messages of the session in the editor",
+        type=click.IntRange(min=1),
+        default=None
+    ), option(
+        "--in-place",
+        "-i",
+        help="""\
+Edit the session file FILENAME itself instead of a temporary copy, only \
+re-reading the parts of it that changed\
+""",
+        is_flag=True,
+        default=False
+    ), option(
+        "--watch",
+        "-w",
+        help="""\
+Watch session files (or directories of them) and answer each one that is \
+saved ending in a user message, until interrupted\
+""",
+        multiple=True,
+        metavar="PATH",
+        type=click.Path(exists=True)
+    ), option(
+        "--jsonl",
+        help="""\
+Read one conversation per line from STDIN, as a JSON list of role/content \
+messages or the JSON string path of a session file, and write the responses \
+to STDOUT as JSON lines in the same order\
+""",
+        is_flag=True,
+        default=False
+    ), option(
+        "--jsonl-concurrency",
+        help="The maximum number of requests in flight in JSONL mode",
+        type=click.IntRange(min=1),
+        default=8
     ), option(
         "--assume-yes", "-y", help='''\
 Automatic yes to prompts; \
@@ -182,25 +958,201 @@ The prompt to use for the summary (for building the filename for the session)\
         type=click.Choice(get_args(ServiceName))
     ), option(
         "--summary-service-name",
-        help="The chatbot provider service name for filename generation",
+        help="""\
+The chatbot provider service name for filename generation, Local picks \
+keywords from the conversation without calling a model\
+""",
         default="OpenAI",
-        type=click.Choice(get_args(ServiceName))
+        type=click.Choice(get_args(SummaryServiceName))
     ), option(
         "--quick-service-name",
         help="Call this model first, then the main model.",
+        type=click.Choice(get_args(ServiceName)),
         default=None
-
+    ), option(
+        "--route",
+        help="""\
+How to use the quick model: both calls it before the main model, auto lets \
+a router pick one of them for each request, quick and main only call that \
+model\
+""",
+        type=click.Choice(get_args(Route)),
+        default="both"
+    ), option(
+        "--route-stats-file",
+        help="The file where response times used for routing are stored",
+        default=DEFAULT_ROUTE_STATS_FILE,
+        show_default=False
+    ), option(
+        "--compare",
+        help="""\
+Send the message to each SERVICE[:MODEL] concurrently instead of the main \
+model, saving each response to its own session file\
+""",
+        multiple=True,
+        metavar="SERVICE[:MODEL]"
+    ), option(
+        "--rate-limit",
+        help="""\
+Maximum requests per minute to each provider, shared by all concurrent \
+dotchatbot processes\
+""",
+        type=click.FloatRange(min=0, min_open=True),
+        default=None
+    ), option(
+        "--rate-limit-location",
+        help="The location where the shared rate limit state is stored",
+        default=DEFAULT_RATE_LIMIT_LOCATION,
+        show_default=False
     ), option(
         "--history",
         "-H",
         help="Print history of sessions",
         is_flag=True,
         default=False
+    ), option(
+        "--browse",
+        "-b",
+        help="""\
+Browse the history of sessions with a preview of each, and resume the \
+selected one\
+""",
+        is_flag=True,
+        default=False
+    )
+)
+@option_group(
+    "Content store options", option(
+        "--content-store",
+        help="Save sessions as manifests of messages in the content store",
+        is_flag=True,
+        default=False
+    ), option(
+        "--content-store-location",
+        help="The location where the content store keeps messages",
+        default=DEFAULT_CONTENT_STORE_LOCATION,
+        show_default=False
+    ), option(
+        "--fork",
+        help="Fork the session FILENAME into a new session file and exit, "
+             "sharing messages with FILENAME only if it is a manifest",
+        metavar="DESTINATION",
+        default=None
+    ), option(
+        "--export",
+        help="Print the session FILENAME as a plain session file and exit",
+        is_flag=True,
+        default=False
+    )
+)
+@option_group(
+    "Related sessions options", option(
+        "--related",
+        help="""\
+Print the sessions most similar to FILENAME (or STDIN, or a prompt written \
+in the editor) and exit\
+""",
+        is_flag=True,
+        default=False
+    ), option(
+        "--related-count",
+        help="The number of similar sessions to print",
+        type=click.IntRange(min=1),
+        default=10
+    ), option(
+        "--related-index-location",
+        help="The location where the related sessions index is stored",
+        default=DEFAULT_RELATED_INDEX_LOCATION,
+        show_default=False
+    ), option(
+        "--reindex",
+        help="Rebuild the related sessions index from the history and exit",
+        is_flag=True,
+        default=False
+    )
+)
+@option_group(
+    "Archive options", option(
+        "--archive",
+        help="""\
+Archive session directories older than ARCHIVE_AFTER_DAYS (default 30) \
+and exit\
+""",
+        is_flag=True,
+        default=False
+    ), option(
+        "--archive-after-days",
+        help="Automatically archive session directories older than N days",
+        type=click.IntRange(min=0),
+        default=None
+    ), option(
+        "--archive-location",
+        help="""\
+The location of the dated session directories to archive, archives are \
+stored in its archive directory\
+""",
+        default=DEFAULT_SESSION_ARCHIVE_LOCATION,
+        show_default=False
+    )
+)
+@option_group(
+    "Connection options", option(
+        "--timeout",
+        help="Seconds to wait for a response",
+        type=click.FloatRange(min=0, min_open=True),
+        default=600.0
+    ), option(
+        "--connect-timeout",
+        help="Seconds to wait for a connection to a provider",
+        type=click.FloatRange(min=0, min_open=True),
+        default=10.0
+    ), option(
+        "--http2/--no-http2",
+        help="Use HTTP/2 where supported (requires the h2 package)",
+        default=True
+    ), option(
+        "--prewarm",
+        help="Connect to the providers in the background while editing",
+        is_flag=True,
+        default=False
+    )
+)
+@option_group(
+    "Batch options", option(
+        "--batch-submit",
+        help="""\
+Send the session files (or directories of them) that end in a user message \
+to the batch API of SERVICE_NAME as one job and exit\
+""",
+        multiple=True,
+        metavar="PATH",
+        type=click.Path(exists=True)
+    ), option(
+        "--batch-poll",
+        help="Show the status of the submitted batch jobs and exit",
+        is_flag=True,
+        default=False
+    ), option(
+        "--batch-collect",
+        help="""\
+Write the responses of the finished batch jobs to their session files and \
+exit, sessions edited since they were submitted are left as they are\
+""",
+        is_flag=True,
+        default=False
+    ), option(
+        "--batch-state-file",
+        help="The file where the submitted batch jobs are tracked",
+        default=DEFAULT_BATCH_STATE_FILE,
+        show_default=False
+    ), option(
+        "--batch-base-url",
+        help="The base URL of the provider API used for batches"
     )
 )
 @option_group(
     "OpenAI options", option(
-        "--openai-model", default="gpt-4o"
+        "--openai-model", default=DEFAULT_MODELS["OpenAI"]
     ), option(
         "--quick-openai-model", default="gpt-4o"
     ), option(
@@ -209,7 +1161,7 @@ The prompt to use for the summary (for building the filename for the session)\
 )
 @option_group(
     "Anthropic options", option(
-        "--anthropic-model", default="claude-3-7-sonnet-latest"
+        "--anthropic-model", default=DEFAULT_MODELS["Anthropic"]
     ), option(
         "--quick-anthropic-model", default="claude-3-sonnet-latest"
     ), option(
@@ -220,7 +1172,7 @@ The prompt to use for the summary (for building the filename for the session)\
 )
 @option_group(
     "Google options", option(
-        "--google-model", default="gemini-2.5-pro"
+        "--google-model", default=DEFAULT_MODELS["Google"]
     ), option(
         "--quick-google-model", default="gemini-2.5-flash-lite"
     ), option(
@@ -251,6 +1203,11 @@ def dotchatbot(
     no_pager: bool,
     no_rich: bool,
     reverse: bool,
+    tail: Optional[int],
+    in_place: bool,
+    watch: Tuple[str, ...],
+    jsonl: bool,
+    jsonl_concurrency: int,
     assume_yes: bool,
     assume_no: bool,
     current_directory: bool,
@@ -259,15 +1216,41 @@ def dotchatbot(
     session_file_ext: str,
     summary_prompt: str,
     history: bool,
+    browse: bool,
+    content_store: bool,
+    content_store_location: str,
+    fork: Optional[str],
+    export: bool,
+    related: bool,
+    related_count: int,
+    related_index_location: str,
+    reindex: bool,
+    archive: bool,
+    archive_after_days: Optional[int],
+    archive_location: str,
+    timeout: float,
+    connect_timeout: float,
+    http2: bool,
+    prewarm: bool,
+    batch_submit: Tuple[str, ...],
+    batch_poll: bool,
+    batch_collect: bool,
+    batch_state_file: str,
+    batch_base_url: Optional[str],
     service_name: ServiceName,
-    summary_service_name: ServiceName,
+    summary_service_name: SummaryServiceName,
     quick_service_name: Optional[ServiceName],
-    openai_model: ChatModel,
-    summary_openai_model: ChatModel,
-    quick_openai_model: ChatModel,
-    anthropic_model: ModelParam,
-    summary_anthropic_model: ModelParam,
-    quick_anthropic_model: ModelParam,
+    route: Route,
+    route_stats_file: str,
+    compare: Tuple[str, ...],
+    rate_limit: Optional[float],
+    rate_limit_location: str,
+    openai_model: "ChatModel",
+    summary_openai_model: "ChatModel",
+    quick_openai_model: "ChatModel",
+    anthropic_model: "ModelParam",
+    summary_anthropic_model: "ModelParam",
+    quick_anthropic_model: "ModelParam",
     anthropic_max_tokens: int,
     google_model: str,
     summary_google_model: str,
@@ -283,9 +1266,101 @@ def dotchatbot(
     Starts a session with the chatbot, resume by providing FILENAME.
     Provide - for FILENAME to use the previous session
     (stored in SESSION_HISTORY_FILE).
+
+    Include a file in a message with a line @@< PATH, relative to the
+    session file. Google uploads included files once, OpenAI only PDFs;
+    other files, and every file for Anthropic, are sent inline in each
+    request.
     """
+    session_archive = SessionArchive(archive_location)
+    if archive or archive_after_days is not None:
+        days = 30 if archive_after_days is None else archive_after_days
+        for directory in session_archive.archive(days):
+            click.echo(f"Archived {directory}", file=sys.stderr)
+        if archive:
+            return
+
     if history:
-        _print_history(session_history_file)
+        _print_history(session_history_file, session_archive)
+        return
+
+    store = MessageStore(content_store_location)
+    related_index = RelatedIndex(related_index_location)
+    if reindex:
+        count = related_index.rebuild(
+            _history_sessions(session_history_file, store, session_archive)
+        )
+        click.echo(f"Indexed {count} sessions", file=sys.stderr)
+        return
+
+    if browse:
+        if not sys.stdin.isatty() or not sys.stdout.isatty():
+            raise UsageError("--browse requires a terminal")
+        filename = _browse(
+            session_history_file,
+            store,
+            session_archive,
+            lambda width: Renderer(
+                markdown_justify,
+                markdown_code_theme,
+                markdown_hyperlinks,
+                markdown_inline_code_lexer,
+                markdown_inline_code_theme,
+                min(markdown_max_width or width, width),
+                plain=True
+            )
+        )
+        if filename is None:
+            return
+
+    if filename == "-" and (related or fork or export):
+        filename = _previous_session(session_history_file)
+
+    if related:
+        _print_related(
+            related_index,
+            _related_text(filename, store, session_archive, session_file_ext),
+            related_count,
+            filename
+        )
+        return
+
+    configure(TransportOptions(
+        timeout=timeout,
+        connect_timeout=connect_timeout,
+        http2=http2,
+        # the pool must not queue requests the flags allow to run at once
+        max_connections=max(
+            TransportOptions.max_connections,
+            jsonl_concurrency if jsonl else 0,
+            len(compare)
+        )
+    ))
+    if batch_submit or batch_poll or batch_collect:
+        _batch(
+            BatchJobs(batch_state_file, Parser()),
+            _batch_clients(
+                batch_base_url,
+                system_prompt,
+                openai_model=openai_model,
+                anthropic_model=anthropic_model,
+                anthropic_max_tokens=anthropic_max_tokens
+            ),
+            service_name,
+            submit=batch_submit,
+            poll=batch_poll,
+            collect=batch_collect,
+            extension=session_file_ext,
+            store=store,
+            history_file=session_history_file,
+            related_index=related_index
+        )
+        return
+
+    if fork or export:
+        _fork_or_export(
+            filename, fork, store, session_archive, session_history_file
+        )
         return
 
     if assume_yes and assume_no:
@@ -296,45 +1371,29 @@ def dotchatbot(
     if sys.stdin.isatty() and not sys.stdout.isatty():
         raise UsageError("STDOUT must not be TTY when STDIN is TTY")
 
-    if not sys.stdin.isatty() and prompt_user:
+    if not sys.stdin.isatty() and prompt_user and not (watch or jsonl):
         raise UsageError("Must use -y or -n when STDIN is not TTY")
 
-    api_key = _get_api_key(service_name)
-    client = create_client(
-        service_name=service_name,
-        system_prompt=system_prompt,
-        api_key=api_key,
-        openai_model=openai_model,
-        anthropic_model=anthropic_model,
-        anthropic_max_tokens=anthropic_max_tokens,
-        google_model=google_model,
-    )
-
-    summary_api_key = _get_api_key(summary_service_name)
-    summary_client = create_client(
-        service_name=summary_service_name,
-        system_prompt=system_prompt,
-        api_key=summary_api_key,
-        openai_model=summary_openai_model,
-        anthropic_model=summary_anthropic_model,
-        anthropic_max_tokens=anthropic_max_tokens,
-        google_model=summary_google_model,
-    )
+    if in_place and (reverse or tail):
+        raise UsageError("--in-place cannot be used with --reverse or --tail")
 
-    quick_client = None
-    if quick_service_name:
-        quick_api_key = _get_api_key(quick_service_name)
-        quick_client = create_client(
-            service_name=quick_service_name,
-            system_prompt=system_prompt,
-            api_key=quick_api_key,
-            openai_model=quick_openai_model,
-            anthropic_model=quick_anthropic_model,
-            anthropic_max_tokens=anthropic_max_tokens,
-            google_model=quick_google_model,
-        )
+    if route in ("auto", "quick") and not quick_service_name:
+        raise UsageError(f"--route {route} requires --quick-service-name")
+    for target in compare:
+        if target.partition(":")[0] not in get_args(ServiceName):
+            raise UsageError(f"Invalid service name for --compare: {target}")
 
-    markdown_renderer = Renderer(
+    # Everything below is set up in the background, while the editor is open:
+    # clients (credentials, SDK imports) one at a time on one thread, the
+    # parser and renderer on another. Clients wait for it when first used.
+    setup = _start_setup(sys.stdin.isatty() and not (watch or jsonl))
+    click.get_current_context().call_on_close(lambda: _stop_setup(setup))
+    background = ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix="dcb-background"
+    )
+    parser_future = background.submit(Parser)
+    renderer_future = background.submit(
+        Renderer,
         markdown_justify,
         markdown_code_theme,
         markdown_hyperlinks,
@@ -342,108 +1401,132 @@ def dotchatbot(
         markdown_inline_code_theme,
         markdown_max_width
     )
-    parser = Parser()
+    background.shutdown(wait=False)
 
+    clients = _create_clients(
+        setup,
+        system_prompt,
+        service_name,
+        summary_service_name,
+        quick_service_name,
+        compare,
+        models={
+            "OpenAI": openai_model,
+            "Anthropic": anthropic_model,
+            "Google": google_model
+        },
+        summary_models={
+            "OpenAI": summary_openai_model,
+            "Anthropic": summary_anthropic_model,
+            "Google": summary_google_model
+        },
+        quick_models={
+            "OpenAI": quick_openai_model,
+            "Anthropic": quick_anthropic_model,
+            "Google": quick_google_model
+        },
+        anthropic_max_tokens=anthropic_max_tokens,
+        route_stats_file=route_stats_file,
+        rate_limit=rate_limit,
+        rate_limit_location=rate_limit_location
+    )
+    setup.shutdown(wait=False)
+
+    def new_session() -> Session:
+        return Session(
+            clients.main,
+            summary_client=clients.summary,
+            parser=parser_future.result(),
+            renderer=renderer_future.result(),
+            store=store,
+            archive=session_archive,
+            related_index=related_index,
+            history_file=session_history_file,
+            summary_prompt=summary_prompt,
+            extension=session_file_ext
+        )
+
+    if watch:
+        _watch(watch, new_session())
+        return
+
+    if jsonl:
+        _complete_jsonl(new_session(), jsonl_concurrency)
+        return
+
+    if current_directory:
+        session_file_location = os.curdir
+
+    session: Optional[Session] = None
+    tracked: Optional[TrackedSession] = None
     prompt = True
     while prompt:
-        messages = []
         if filename == "-":
-            if os.path.exists(session_history_file):
-                with open(session_history_file, "r") as f:
-                    lines = f.readlines()
-                    if lines:
-                        filename = lines[-1].strip()
-                        click.echo(
-                            f"Resuming from previous session: {filename}",
-                            file=sys.stderr
-                        )
-                    else:
-                        filename = None
-            else:
-                filename = None
-
-        if filename and os.path.exists(filename):
-            with open(filename, "r") as f:
-                messages = parser.parse(f.read())
-
-        if sys.stdin.isatty():
-            if not reverse:
-                file_content = generate_file_content(messages)
-                file_content = _edit(
-                    text=f"{file_content}{NEW_USER_MESSAGE}",
-                    extension=session_file_ext,
-                    reverse=reverse
-                )
-                messages = parser.parse(file_content)
-            else:
-                reversed_messages_from_file = list(reversed(messages))
-                file_content = generate_file_content(
-                    reversed_messages_from_file)
-                file_content = _edit(
-                    text=f"{NEW_USER_MESSAGE}{file_content}",
-                    extension=session_file_ext,
-                    reverse=reverse
+            filename = _previous_session(session_history_file)
+            if filename:
+                click.echo(
+                    f"Resuming from previous session: {filename}",
+                    file=sys.stderr
                 )
-                messages = list(reversed(parser.parse(file_content)))
-        else:
-            messages = [*messages, *parser.parse(sys.stdin.read())]
+        if in_place and tracked is None:
+            filename = _check_in_place(filename, session_archive)
 
-        is_empty_message = (
-            not messages
-            or not messages[-1].content.strip()
-            or messages[-1].role != "user"
+        service_names = (
+            service_name,
+            summary_service_name,
+            quick_service_name or service_name,
+            *(label.partition(":")[0] for label in clients.compare)
         )
-        if is_empty_message:
-            raise UsageError("Aborting request due to empty message")
+        if prewarm:
+            warm_up(service_names)
 
-        if quick_client:
-            quick_chatbot_response = quick_client.create_chat_completion(
-                messages
+        if in_place and filename:
+            tracked, messages = _prompt_in_place(
+                filename, tracked, parser_future.result
             )
-            _print_response(
-                no_rich,
-                True,
-                quick_chatbot_response,
-                markdown_renderer
+        else:
+            messages = _prompt_messages(
+                session,
+                filename,
+                store,
+                session_archive,
+                parser_future.result,
+                reverse,
+                tail,
+                session_file_ext
             )
-        chatbot_response = client.create_chat_completion(messages)
-        messages.append(chatbot_response)
+        if session is None:
+            session = new_session()
+        session.messages = messages
+        session.filename = filename
+        try:
+            session.check()
+        except ValueError as e:
+            raise UsageError(str(e))
+        if not _may_prompt.is_set():
+            _ask_for_api_keys(service_names)
+        _may_prompt.set()
 
-        _print_response(no_rich, no_pager, chatbot_response, markdown_renderer)
-
-        if prompt_user:
-            result = click.prompt(
-                "Save response?",
-                default="Y",
-                type=Choice(["y", "n", "c"], case_sensitive=False),
-                show_choices=True
+        if clients.compare:
+            _compare(
+                session,
+                clients.compare,
+                no_rich,
+                None if prompt_user else assume_yes,
+                session_file_location,
+                content_store
             )
-            save = result.lower() in ("y", "yes", "c")
-            prompt = result.lower() == "c"
-        elif assume_yes:
-            save = True
-            prompt = False
-        else:
-            save = False
-            prompt = False
+            return
 
-        if not filename and save:
-            filename = generate_filename(
-                summary_client, summary_prompt, messages, session_file_ext
+        _answer(session, clients, route, no_rich, no_pager)
+        save, prompt = _confirm_save(prompt_user, assume_yes)
+        if save:
+            filename = session.save(
+                location=session_file_location, content_store=content_store
             )
-            if current_directory:
-                filename = os.path.join(os.curdir, filename)
-            else:
-                filename = os.path.join(session_file_location, filename)
-
-        if filename and save:
-            with open(filename, "w") as f:
-                f.write(generate_file_content(messages))
-                session_file_absolute_path = os.path.abspath(f.name)
+            if tracked is not None:
+                tracked.saved(session.messages)
             click.echo(f"Saved to {filename}", file=sys.stderr)
-            open(session_history_file, "a").write(
-                session_file_absolute_path + "\n"
-            )
 
 
 if __name__ == "__main__":
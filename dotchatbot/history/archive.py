@@ -0,0 +1,179 @@
+import os
+import shutil
+import zipfile
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+from typing import ContextManager
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from dotchatbot.output.atomic import atomic_write
+from dotchatbot.output.atomic import locked
+
+ARCHIVE_DIRECTORY = "archive"
+INDEX_FILE = "index.tsv"
+LOCK_FILE = ".lock"
+
+Location = Tuple[str, str]
+
+
+def _session_date(name: str) -> Optional[date]:
+    try:
+        return date.fromisoformat(name)
+    except ValueError:
+        return None
+
+
+class SessionArchive:
+    """
+    Packs the dated session directories below ``location`` into compressed
+    monthly zip archives. An index maps each original session path to its
+    archive, member and modification time, so single sessions can be read
+    back without unpacking anything else.
+    """
+
+    def __init__(self, location: str) -> None:
+        self.location = os.path.abspath(location)
+        self.directory = os.path.join(self.location, ARCHIVE_DIRECTORY)
+        self.index_file = os.path.join(self.directory, INDEX_FILE)
+        self._index: Optional[Dict[str, Location]] = None
+        self._mtimes: Dict[str, float] = {}
+        self._index_stat: Optional[Tuple[float, int]] = None
+
+    @property
+    def index(self) -> Dict[str, Location]:
+        """Original absolute path to (archive file, member name)"""
+        if not os.path.exists(self.index_file):
+            return {}
+        stat = os.stat(self.index_file)
+        key = (stat.st_mtime, stat.st_size)
+        if self._index is None or key != self._index_stat:
+            index: Dict[str, Location] = {}
+            mtimes: Dict[str, float] = {}
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    path, archive, member, *mtime = (
+                        line.rstrip("\n").split("\t")
+                    )
+                    index[path] = (archive, member)
+                    # rows written before the column was added have none
+                    if mtime:
+                        mtimes[path] = float(mtime[0])
+            self._index, self._mtimes, self._index_stat = index, mtimes, key
+        return self._index
+
+    def lookup(self, filename: str) -> Optional[Location]:
+        return self.index.get(os.path.abspath(filename))
+
+    def read(self, filename: str) -> bytes:
+        location = self.lookup(filename)
+        if not location:
+            raise FileNotFoundError(filename)
+        archive, member = location
+        with zipfile.ZipFile(os.path.join(self.directory, archive)) as z:
+            return z.read(member)
+
+    def getmtime(self, filename: str) -> float:
+        location = self.lookup(filename)
+        if not location:
+            raise FileNotFoundError(filename)
+        mtime = self._mtimes.get(os.path.abspath(filename))
+        if mtime is not None:
+            return mtime
+        archive, member = location
+        with zipfile.ZipFile(os.path.join(self.directory, archive)) as z:
+            return datetime(*z.getinfo(member).date_time).timestamp()
+
+    def expired(self, days: int, today: Optional[date] = None) -> List[str]:
+        """Dated session directories older than ``days``"""
+        if not os.path.isdir(self.location):
+            return []
+        cutoff = (today or date.today()) - timedelta(days=days)
+        return sorted(
+            name for name in os.listdir(self.location)
+            if os.path.isdir(os.path.join(self.location, name))
+            and (session_date := _session_date(name)) is not None
+            and session_date < cutoff
+        )
+
+    def _archive_name(self, name: str, members: List[str]) -> str:
+        """
+        Sessions are grouped by month; a session directory that was archived
+        before and recreated since goes into a new volume rather than adding
+        duplicate members.
+        """
+        month = name[:7]
+        volume = 0
+        while True:
+            archive = f"{month}.zip" if not volume else f"{month}.{volume}.zip"
+            path = os.path.join(self.directory, archive)
+            if not os.path.exists(path):
+                return archive
+            with zipfile.ZipFile(path) as z:
+                if not set(members) & set(z.namelist()):
+                    return archive
+            volume += 1
+
+    def _locked(self) -> ContextManager[None]:
+        """Excludes every other process archiving into the same directory"""
+        return locked(os.path.join(self.directory, LOCK_FILE))
+
+    def archive(self, days: int, today: Optional[date] = None) -> List[str]:
+        """
+        Archives the session directories older than ``days``. Directories
+        (or files) removed while this runs are skipped.
+        """
+        archived = []
+        with self._locked():
+            for name in self.expired(days, today):
+                source = os.path.join(self.location, name)
+                if self._archive_directory(name, source):
+                    archived.append(source)
+        return archived
+
+    def _archive_directory(self, name: str, source: str) -> bool:
+        files = sorted(
+            os.path.join(directory, filename)
+            for directory, _, filenames in os.walk(source)
+            for filename in filenames
+        )
+        if not os.path.isdir(source):
+            return False
+        members = [
+            os.path.relpath(path, self.location).replace(os.sep, "/")
+            for path in files
+        ]
+        written = []
+        if files:
+            archive = self._archive_name(name, members)
+            path = os.path.join(self.directory, archive)
+            # the archive may hold the only copy of earlier directories, so
+            # it is appended to as a copy that replaces it once complete
+            with atomic_write(path, "w+b") as f:
+                if os.path.exists(path):
+                    with open(path, "rb") as existing:
+                        shutil.copyfileobj(existing, f)
+                with zipfile.ZipFile(
+                    f,
+                    "a",
+                    compression=zipfile.ZIP_DEFLATED,
+                    compresslevel=9
+                ) as z:
+                    for file, member in zip(files, members):
+                        try:
+                            mtime = os.path.getmtime(file)
+                            z.write(file, member)
+                        except FileNotFoundError:
+                            continue
+                        written.append((file, member, mtime))
+            with open(self.index_file, "a", encoding="utf-8") as f:
+                for file, member, mtime in written:
+                    f.write(f"{file}\t{archive}\t{member}\t{mtime}\n")
+        try:
+            shutil.rmtree(source)
+        except FileNotFoundError:
+            pass
+        return True
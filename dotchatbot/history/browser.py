@@ -0,0 +1,348 @@
+import curses
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+from typing import Callable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from dotchatbot.input.transformer import Message
+from dotchatbot.output.markdown import Renderer
+
+PREVIEW_MESSAGES = 4
+HELP = "enter resume  j/k move  pgup/pgdn page  g/G newest/oldest  q quit"
+
+
+@dataclass(frozen=True)
+class Entry:
+    # of its line in the history file
+    offset: int
+    filename: str
+
+
+class HistoryPager:
+    """
+    Pages through a session history file, newest first, from the byte offset
+    of an entry; only the lines of the requested page are read. Repeated
+    consecutive entries are shown once and missing sessions are skipped.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        exists: Callable[[str], bool] = os.path.exists,
+        block_size: int = 1 << 16
+    ) -> None:
+        self.filename = filename
+        self.exists = exists
+        self.block_size = block_size
+
+    def _backward(self, end: int) -> Iterator[Tuple[int, str]]:
+        """The lines before ``end``, last first, with their offsets"""
+        with open(self.filename, "rb") as f:
+            # buffer[:stop] holds the lines not yet yielded from ``start`` on
+            start, buffer, stop = end, b"", 0
+            while True:
+                newline = buffer.rfind(b"\n", 0, max(stop - 1, 0))
+                if newline == -1 and start > 0:
+                    read = min(self.block_size, start)
+                    start -= read
+                    f.seek(start)
+                    buffer = f.read(read) + buffer[:stop]
+                    stop = len(buffer)
+                    continue
+                line = buffer[newline + 1:stop].strip()
+                if line:
+                    yield start + newline + 1, line.decode("utf-8")
+                if newline == -1:
+                    return
+                stop = newline + 1
+
+    def _forward(self, start: int) -> Iterator[Tuple[int, str]]:
+        """The lines from ``start`` on, with their offsets"""
+        with open(self.filename, "rb") as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if line.strip():
+                    yield offset, line.strip().decode("utf-8")
+                offset += len(line)
+
+    def older(self, entry: Optional[Entry], count: int) -> List[Entry]:
+        """Up to ``count`` entries older than ``entry`` (or the newest)"""
+        if count <= 0 or not os.path.exists(self.filename):
+            return []
+        if entry is None:
+            end, previous = os.path.getsize(self.filename), None
+        else:
+            end, previous = entry.offset, entry.filename
+        entries: List[Entry] = []
+        for offset, filename in self._backward(end):
+            if filename == previous:
+                continue
+            previous = filename
+            if self.exists(filename):
+                entries.append(Entry(offset, filename))
+                if len(entries) == count:
+                    break
+        return entries
+
+    def newer(self, entry: Optional[Entry], count: int) -> List[Entry]:
+        """
+        Up to ``count`` entries newer than ``entry`` (or the oldest), newest
+        first like the other pages
+        """
+        if count <= 0 or not os.path.exists(self.filename):
+            return []
+        lines = self._forward(entry.offset if entry else 0)
+        if entry is not None:
+            next(lines, None)
+        entries: List[Entry] = []
+        pending: Optional[Entry] = None
+        for offset, filename in lines:
+            # a run of the same entry is shown as its last line
+            if pending is not None and pending.filename != filename:
+                if self.exists(pending.filename):
+                    entries.append(pending)
+                    if len(entries) == count:
+                        pending = None
+                        break
+            pending = Entry(offset, filename)
+        if pending is not None and self.exists(pending.filename):
+            entries.append(pending)
+        entries.reverse()
+        return entries
+
+
+class Window:
+    """The entries visible on screen and the selected one"""
+
+    def __init__(self, history: HistoryPager, height: int) -> None:
+        self.history = history
+        self.height = max(height, 1)
+        self.entries: List[Entry] = []
+        self.cursor = 0
+        self.top()
+
+    @property
+    def selected(self) -> Optional[Entry]:
+        return self.entries[self.cursor] if self.entries else None
+
+    def top(self) -> None:
+        self.entries = self.history.older(None, self.height)
+        self.cursor = 0
+
+    def bottom(self) -> None:
+        self.entries = self.history.newer(None, self.height)
+        self.cursor = max(len(self.entries) - 1, 0)
+
+    def move(self, delta: int) -> None:
+        if not self.entries:
+            return
+        index = self.cursor + delta
+        if index >= len(self.entries):
+            entries = [
+                *self.entries,
+                *self.history.older(
+                    self.entries[-1], index - len(self.entries) + 1
+                )
+            ]
+            index = min(index, len(entries) - 1)
+            start = max(index - self.height + 1, 0)
+        elif index < 0:
+            newer = self.history.newer(self.entries[0], -index)
+            entries = [*newer, *self.entries]
+            index = max(index + len(newer), 0)
+            start = index
+        else:
+            self.cursor = index
+            return
+        self.entries = entries[start:start + self.height]
+        self.cursor = index - start
+
+    def resize(self, height: int) -> None:
+        self.height = max(height, 1)
+        if self.cursor >= self.height:
+            self.entries = self.entries[self.cursor - self.height + 1:]
+            self.cursor = self.height - 1
+        missing = self.height - len(self.entries)
+        if self.entries and missing > 0:
+            self.entries += self.history.older(self.entries[-1], missing)
+        self.entries = self.entries[:self.height]
+
+
+class Preview:
+    """
+    Renders the last messages of the selected session on a background
+    thread. Requests for sessions that are no longer selected are dropped
+    and only the few most recent previews are kept.
+    """
+
+    def __init__(
+        self,
+        load: Callable[[str, int], List[Message]],
+        renderer: Callable[[], Renderer],
+        messages: int = PREVIEW_MESSAGES,
+        cache_size: int = 16
+    ) -> None:
+        self.load = load
+        self.renderer = renderer
+        self.messages = messages
+        self.cache_size = cache_size
+        self._renderer: Optional[Renderer] = None
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self._pending: Set[str] = set()
+        self._wanted: Optional[str] = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="dcb-preview"
+        )
+
+    def _render(self, filename: str) -> None:
+        try:
+            if self._wanted != filename:
+                return
+            if self._renderer is None:
+                self._renderer = self.renderer()
+            try:
+                text = "\n".join(
+                    line.rstrip()
+                    for message in self.load(filename, self.messages)
+                    for line in (
+                        f"@@> {message.role}:",
+                        *self._renderer.render(message).splitlines(),
+                        ""
+                    )
+                )
+            except Exception as e:
+                text = f"Cannot preview {filename}: {e}"
+            with self._lock:
+                self._cache[filename] = text
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        finally:
+            with self._lock:
+                self._pending.discard(filename)
+
+    def get(self, filename: str) -> Optional[str]:
+        """The preview of ``filename``, or None while it is rendered"""
+        with self._lock:
+            self._wanted = filename
+            if filename in self._cache:
+                self._cache.move_to_end(filename)
+                return self._cache[filename]
+            if filename not in self._pending:
+                self._pending.add(filename)
+                self._executor.submit(self._render, filename)
+        return None
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _add(
+    window: Any, y: int, x: int, text: str, width: int, *attr: int
+) -> None:
+    try:
+        window.addnstr(y, x, text, max(width, 0), *attr)
+    except curses.error:
+        # writing the bottom right corner moves the cursor off screen
+        pass
+
+
+def _draw(
+    screen: Any,
+    window: Window,
+    preview: Optional[str],
+    label: Callable[[str], str]
+) -> None:
+    rows, columns = screen.getmaxyx()
+    width = max(columns * 2 // 5, 1)
+    screen.erase()
+    for row, entry in enumerate(window.entries):
+        attr = curses.A_REVERSE if row == window.cursor else curses.A_NORMAL
+        _add(screen, row, 0, label(entry.filename).ljust(width), width, attr)
+    if not window.entries:
+        _add(screen, 0, 0, "No sessions in the history", width)
+    lines = (preview or "Loading...").splitlines()
+    for row, line in enumerate(lines[:rows - 1]):
+        _add(screen, row, width + 1, line, columns - width - 1)
+    _add(screen, rows - 1, 0, HELP, columns, curses.A_DIM)
+    screen.refresh()
+
+
+def _preview_width(columns: int) -> int:
+    return max(columns - columns * 2 // 5 - 2, 20)
+
+
+def _loop(
+    screen: Any,
+    history: HistoryPager,
+    load: Callable[[str, int], List[Message]],
+    renderer: Callable[[int], Renderer],
+    label: Callable[[str], str]
+) -> Optional[str]:
+    try:
+        curses.curs_set(0)
+    except curses.error:
+        pass
+    # wake up regularly to show previews as soon as they are rendered
+    screen.timeout(50)
+    rows, columns = screen.getmaxyx()
+    window = Window(history, rows - 1)
+    preview = Preview(load, lambda: renderer(_preview_width(columns)))
+    shown: Optional[Tuple[Any, ...]] = None
+    try:
+        while True:
+            selected = window.selected
+            text = preview.get(selected.filename) if selected else ""
+            state = (tuple(window.entries), window.cursor, text)
+            if state != shown:
+                _draw(screen, window, text, label)
+                shown = state
+            key = screen.getch()
+            if key in (ord("j"), curses.KEY_DOWN):
+                window.move(1)
+            elif key in (ord("k"), curses.KEY_UP):
+                window.move(-1)
+            elif key in (ord(" "), curses.KEY_NPAGE):
+                window.move(window.height)
+            elif key == curses.KEY_PPAGE:
+                window.move(-window.height)
+            elif key in (ord("g"), curses.KEY_HOME):
+                window.top()
+            elif key in (ord("G"), curses.KEY_END):
+                window.bottom()
+            elif key in (ord("\n"), ord("\r"), curses.KEY_ENTER):
+                if selected:
+                    return selected.filename
+            elif key in (ord("q"), 27):
+                return None
+            elif key == curses.KEY_RESIZE:
+                rows, columns = screen.getmaxyx()
+                window.resize(rows - 1)
+                shown = None
+    finally:
+        preview.close()
+
+
+def browse(
+    history: HistoryPager,
+    load: Callable[[str, int], List[Message]],
+    renderer: Callable[[int], Renderer],
+    label: Callable[[str], str] = os.path.basename
+) -> Optional[str]:
+    """
+    Browses the history in the terminal, previewing the selected session.
+    Returns the session chosen to resume, if any.
+
+    ``load`` reads the last messages of a session and ``renderer`` builds
+    the renderer of previews for a width, on the background thread.
+    """
+    return curses.wrapper(_loop, history, load, renderer, label)
@@ -0,0 +1,219 @@
+import os
+import zlib
+from collections import Counter
+from typing import Callable
+from typing import ContextManager
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import TYPE_CHECKING
+from typing import TypeVar
+
+from dotchatbot.client.local import words
+from dotchatbot.input.transformer import Message
+from dotchatbot.output.atomic import atomic_write
+from dotchatbot.output.atomic import locked
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+
+    Vector = npt.NDArray[np.float32]
+
+T = TypeVar("T")
+
+DIMENSIONS = 1024
+VECTORS_FILE = "vectors.f32"
+PATHS_FILE = "paths.txt"
+GENERATION_FILE = "generation"
+LOCK_FILE = ".lock"
+
+
+def embed(text: str, dimensions: int = DIMENSIONS) -> "Vector":
+    """
+    Signed feature hashing of the words in ``text`` with sublinear term
+    frequencies, normalized to unit length.
+    """
+    # numpy is only imported once the index is used, not at startup
+    import numpy as np
+
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for word, count in Counter(words(text)).items():
+        checksum = zlib.crc32(word.encode("utf-8"))
+        sign = 1.0 if checksum & 0x80000000 else -1.0
+        vector[checksum % dimensions] += sign * (1.0 + np.log(count))
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+
+def _text(messages: Iterable[Message]) -> str:
+    return "\n".join(message.content for message in messages)
+
+
+class RelatedIndex:
+    """
+    Local similarity index over sessions. Session vectors are stored as rows
+    of a memory-mapped float32 matrix, with the session paths kept in a
+    separate file in row order; saving a session updates its row in place
+    or appends a new one. Writers hold a lock on the index for both files,
+    and the paths are read incrementally as other processes append them.
+
+    Rebuilding replaces both files, one after the other, so it bumps a
+    generation counter to an odd number before and to an even one after.
+    Readers that see it odd, or changed by the end of their read, read again
+    under the lock.
+    """
+
+    def __init__(self, location: str, dimensions: int = DIMENSIONS) -> None:
+        self.location = location
+        self.dimensions = dimensions
+        self.vectors_file = os.path.join(location, VECTORS_FILE)
+        self.paths_file = os.path.join(location, PATHS_FILE)
+        self.generation_file = os.path.join(location, GENERATION_FILE)
+        self._paths: List[str] = []
+        self._rows: Dict[str, int] = {}
+        # the paths file read so far: its inode and the offset read up to
+        self._read: Optional[Tuple[int, int]] = None
+
+    @property
+    def _row_size(self) -> int:
+        return self.dimensions * 4
+
+    def _load(self) -> List[str]:
+        """The paths in row order, reading only lines appended since"""
+        try:
+            stat = os.stat(self.paths_file)
+        except FileNotFoundError:
+            self._paths, self._rows, self._read = [], {}, None
+            return self._paths
+        if (
+            self._read is None
+            or self._read[0] != stat.st_ino
+            or self._read[1] > stat.st_size
+        ):
+            # rebuilt since
+            self._paths, self._rows, self._read = [], {}, (stat.st_ino, 0)
+        inode, offset = self._read
+        if offset < stat.st_size:
+            with open(self.paths_file, "rb") as f:
+                f.seek(offset)
+                data = f.read(stat.st_size - offset)
+            # a line still being written is read next time
+            data = data[:data.rfind(b"\n") + 1]
+            for line in data.decode("utf-8").splitlines():
+                self._rows[line] = len(self._paths)
+                self._paths.append(line)
+            self._read = (inode, offset + len(data))
+        return self._paths
+
+    def _generation(self) -> int:
+        try:
+            with open(self.generation_file, "r") as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _set_generation(self, generation: int) -> None:
+        with atomic_write(self.generation_file) as f:
+            f.write(str(generation))
+
+    def _consistent(self, read: Callable[[], T]) -> T:
+        """``read``, under the lock if a rebuild ran at the same time"""
+        generation = self._generation()
+        if generation % 2 == 0:
+            result = read()
+            if self._generation() == generation:
+                return result
+        with self._locked():
+            return read()
+
+    def _indexed_paths(self) -> List[str]:
+        if not os.path.exists(self.vectors_file):
+            return []
+        paths = self._load()
+        # rows whose vector was not fully written are ignored
+        rows = os.path.getsize(self.vectors_file) // self._row_size
+        return paths[:rows]
+
+    def paths(self) -> List[str]:
+        return self._consistent(self._indexed_paths)
+
+    def _locked(self) -> ContextManager[None]:
+        """Excludes every other process writing to the index"""
+        return locked(os.path.join(self.location, LOCK_FILE))
+
+    def _matrix(self, rows: int) -> "np.memmap":
+        import numpy as np
+
+        return np.memmap(
+            self.vectors_file,
+            dtype=np.float32,
+            mode="r",
+            shape=(rows, self.dimensions)
+        )
+
+    def add(self, filename: str, messages: Iterable[Message]) -> None:
+        path = os.path.abspath(filename)
+        vector = embed(_text(messages), self.dimensions)
+        with self._locked():
+            size = len(self._load()) * self._row_size
+            row = self._rows.get(path)
+            # drops the vector of an add interrupted before its path
+            if os.path.exists(self.vectors_file):
+                if os.path.getsize(self.vectors_file) > size:
+                    os.truncate(self.vectors_file, size)
+            if row is not None:
+                with open(self.vectors_file, "r+b") as f:
+                    f.seek(row * self._row_size)
+                    f.write(vector.tobytes())
+                return
+            # the vector goes first, so readers never see a path without one
+            with open(self.vectors_file, "ab") as f:
+                f.write(vector.tobytes())
+            with open(self.paths_file, "a", encoding="utf-8") as f:
+                f.write(f"{path}\n")
+
+    def rebuild(self, sessions: Iterable[Tuple[str, List[Message]]]) -> int:
+        count = 0
+        with self._locked():
+            with (
+                open(f"{self.vectors_file}.tmp", "wb") as vectors,
+                open(f"{self.paths_file}.tmp", "w", encoding="utf-8") as paths
+            ):
+                for filename, messages in sessions:
+                    vector = embed(_text(messages), self.dimensions)
+                    vectors.write(vector.tobytes())
+                    paths.write(f"{os.path.abspath(filename)}\n")
+                    count += 1
+            generation = self._generation()
+            self._set_generation(generation + 1)
+            os.replace(f"{self.vectors_file}.tmp", self.vectors_file)
+            os.replace(f"{self.paths_file}.tmp", self.paths_file)
+            self._set_generation(generation + 2)
+        return count
+
+    def query(self, text: str, count: int) -> List[Tuple[str, float]]:
+        """The ``count`` sessions most similar to ``text`` by cosine"""
+        import numpy as np
+
+        if count <= 0:
+            return []
+        vector = embed(text, self.dimensions)
+
+        def scored() -> "Tuple[List[str], Vector]":
+            paths = self._indexed_paths()
+            if not paths:
+                return [], np.zeros(0, dtype=np.float32)
+            return paths, self._matrix(len(paths)) @ vector
+
+        paths, scores = self._consistent(scored)
+        if not paths:
+            return []
+        count = min(count, len(paths))
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top])]
+        return [(paths[row], float(scores[row])) for row in top]
@@ -0,0 +1,61 @@
+import hashlib
+import mimetypes
+import os
+import re
+from dataclasses import dataclass
+from functools import cached_property
+from typing import List
+
+INCLUDE = re.compile(r"^@@<[ \t]+(.+?)[ \t]*$", re.MULTILINE)
+
+
+@dataclass(frozen=True)
+class Include:
+    """
+    A local file referenced from a message with an ``@@< path`` line.
+    Relative paths are relative to ``directory`` (the one of the session
+    file). The file is only read (and hashed) once its content is needed.
+    """
+    path: str
+    directory: str = ""
+
+    @property
+    def location(self) -> str:
+        return os.path.join(self.directory, os.path.expanduser(self.path))
+
+    @cached_property
+    def data(self) -> bytes:
+        with open(self.location, "rb") as f:
+            return f.read()
+
+    @cached_property
+    def digest(self) -> str:
+        return hashlib.sha256(self.data).hexdigest()
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+    @property
+    def mime_type(self) -> str:
+        return mimetypes.guess_type(self.path)[0] or "text/plain"
+
+    def inline(self) -> str:
+        text = self.data.decode("utf-8", errors="replace")
+        if not text.endswith("\n"):
+            text += "\n"
+        return f'<file name="{self.path}">\n{text}</file>'
+
+
+def split_includes(content: str, directory: str = "") -> List[str | Include]:
+    """Splits message content into text and include directives"""
+    parts: List[str | Include] = []
+    offset = 0
+    for match in INCLUDE.finditer(content):
+        if match.start() > offset:
+            parts.append(content[offset:match.start()])
+        parts.append(Include(match.group(1), directory))
+        offset = match.end()
+    if offset < len(content):
+        parts.append(content[offset:])
+    return parts
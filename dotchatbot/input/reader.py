@@ -0,0 +1,178 @@
+import mmap
+import re
+from typing import BinaryIO
+from typing import get_args
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from dotchatbot.input.transformer import Message
+from dotchatbot.input.transformer import Role
+
+HEADER = re.compile(rb"@@>[ \t\f\r\n]+([a-zA-Z]+):[ \t\f\r\n]+")
+HEADER_MARKER = b"@@>"
+
+Section = Tuple[Role, int, int]
+
+
+def _role(value: bytes) -> Role:
+    role = value.decode("utf-8")
+    if role not in get_args(Role):
+        raise ValueError(f"Invalid role: {role}")
+    return role  # type: ignore[return-value]
+
+
+class SessionReader:
+    """
+    Reads a session file through a memory map, yielding messages lazily.
+
+    Section boundaries are located by scanning for headers, so iterating
+    backwards (see ``reversed`` and ``tail``) only touches the end of the
+    file. Sessions that are not plain files (e.g. archived ones) can be read
+    from memory by passing their ``data``.
+    """
+
+    def __init__(self, filename: str, data: Optional[bytes] = None) -> None:
+        self.filename = filename
+        self._file: Optional[BinaryIO] = None
+        self._map: Optional[mmap.mmap | bytes] = data or None
+        self._sections: Optional[List[Section]] = None
+        if data is not None:
+            return
+        self._file = open(filename, "rb")
+        try:
+            self._map = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        except ValueError:
+            # empty files cannot be memory-mapped
+            self._map = None
+
+    def __enter__(self) -> "SessionReader":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._map = None
+        if self._file:
+            self._file.close()
+
+    def _header_at(self, offset: int) -> Optional[re.Match[bytes]]:
+        assert self._map is not None
+        if offset > 0 and self._map[offset - 1:offset] != b"\n":
+            return None
+        return HEADER.match(self._map, offset)  # type: ignore[call-overload]
+
+    def _leading_section(self, end: int) -> Optional[Section]:
+        """Content before the first header is treated as a user message"""
+        assert self._map is not None
+        start = 0
+        while start < end and self._map[start:start + 1].isspace():
+            start += 1
+        if start == end:
+            return None
+        return "user", start, end
+
+    def _scan_forward(self) -> Iterator[Section]:
+        if self._map is None:
+            return
+        previous: Optional[re.Match[bytes]] = None
+        offset = self._map.find(HEADER_MARKER)
+        while offset != -1:
+            match = self._header_at(offset)
+            if match:
+                if previous:
+                    yield _role(previous.group(1)), previous.end(), offset
+                else:
+                    leading = self._leading_section(offset)
+                    if leading:
+                        yield leading
+                previous = match
+            offset = self._map.find(HEADER_MARKER, offset + 1)
+        if previous:
+            yield _role(previous.group(1)), previous.end(), len(self._map)
+        else:
+            leading = self._leading_section(len(self._map))
+            if leading:
+                yield leading
+
+    def _scan_backward(self) -> Iterator[Tuple[Section, int]]:
+        """Sections from the end, each with the offset of its header"""
+        if self._map is None:
+            return
+        end = len(self._map)
+        offset = self._map.rfind(HEADER_MARKER)
+        while offset != -1:
+            match = self._header_at(offset)
+            if match:
+                role = _role(match.group(1))
+                yield (role, min(match.end(), end), end), offset
+                end = offset
+            if offset == 0:
+                break
+            offset = self._map.rfind(HEADER_MARKER, 0, offset)
+        leading = self._leading_section(end)
+        if leading:
+            yield leading, 0
+
+    def _message(self, section: Section) -> Message:
+        assert self._map is not None
+        role, start, end = section
+        return Message(
+            role=role, content=self._map[start:end].decode("utf-8")
+        )
+
+    def sections(self) -> List[Section]:
+        """Role, start and end offsets of every section, in file order"""
+        if self._sections is None:
+            self._sections = list(self._scan_forward())
+        return self._sections
+
+    def __len__(self) -> int:
+        return len(self.sections())
+
+    def __iter__(self) -> Iterator[Message]:
+        if self._sections is not None:
+            return map(self._message, self._sections)
+        return map(self._message, self._scan_forward())
+
+    def __reversed__(self) -> Iterator[Message]:
+        if self._sections is not None:
+            return map(self._message, reversed(self._sections))
+        return (self._message(section) for section, _ in self._scan_backward())
+
+    def tail(self, count: int) -> List[Message]:
+        """The last ``count`` messages, in file order"""
+        if count <= 0:
+            return []
+        messages = []
+        for message in reversed(self):
+            messages.append(message)
+            if len(messages) == count:
+                break
+        messages.reverse()
+        return messages
+
+    def before(self, count: int) -> "SessionReader":
+        """
+        A reader over the messages before the last ``count``, holding the
+        bytes they are read from but decoding nothing yet
+        """
+        assert count > 0
+        data = self._map[:self.tail_offset(count)] if self._map else b""
+        return SessionReader(self.filename, bytes(data))
+
+    def tail_offset(self, count: int) -> int:
+        """Where the last ``count`` messages start, found from the end"""
+        offset = len(self._map) if self._map is not None else 0
+        if count <= 0:
+            return offset
+        for index, (_, offset) in enumerate(self._scan_backward(), 1):
+            if index == count:
+                break
+        return offset
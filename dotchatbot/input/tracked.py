@@ -0,0 +1,116 @@
+import hashlib
+import os
+import re
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from dotchatbot.input.parser import Parser
+from dotchatbot.input.reader import HEADER
+from dotchatbot.input.transformer import Message
+from dotchatbot.output.file import sections
+
+LINE_HEADER = re.compile(rb"^" + HEADER.pattern, re.MULTILINE)
+
+Stat = Tuple[int, int]
+
+
+def _stat(filename: str) -> Stat:
+    stat = os.stat(filename)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _last_header(data: bytes) -> Optional[int]:
+    offset = None
+    for match in LINE_HEADER.finditer(data):
+        offset = match.start()
+    return offset
+
+
+def append_section(filename: str, text: str) -> None:
+    """
+    Appends a section to a session file, separated from the previous one by
+    a blank line
+    """
+    with open(filename, "ab+") as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(size - 2, 0))
+        end = f.read()
+        separator = b""
+        if size and end != b"\n\n":
+            separator = b"\n" if end.endswith(b"\n") else b"\n\n"
+        f.write(separator + text.encode("utf-8"))
+
+
+class TrackedSession:
+    """
+    Keeps the parsed messages of a session file in memory between edits.
+
+    Everything before the last section is considered stable: when the file
+    changes (by modification time and size) and that prefix still hashes
+    the same, only the sections after it are parsed again.
+    """
+
+    def __init__(self, filename: str, parser: Parser) -> None:
+        self.filename = filename
+        self.parser = parser
+        self.messages: List[Message] = []
+        self._stat: Optional[Stat] = None
+        self._stable_offset = 0
+        self._stable_digest = hashlib.sha256().digest()
+        self._stable_count = 0
+
+    def _mark(self, data: bytes, offset: int) -> None:
+        """Makes the sections before the last header in data[offset:] stable"""
+        last_header = _last_header(data[offset:])
+        if last_header is None or not self.messages:
+            self._stable_offset, self._stable_count = 0, 0
+        else:
+            self._stable_offset = offset + last_header
+            self._stable_count = len(self.messages) - 1
+        self._stable_digest = hashlib.sha256(
+            data[:self._stable_offset]
+        ).digest()
+
+    def refresh(self) -> List[Message]:
+        """Re-parses whatever changed on disk since the last refresh"""
+        stat = _stat(self.filename)
+        if stat == self._stat:
+            return self.messages
+        with open(self.filename, "rb") as f:
+            data = f.read()
+        self._stat = stat
+
+        prefix = data[:self._stable_offset]
+        unchanged = (
+            hashlib.sha256(prefix).digest() == self._stable_digest
+            and HEADER.match(data, self._stable_offset) is not None
+        )
+        if unchanged:
+            tail = data[self._stable_offset:].decode("utf-8")
+            self.messages = [
+                *self.messages[:self._stable_count], *self.parser.parse(tail)
+            ]
+            self._mark(data, self._stable_offset)
+        else:
+            self.messages = self.parser.parse(data.decode("utf-8"))
+            self._mark(data, 0)
+        return self.messages
+
+    def append(self, text: str) -> None:
+        append_section(self.filename, text)
+        self.refresh()
+
+    def saved(self, messages: List[Message]) -> None:
+        """Records that ``messages`` were just written to the file"""
+        self.messages = list(messages)
+        digest = hashlib.sha256()
+        offset = 0
+        for section in sections(self.messages[:-1]):
+            data = section.encode("utf-8")
+            digest.update(data)
+            offset += len(data)
+        self._stat = _stat(self.filename)
+        self._stable_offset = offset
+        self._stable_count = max(len(self.messages) - 1, 0)
+        self._stable_digest = digest.digest()
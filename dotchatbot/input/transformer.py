@@ -1,7 +1,11 @@
+import hashlib
 from dataclasses import dataclass
+from dataclasses import field
+from dataclasses import replace
 from typing import get_args
 from typing import List
 from typing import Literal
+from typing import Optional
 from typing import Tuple
 from typing import TypeGuard
 
@@ -9,13 +13,54 @@ from lark import Token
 from lark import Transformer
 from lark import Tree
 
+from dotchatbot.input.include import Include
+from dotchatbot.input.include import split_includes
+
 Role = Literal["system", "user", "assistant"]
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Message:
     role: Role
     content: str
+    # the directory relative includes are read from, the session file's
+    directory: str = field(default="", repr=False, compare=False)
+    # off for content from untrusted input, whose includes are left as text
+    read_includes: bool = field(default=True, repr=False, compare=False)
+    _digest: Optional[str] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    @property
+    def digest(self) -> str:
+        """SHA-256 of the role and content, computed once"""
+        if self._digest is None:
+            data = hashlib.sha256()
+            data.update(self.role.encode("utf-8"))
+            data.update(b"\0")
+            data.update(self.content.encode("utf-8"))
+            object.__setattr__(self, "_digest", data.hexdigest())
+        return self._digest  # type: ignore[return-value]
+
+    @property
+    def includes(self) -> List[Include]:
+        if not self.read_includes or "@@<" not in self.content:
+            return []
+        return [
+            part for part in split_includes(self.content, self.directory)
+            if isinstance(part, Include)
+        ]
+
+
+def resolve_includes(
+    messages: List[Message], directory: str
+) -> List[Message]:
+    """The messages, reading their relative includes from ``directory``"""
+    return [
+        replace(message, directory=directory) if "@@<" in message.content
+        else message
+        for message in messages
+    ]
 
 
 def _content_type_guard(items: List[Tree | str]) -> TypeGuard[List[str]]:
@@ -0,0 +1,183 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_ISDIR = 0x40000000
+EVENT = struct.Struct("iIII")
+
+Snapshot = Dict[str, Tuple[int, int]]
+
+
+class _Inotify:
+    """Directory watches through the Linux inotify API, via ctypes"""
+
+    def __init__(self) -> None:
+        libc = ctypes.CDLL(
+            ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+        )
+        self._add_watch = libc.inotify_add_watch
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories: Dict[int, str] = {}
+
+    def add(self, directory: str) -> None:
+        wd = self._add_watch(
+            self.fd,
+            os.fsencode(directory),
+            IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+        )
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"Cannot watch {directory}")
+        self.directories[wd] = directory
+
+    def read(self, timeout: Optional[float]) -> Set[str]:
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        data = os.read(self.fd, 65536)
+        paths = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if name and not mask & IN_ISDIR and wd in self.directories:
+                directory = self.directories[wd]
+                paths.add(os.path.join(directory, os.fsdecode(name)))
+        return paths
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class Watcher:
+    """
+    Watches session files and directories of session files, yielding the
+    files that changed in batches. Bursts of changes (editors often write a
+    file several times when saving) are debounced into a single batch.
+
+    inotify is used where available, other platforms poll for changes.
+    """
+
+    def __init__(
+        self,
+        paths: Iterable[str],
+        extension: str = ".dcb",
+        debounce: float = 0.3,
+        interval: float = 1.0,
+        inotify: bool = True
+    ) -> None:
+        self.extension = extension
+        self.debounce = debounce
+        self.interval = interval
+        self.files: Set[str] = set()
+        self.directories: Set[str] = set()
+        for path in paths:
+            path = os.path.abspath(path)
+            if os.path.isdir(path):
+                self.directories.add(path)
+            else:
+                self.files.add(path)
+        self._inotify: Optional[_Inotify] = None
+        if inotify:
+            try:
+                self._inotify = _Inotify()
+                for directory in self.directories | {
+                    os.path.dirname(path) for path in self.files
+                }:
+                    self._inotify.add(directory)
+            except (AttributeError, OSError):
+                self.close()
+        self._snapshot = self.snapshot()
+
+    @property
+    def backend(self) -> str:
+        return "inotify" if self._inotify else "polling"
+
+    def close(self) -> None:
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+
+    def _matches(self, path: str) -> bool:
+        if path in self.files:
+            return True
+        return (
+            os.path.dirname(path) in self.directories
+            and path.endswith(self.extension)
+        )
+
+    def snapshot(self) -> Snapshot:
+        """Modification time and size of every watched file"""
+        paths = set(self.files)
+        for directory in self.directories:
+            paths.update(
+                os.path.join(directory, name)
+                for name in os.listdir(directory)
+                if name.endswith(self.extension)
+            )
+        snapshot = {}
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def _poll(self, timeout: Optional[float]) -> Set[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self.snapshot()
+            changed = {
+                path for path, stat in snapshot.items()
+                if self._snapshot.get(path) != stat
+            }
+            self._snapshot = snapshot
+            if changed:
+                return changed
+            if deadline is None:
+                wait = self.interval
+            else:
+                wait = min(self.interval, deadline - time.monotonic())
+            if wait <= 0:
+                return set()
+            time.sleep(wait)
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """Watched files that changed within ``timeout`` seconds"""
+        if self._inotify is None:
+            return self._poll(timeout)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None
+            if deadline is not None:
+                remaining = max(deadline - time.monotonic(), 0)
+            changed = {
+                path for path in self._inotify.read(remaining)
+                if self._matches(path)
+            }
+            if changed or remaining == 0:
+                return changed
+
+    def __iter__(self) -> Iterator[List[str]]:
+        while True:
+            changed = self.wait()
+            while more := self.wait(self.debounce):
+                changed |= more
+            yield sorted(changed)
@@ -0,0 +1,50 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import IO
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover (Windows)
+    fcntl = None  # type: ignore[assignment]
+
+
+@contextmanager
+def locked(filename: str) -> Iterator[None]:
+    """
+    Holds an exclusive lock on ``filename`` (created if needed), excluding
+    every other thread or process locking the same file
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    with open(filename, "a") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+@contextmanager
+def atomic_write(filename: str, mode: str = "w") -> Iterator[IO]:
+    """
+    A temporary file next to ``filename`` that replaces it once written, so
+    readers only ever see the old or the complete new content. Nothing is
+    replaced if writing fails.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    os.makedirs(directory, exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        if "b" in mode:
+            f = os.fdopen(fd, mode)
+        else:
+            f = os.fdopen(fd, mode, encoding="utf-8", newline="")
+        with f:
+            yield f
+        os.replace(temporary, filename)
+    except BaseException:
+        os.unlink(temporary)
+        raise
@@ -1,10 +1,12 @@
+import io
 import re
 from typing import Callable
 from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import TextIO
 
 import zlib
-from typing_extensions import Buffer
 
 from dotchatbot.client.services import ServiceClient
 from dotchatbot.input.transformer import Message
@@ -14,24 +16,32 @@ NEW_USER_MESSAGE = "@@> user:\n\n"
 OutputRenderer = Callable[[List[Message]], str]
 
 
+def sections(messages: Iterable[Message]) -> Iterator[str]:
+    """The serialized sections of a session file, one message at a time"""
+    for message in messages:
+        yield f"@@> {message.role}:\n"
+        yield message.content.strip()
+        yield "\n\n"
+
+
+def write_file_content(messages: Iterable[Message], f: TextIO) -> None:
+    """Writes a session file without building it in memory first"""
+    for section in sections(messages):
+        f.write(section)
+
+
 def generate_file_content(messages: List[Message]) -> str:
-    if not messages:
-        return ""
-    result = map(
-        lambda message: f"@@> {message.role}:\n{message.content.strip()}",
-        messages
-    )
-    return "\n\n".join(result) + "\n\n"
+    f = io.StringIO()
+    write_file_content(messages, f)
+    return f.getvalue()
 
 
 def _hash_messages(
-    messages: list[Message], length: int = 5
+    messages: Iterable[Message], length: int = 5
 ) -> str:
-    data: Iterable = list(messages)
-    data = map(lambda m: m.content, data)
-    data: str = "".join(data)
-    data: Buffer = bytes(data, "utf-8")
-    checksum = zlib.crc32(data) & 0xffffffff
+    checksum = 0
+    for message in messages:
+        checksum = zlib.crc32(message.content.encode("utf-8"), checksum)
     return format(checksum, 'x').zfill(length)[:length]
 
 
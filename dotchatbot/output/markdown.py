@@ -1,6 +1,5 @@
 from rich.console import Console
 from rich.console import JustifyMethod
-from rich.markdown import Markdown
 from typing import Optional
 
 from dotchatbot.input.transformer import Message
@@ -15,7 +14,10 @@ class Renderer:
         markdown_inline_code_lexer: str | None = None,
         markdown_inline_code_theme: str | None = None,
         markdown_max_width: Optional[int] = None,
+        plain: bool = False,
     ) -> None:
+        # imported here so that it can happen in the background
+        from rich.markdown import Markdown
         self.get_markdown = lambda output: Markdown(
             output,
             justify=markdown_justify,
@@ -24,7 +26,10 @@ class Renderer:
             inline_code_lexer=markdown_inline_code_lexer,
             inline_code_theme=markdown_inline_code_theme
         )
-        self.console = Console(width=markdown_max_width)
+        # plain output has no escape codes, e.g. for curses
+        self.console = Console(
+            width=markdown_max_width, color_system=None if plain else "auto"
+        )
 
     def render(self, message: Message) -> str:
         markdown = self.get_markdown(message.content)
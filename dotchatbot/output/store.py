@@ -0,0 +1,132 @@
+import os
+from typing import get_args
+from typing import Iterable
+from typing import Iterator
+from typing import List
+
+from dotchatbot.input.reader import SessionReader
+from dotchatbot.input.transformer import Message
+from dotchatbot.input.transformer import Role
+from dotchatbot.output.atomic import atomic_write
+
+MANIFEST_HEADER = "#!dcb-manifest v1\n"
+
+
+def is_manifest(filename: str) -> bool:
+    with open(filename, "rb") as f:
+        return f.read(len(MANIFEST_HEADER)) == MANIFEST_HEADER.encode()
+
+
+def _write_atomic(path: str, data: str) -> None:
+    with atomic_write(path) as f:
+        f.write(data)
+
+
+def _write_manifest(filename: str, digests: List[str]) -> None:
+    _write_atomic(
+        os.path.abspath(filename),
+        MANIFEST_HEADER + "".join(f"{digest}\n" for digest in digests)
+    )
+
+
+class MessageStore:
+    """
+    Content-addressed storage for messages: every message is kept once,
+    under the SHA-256 of its role and content, and session files become
+    manifests listing the digests of their messages.
+    """
+
+    def __init__(self, location: str) -> None:
+        self.location = location
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.location, "objects", digest[:2], digest[2:])
+
+    def put(self, message: Message) -> str:
+        digest = message.digest
+        path = self._path(digest)
+        if not os.path.exists(path):
+            _write_atomic(path, f"{message.role}\n{message.content}")
+        return digest
+
+    def get(self, digest: str) -> Message:
+        with open(
+            self._path(digest), "r", encoding="utf-8", newline=""
+        ) as f:
+            role = f.readline().rstrip("\n")
+            content = f.read()
+        if role not in get_args(Role):
+            raise ValueError(f"Invalid role: {role}")
+        return Message(role=role, content=content)  # type: ignore[arg-type]
+
+    def write_manifest(
+        self, filename: str, messages: Iterable[Message]
+    ) -> None:
+        _write_manifest(filename, [self.put(message) for message in messages])
+
+    def open(self, filename: str) -> "ManifestReader":
+        with open(filename, "r", encoding="utf-8") as f:
+            return self.load(f.read())
+
+    def load(self, manifest: str) -> "ManifestReader":
+        if not manifest.startswith(MANIFEST_HEADER):
+            raise ValueError("Not a manifest")
+        digests = manifest[len(MANIFEST_HEADER):].split()
+        return ManifestReader(self, digests)
+
+    def fork(
+        self, source: "SessionReader | ManifestReader", destination: str
+    ) -> None:
+        """
+        Branches a session: manifests are copied as-is, plain session files
+        are imported into the store first. Raises ``FileExistsError`` rather
+        than replacing an existing ``destination``.
+
+        Only forking a manifest is cheap and shares its messages on disk. A
+        plain session is left as it is, so forking it reads every message
+        and keeps a second copy of them in the store.
+        """
+        if os.path.exists(destination):
+            raise FileExistsError(destination)
+        if isinstance(source, ManifestReader):
+            _write_manifest(destination, source.digests)
+        else:
+            self.write_manifest(destination, source)
+
+
+class ManifestReader:
+    """
+    Reads a manifest with the same interface as ``SessionReader``, loading
+    message objects from the store only as they are consumed.
+    """
+
+    def __init__(self, store: MessageStore, digests: List[str]) -> None:
+        self.store = store
+        self.digests = digests
+
+    def __enter__(self) -> "ManifestReader":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return len(self.digests)
+
+    def __iter__(self) -> Iterator[Message]:
+        return map(self.store.get, self.digests)
+
+    def __reversed__(self) -> Iterator[Message]:
+        return map(self.store.get, reversed(self.digests))
+
+    def tail(self, count: int) -> List[Message]:
+        if count <= 0:
+            return []
+        return list(map(self.store.get, self.digests[-count:]))
+
+    def before(self, count: int) -> "ManifestReader":
+        assert count > 0
+        return ManifestReader(self.store, self.digests[:-count])
@@ -0,0 +1,372 @@
+import asyncio
+import os
+from typing import AsyncIterator
+from typing import cast
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import TYPE_CHECKING
+
+import keyring
+
+from dotchatbot.client.factory import create_client
+from dotchatbot.client.factory import SummaryServiceName
+from dotchatbot.client.services import ServiceClient
+from dotchatbot.history.archive import SessionArchive
+from dotchatbot.history.related import RelatedIndex
+from dotchatbot.input.parser import Parser
+from dotchatbot.input.reader import SessionReader
+from dotchatbot.input.transformer import Message
+from dotchatbot.input.transformer import resolve_includes
+from dotchatbot.input.transformer import Role
+from dotchatbot.output.file import generate_filename
+from dotchatbot.output.file import write_file_content
+from dotchatbot.output.markdown import Renderer
+from dotchatbot.output.store import is_manifest
+from dotchatbot.output.store import MANIFEST_HEADER
+from dotchatbot.output.store import ManifestReader
+from dotchatbot.output.store import MessageStore
+
+if TYPE_CHECKING:
+    from openai.types import ChatModel
+
+DEFAULT_SYSTEM_PROMPT = """\
+You are a helpful assistant."""
+
+DEFAULT_SUMMARY_PROMPT = """\
+Given the conversation so far, summarize it in just 4 words. \
+Only respond with these 4 words"""
+
+DEFAULT_MODELS = {
+    "OpenAI": "gpt-4o",
+    "Anthropic": "claude-3-7-sonnet-latest",
+    "Google": "gemini-2.5-pro",
+    "Local": "",
+}
+
+
+def session_exists(
+    filename: str, archive: Optional[SessionArchive] = None
+) -> bool:
+    if os.path.exists(filename):
+        return True
+    return archive is not None and archive.lookup(filename) is not None
+
+
+def open_session(
+    filename: str,
+    store: Optional[MessageStore] = None,
+    archive: Optional[SessionArchive] = None
+) -> SessionReader | ManifestReader:
+    """
+    Opens a plain session file, a content store manifest or an archived
+    session, whichever ``filename`` refers to.
+    """
+    if not os.path.exists(filename) and archive is not None:
+        data = archive.read(filename)
+        if data.startswith(MANIFEST_HEADER.encode()):
+            if store is None:
+                raise ValueError(f"A content store is needed for {filename}")
+            return store.load(data.decode("utf-8"))
+        return SessionReader(filename, data)
+    if is_manifest(filename):
+        if store is None:
+            raise ValueError(f"A content store is needed for {filename}")
+        return store.open(filename)
+    return SessionReader(filename)
+
+
+def check_includes(
+    messages: List[Message], filename: Optional[str]
+) -> List[Message]:
+    """
+    Reads relative includes from the directory of the session file (or the
+    current one for new sessions), failing if any of them is missing
+    """
+    if filename:
+        directory = os.path.dirname(os.path.abspath(filename))
+    else:
+        directory = os.getcwd()
+    messages = resolve_includes(messages, directory)
+    for message in messages:
+        for include in message.includes:
+            if message.role == "user" and not os.path.isfile(
+                include.location
+            ):
+                raise ValueError(f"Included file not found: {include.path}")
+    return messages
+
+
+def write_session(
+    filename: str,
+    messages: List[Message],
+    store: Optional[MessageStore] = None,
+    content_store: bool = False
+) -> None:
+    """
+    Writes ``messages`` to ``filename``, as a manifest if ``content_store``
+    is set or the file already is one (and there is a store)
+    """
+    keep_manifest = os.path.exists(filename) and is_manifest(filename)
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    if (content_store or keep_manifest) and store is not None:
+        store.write_manifest(filename, messages)
+    else:
+        with open(filename, "w") as f:
+            write_file_content(messages, f)
+
+
+def record_session(
+    filename: str,
+    messages: List[Message],
+    history_file: Optional[str] = None,
+    related_index: Optional[RelatedIndex] = None
+) -> None:
+    """
+    Adds a session written to ``filename`` to the history and the related
+    sessions index
+    """
+    if history_file:
+        with open(history_file, "a") as f:
+            f.write(os.path.abspath(filename) + "\n")
+    if related_index is not None:
+        related_index.add(filename, messages)
+
+
+class Session:
+    """
+    A conversation that can be used in-process: it owns the clients, parser
+    and renderer, so they are set up once and reused across calls.
+
+    >>> session = Session.create("OpenAI", summary_service_name="Local")
+    >>> session.append("Hello!")
+    >>> print(session.complete().content)
+    >>> session.save(location="sessions")
+    """
+
+    def __init__(
+        self,
+        client: ServiceClient,
+        summary_client: Optional[ServiceClient] = None,
+        parser: Optional[Parser] = None,
+        renderer: Optional[Renderer] = None,
+        store: Optional[MessageStore] = None,
+        archive: Optional[SessionArchive] = None,
+        related_index: Optional[RelatedIndex] = None,
+        history_file: Optional[str] = None,
+        summary_prompt: str = DEFAULT_SUMMARY_PROMPT,
+        extension: str = ".dcb",
+        messages: Optional[List[Message]] = None,
+        filename: Optional[str] = None,
+    ) -> None:
+        self.client = client
+        self.summary_client = summary_client or client
+        self._parser = parser
+        self._renderer = renderer
+        self.store = store
+        self.archive = archive
+        self.related_index = related_index
+        self.history_file = history_file
+        self.summary_prompt = summary_prompt
+        self.extension = extension
+        self.messages: List[Message] = list(messages or [])
+        self.filename = filename
+
+    @classmethod
+    def create(
+        cls,
+        service_name: SummaryServiceName = "OpenAI",
+        model: Optional[str] = None,
+        api_key: Optional[str] = None,
+        system_prompt: str = DEFAULT_SYSTEM_PROMPT,
+        summary_service_name: SummaryServiceName = "Local",
+        anthropic_max_tokens: int = 16384,
+        parser: Optional[Parser] = None,
+        renderer: Optional[Renderer] = None,
+        store: Optional[MessageStore] = None,
+        archive: Optional[SessionArchive] = None,
+        related_index: Optional[RelatedIndex] = None,
+        history_file: Optional[str] = None,
+        summary_prompt: str = DEFAULT_SUMMARY_PROMPT,
+        extension: str = ".dcb",
+        messages: Optional[List[Message]] = None,
+        filename: Optional[str] = None,
+    ) -> "Session":
+        """
+        Builds a session for a service; API keys default to the ones the
+        CLI stored in the keyring.
+        """
+
+        def client(service: SummaryServiceName, model: str) -> ServiceClient:
+            key = api_key if service == service_name else None
+            if not key and service != "Local":
+                key = keyring.get_password(service.lower(), "api_key")
+                if not key:
+                    raise ValueError(f"No API key for {service}")
+            return create_client(
+                service_name=service,
+                system_prompt=system_prompt,
+                api_key=key or "",
+                openai_model=cast("ChatModel", model),
+                anthropic_model=model,
+                anthropic_max_tokens=anthropic_max_tokens,
+                google_model=model,
+            )
+
+        main = client(service_name, model or DEFAULT_MODELS[service_name])
+        summary = main
+        if summary_service_name != service_name:
+            summary = client(
+                summary_service_name, DEFAULT_MODELS[summary_service_name]
+            )
+        return cls(
+            main,
+            summary,
+            parser=parser,
+            renderer=renderer,
+            store=store,
+            archive=archive,
+            related_index=related_index,
+            history_file=history_file,
+            summary_prompt=summary_prompt,
+            extension=extension,
+            messages=messages,
+            filename=filename,
+        )
+
+    @property
+    def parser(self) -> Parser:
+        if self._parser is None:
+            self._parser = Parser()
+        return self._parser
+
+    @property
+    def renderer(self) -> Renderer:
+        if self._renderer is None:
+            self._renderer = Renderer("default", "monokai", False)
+        return self._renderer
+
+    def exists(self, filename: str) -> bool:
+        return session_exists(filename, self.archive)
+
+    def open(self, filename: str) -> SessionReader | ManifestReader:
+        return open_session(filename, self.store, self.archive)
+
+    def load(self, filename: str) -> "Session":
+        with self.open(filename) as reader:
+            self.messages = list(reader)
+        self.filename = filename
+        return self
+
+    def parse(self, document: Optional[str]) -> List[Message]:
+        """Appends the messages of a session document"""
+        messages = self.parser.parse(document)
+        self.messages.extend(messages)
+        return messages
+
+    def append(self, content: str, role: Role = "user") -> Message:
+        message = Message(role=role, content=content)
+        self.messages.append(message)
+        return message
+
+    def check(self) -> None:
+        """
+        Fails unless the conversation ends in a user message whose included
+        files exist; includes are read relative to the session file
+        """
+        if (
+            not self.messages
+            or not self.messages[-1].content.strip()
+            or self.messages[-1].role != "user"
+        ):
+            raise ValueError("Aborting request due to empty message")
+        self.messages = check_includes(self.messages, self.filename)
+
+    def complete(self, client: Optional[ServiceClient] = None) -> Message:
+        """Requests a response to the conversation and appends it"""
+        self.check()
+        response = (client or self.client).create_chat_completion(
+            self.messages
+        )
+        self.messages.append(response)
+        return response
+
+    async def acomplete(
+        self, client: Optional[ServiceClient] = None
+    ) -> Message:
+        """
+        ``complete`` on a worker thread (``asyncio.to_thread``); the clients
+        are synchronous, so each call in flight holds a thread
+        """
+        return await asyncio.to_thread(self.complete, client)
+
+    def stream(self, client: Optional[ServiceClient] = None) -> Iterator[str]:
+        """
+        Yields the response as it arrives, appending it once it is complete
+        """
+        self.check()
+        chunks = []
+        for chunk in (client or self.client).stream_chat_completion(
+            self.messages
+        ):
+            chunks.append(chunk)
+            yield chunk
+        self.messages.append(
+            Message(role="assistant", content="".join(chunks))
+        )
+
+    async def astream(
+        self, client: Optional[ServiceClient] = None
+    ) -> AsyncIterator[str]:
+        """``stream`` with each chunk read on a worker thread"""
+        iterator = self.stream(client)
+        done = object()
+        while True:
+            chunk = await asyncio.to_thread(next, iterator, done)
+            if chunk is done:
+                break
+            yield chunk  # type: ignore[misc]
+
+    def render(self, message: Optional[Message] = None) -> str:
+        return self.renderer.render(message or self.messages[-1])
+
+    def new_filename(
+        self,
+        location: str = os.curdir,
+        messages: Optional[List[Message]] = None
+    ) -> str:
+        """A filename summarizing the conversation, in ``location``"""
+        filename = generate_filename(
+            self.summary_client,
+            self.summary_prompt,
+            self.messages if messages is None else messages,
+            self.extension
+        )
+        return os.path.join(location, filename)
+
+    def save(
+        self,
+        filename: Optional[str] = None,
+        location: str = os.curdir,
+        content_store: bool = False,
+        messages: Optional[List[Message]] = None
+    ) -> str:
+        """
+        Saves the conversation (or ``messages``), naming new sessions after
+        a summary; manifests stay manifests. Returns the filename.
+        """
+        messages = self.messages if messages is None else messages
+        filename = filename or self.filename
+        if not filename:
+            filename = self.new_filename(location, messages)
+        if messages is self.messages:
+            self.filename = filename
+        write_session(filename, messages, self.store, content_store)
+        self.record(filename, messages)
+        return filename
+
+    def record(self, filename: str, messages: List[Message]) -> None:
+        """See ``record_session``"""
+        record_session(
+            filename, messages, self.history_file, self.related_index
+        )
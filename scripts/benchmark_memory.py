@@ -0,0 +1,93 @@
+"""
+Peak memory of loading, checksumming and saving a large session.
+
+    python scripts/benchmark_memory.py [--messages N] [--size BYTES]
+
+Every mode runs in its own interpreter and reports its peak RSS above a
+bare interpreter that imported the same modules, next to the size of the
+session file.
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+from dotchatbot.input.reader import SessionReader
+from dotchatbot.output.file import _hash_messages
+from dotchatbot.output.file import generate_file_content
+from dotchatbot.output.file import write_file_content
+
+MODES = ("baseline", "copy", "joined", "streamed")
+
+
+def peak_rss() -> int:
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+def run(mode: str, filename: str) -> None:
+    output = os.devnull
+    if mode == "copy":
+        # the session read into a single string, for reference
+        with open(filename, "r", encoding="utf-8") as f:
+            f.read()
+    elif mode == "joined":
+        with SessionReader(filename) as reader:
+            messages = list(reader)
+        _hash_messages(messages)
+        with open(output, "w") as f:
+            f.write(generate_file_content(messages))
+    elif mode == "streamed":
+        with SessionReader(filename) as reader:
+            _hash_messages(reader)
+            with open(output, "w") as f:
+                write_file_content(reader, f)
+    print(peak_rss())
+
+
+def measure(mode: str, filename: str) -> int:
+    output = subprocess.run(
+        [sys.executable, __file__, "--mode", mode, filename],
+        check=True,
+        capture_output=True,
+        text=True
+    ).stdout
+    return int(output)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=64)
+    parser.add_argument("--size", type=int, default=1 << 20)
+    parser.add_argument("--mode", choices=MODES)
+    parser.add_argument("filename", nargs="?")
+    args = parser.parse_args()
+
+    if args.mode:
+        run(args.mode, args.filename)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "session.dcb")
+        with open(filename, "w", encoding="utf-8") as f:
+            for index in range(args.messages):
+                role = "user" if index % 2 == 0 else "assistant"
+                line = f"message {index} " * 8 + "\n"
+                f.write(f"@@> {role}:\n")
+                f.write(line * (args.size // len(line)))
+                f.write("\n")
+        size = os.path.getsize(filename)
+        baseline = measure("baseline", filename)
+        print(f"session file: {size / 2 ** 20:8.1f} MiB")
+        for mode in MODES[1:]:
+            peak = measure(mode, filename) - baseline
+            print(
+                f"{mode:>12}: {peak / 2 ** 20:8.1f} MiB "
+                f"({peak / size:.2f}x the session)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import os
+import threading
+from datetime import date
+from pathlib import Path
+from typing import List
+from unittest.mock import patch
+
+from pytest import fixture
+from pytest import raises
+
+from dotchatbot.history.archive import SessionArchive
+
+TODAY = date(2026, 3, 1)
+
+
+@fixture
+def sessions(tmp_path: Path) -> Path:
+    for name in ("2026-01-01", "2026-01-02", "2026-02-28"):
+        directory = tmp_path / name
+        directory.mkdir()
+        (directory / f"session-{name}.dcb").write_text(
+            f"@@> user:\n{name}\n"
+        )
+    (tmp_path / "not-a-date").mkdir()
+    return tmp_path
+
+
+def test_archive_packs_old_directories(sessions: Path) -> None:
+    archive = SessionArchive(str(sessions))
+
+    archived = archive.archive(30, today=TODAY)
+
+    assert archived == [
+        str(sessions / "2026-01-01"), str(sessions / "2026-01-02")
+    ]
+    assert sorted(os.listdir(sessions)) == [
+        "2026-02-28", "archive", "not-a-date"
+    ]
+    assert sorted(os.listdir(sessions / "archive")) == [
+        ".lock", "2026-01.zip", "index.tsv"
+    ]
+    filename = str(sessions / "2026-01-02" / "session-2026-01-02.dcb")
+    assert archive.lookup(filename) == (
+        "2026-01.zip", "2026-01-02/session-2026-01-02.dcb"
+    )
+    assert archive.read(filename) == b"@@> user:\n2026-01-02\n"
+
+
+def test_archive_recreated_directory(sessions: Path) -> None:
+    archive = SessionArchive(str(sessions))
+    archive.archive(30, today=TODAY)
+    directory = sessions / "2026-01-01"
+    directory.mkdir()
+    (directory / "session-2026-01-01.dcb").write_text("@@> user:\nnew\n")
+
+    archive.archive(30, today=TODAY)
+
+    filename = str(directory / "session-2026-01-01.dcb")
+    assert archive.lookup(filename) == (
+        "2026-01.1.zip", "2026-01-01/session-2026-01-01.dcb"
+    )
+    assert archive.read(filename) == b"@@> user:\nnew\n"
+
+
+def test_archive_skips_vanished_directories(sessions: Path) -> None:
+    archive = SessionArchive(str(sessions))
+    expired = archive.expired
+
+    def vanishing(days: int, today: date) -> List[str]:
+        # removed by someone else between the listing and the walk
+        return ["2025-12-31", *expired(days, today)]
+
+    with patch.object(archive, "expired", vanishing):
+        archived = archive.archive(30, today=TODAY)
+
+    assert archived == [
+        str(sessions / "2026-01-01"), str(sessions / "2026-01-02")
+    ]
+
+
+def test_concurrent_archives_do_not_duplicate(sessions: Path) -> None:
+    first = SessionArchive(str(sessions))
+    second = SessionArchive(str(sessions))
+    archived: List[List[str]] = []
+
+    with first._locked():
+        thread = threading.Thread(
+            target=lambda: archived.append(second.archive(30, today=TODAY))
+        )
+        thread.start()
+        thread.join(0.2)
+        # waits for the lock, held for the whole archive step
+        assert thread.is_alive()
+        assert archived == []
+    thread.join(5)
+    archived.append(first.archive(30, today=TODAY))
+
+    assert archived == [
+        [str(sessions / "2026-01-01"), str(sessions / "2026-01-02")], []
+    ]
+    rows = (sessions / "archive" / "index.tsv").read_text().splitlines()
+    assert len(rows) == len(set(rows)) == 2
+
+
+def test_archive_indexes_modification_times(sessions: Path) -> None:
+    filename = sessions / "2026-01-01" / "session-2026-01-01.dcb"
+    os.utime(filename, (1767268800.5, 1767268800.5))
+    archive = SessionArchive(str(sessions))
+    archive.archive(30, today=TODAY)
+
+    with patch("zipfile.ZipFile") as zip_file:
+        assert archive.getmtime(str(filename)) == 1767268800.5
+    zip_file.assert_not_called()
+
+    # rows written without the column fall back to the archive member
+    index = sessions / "archive" / "index.tsv"
+    index.write_text("".join(
+        line.rpartition("\t")[0] + "\n"
+        for line in index.read_text().splitlines()
+    ))
+    mtime = SessionArchive(str(sessions)).getmtime(str(filename))
+    assert abs(mtime - 1767268800) <= 2
+
+
+def test_failed_archive_keeps_the_existing_archive(sessions: Path) -> None:
+    archive = SessionArchive(str(sessions))
+    archive.archive(30, today=date(2026, 2, 1))
+    before = (sessions / "archive" / "2026-01.zip").read_bytes()
+
+    with patch("zipfile.ZipFile.write", side_effect=OSError("disk full")):
+        with raises(OSError):
+            archive.archive(30, today=TODAY)
+
+    assert (sessions / "archive" / "2026-01.zip").read_bytes() == before
+    assert sorted(os.listdir(sessions / "archive")) == [
+        ".lock", "2026-01.zip", "index.tsv"
+    ]
+    assert (sessions / "2026-01-02").is_dir()
+    filename = sessions / "2026-01-01" / "session-2026-01-01.dcb"
+    assert archive.read(str(filename)) == b"@@> user:\n2026-01-01\n"
@@ -0,0 +1,41 @@
+import os
+import threading
+from pathlib import Path
+from typing import List
+
+from pytest import raises
+
+from dotchatbot.output.atomic import atomic_write
+from dotchatbot.output.atomic import locked
+
+
+def test_atomic_write_replaces_only_when_complete(tmp_path: Path) -> None:
+    path = tmp_path / "state" / "file.json"
+    with atomic_write(str(path)) as f:
+        f.write("old")
+
+    with raises(ValueError):
+        with atomic_write(str(path)) as f:
+            f.write("new")
+            raise ValueError("interrupted")
+
+    assert path.read_text() == "old"
+    assert os.listdir(path.parent) == ["file.json"]
+
+
+def test_locked_excludes_other_threads(tmp_path: Path) -> None:
+    lock = str(tmp_path / ".lock")
+    events: List[str] = []
+
+    def other() -> None:
+        with locked(lock):
+            events.append("other")
+
+    with locked(lock):
+        thread = threading.Thread(target=other)
+        thread.start()
+        thread.join(0.2)
+        events.append("first")
+    thread.join(5)
+
+    assert events == ["first", "other"]
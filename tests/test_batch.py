@@ -0,0 +1,248 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Generator
+from typing import List
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from click.testing import CliRunner
+from pytest import fixture
+
+from dotchatbot.client.batch import batch_client
+from dotchatbot.client.batch import BatchJobs
+from dotchatbot.client.factory import create_client
+from dotchatbot.dcb import dotchatbot
+from dotchatbot.input.parser import Parser
+from dotchatbot.input.transformer import Message
+
+
+class StandIn(ThreadingHTTPServer):
+    """The batch endpoints of both providers, answering every prompt"""
+
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.done = False
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+
+def _answer(messages: List[Dict[str, Any]]) -> str:
+    return "echo: " + messages[-1]["content"].strip()
+
+
+class Handler(BaseHTTPRequestHandler):
+    server: StandIn
+
+    def _send(self, body: Any) -> None:
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers["Content-Length"]))
+
+    def do_POST(self) -> None:
+        index = len(self.server.files) + len(self.server.batches)
+        if self.path == "/v1/files":
+            # the JSONL lines of the multipart upload
+            lines = [
+                line.strip() for line in self._body().split(b"\n")
+                if line.startswith(b'{"custom_id"')
+            ]
+            self.server.files[f"file-{index}"] = b"\n".join(lines)
+            self._send({"id": f"file-{index}", "object": "file"})
+        elif self.path == "/v1/batches":
+            body = json.loads(self._body())
+            self.server.batches[f"batch_{index}"] = body
+            self._send({"id": f"batch_{index}", "status": "in_progress"})
+        elif self.path == "/v1/messages/batches":
+            body = json.loads(self._body())
+            self.server.batches[f"msgbatch_{index}"] = body
+            self._send({
+                "id": f"msgbatch_{index}",
+                "type": "message_batch",
+                "processing_status": "in_progress"
+            })
+
+    def do_GET(self) -> None:
+        parts = self.path.strip("/").split("/")
+        if parts[:2] == ["v1", "batches"]:
+            status = "completed" if self.server.done else "in_progress"
+            self._send({
+                "id": parts[2],
+                "status": status,
+                "output_file_id": f"{parts[2]}-output"
+            })
+        elif parts[:2] == ["v1", "files"]:
+            batch = self.server.batches[parts[2].removesuffix("-output")]
+            output = []
+            for line in self.server.files[batch["input_file_id"]].split(b"\n"):
+                request = json.loads(line)
+                body = request["body"]
+                output.append(json.dumps({
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 200, "body": {"choices": [{
+                        "message": {
+                            "role": "assistant",
+                            "content": _answer(body["messages"])
+                        }
+                    }]}},
+                    "error": None
+                }))
+            self._send("\n".join(output).encode())
+        elif parts[-1] == "results":
+            output = [
+                json.dumps({
+                    "custom_id": request["custom_id"],
+                    "result": {"type": "succeeded", "message": {
+                        "role": "assistant",
+                        "type": "message",
+                        "content": [{
+                            "type": "text",
+                            "text": _answer(request["params"]["messages"])
+                        }]
+                    }}
+                })
+                for request in self.server.batches[parts[3]]["requests"]
+            ]
+            self._send("\n".join(output).encode())
+        elif parts[:3] == ["v1", "messages", "batches"]:
+            self._send({
+                "id": parts[3],
+                "type": "message_batch",
+                "processing_status": "ended" if self.server.done else
+                "in_progress",
+                "results_url": f"{self.server.url}{self.path}/results"
+            })
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+@fixture
+def server() -> Generator[StandIn, Any, None]:
+    server = StandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@fixture
+def sessions(tmp_path: Path) -> Path:
+    (tmp_path / "pending.dcb").write_text("@@> user:\nhello\n\n")
+    (tmp_path / "answered.dcb").write_text(
+        "@@> user:\nhello\n\n@@> assistant:\nhi\n\n"
+    )
+    (tmp_path / "notes.txt").write_text("@@> user:\nnot a session\n\n")
+    return tmp_path
+
+
+def _client(service_name: str, base_url: str) -> Any:
+    return batch_client(create_client(
+        service_name=service_name,  # type: ignore[arg-type]
+        system_prompt="Be brief",
+        api_key="key",
+        openai_model="gpt-4o",
+        anthropic_model="claude-3-7-sonnet-latest",
+        anthropic_max_tokens=1024,
+        google_model="",
+        base_url=base_url
+    ))
+
+
+def test_openai_submit_poll_collect(
+    server: StandIn, sessions: Path
+) -> None:
+    client = _client("OpenAI", f"{server.url}/v1")
+    jobs = BatchJobs(str(sessions / "batches.json"), Parser())
+    filenames = [str(sessions / "pending.dcb"), str(sessions / "answered.dcb")]
+
+    job = jobs.submit("OpenAI", client, filenames)
+    assert job is not None
+    assert list(job.sessions.values())[0][0] == str(sessions / "pending.dcb")
+    assert jobs.submit("OpenAI", client, filenames) is None
+
+    def clients(service_name: str) -> Any:
+        return client
+
+    assert [job.status for job in jobs.poll(clients)] == ["in_progress"]
+    assert list(jobs.collect(clients)) == []
+    server.done = True
+
+    answers = list(jobs.collect(clients))
+
+    assert [answer.error for answer in answers] == [None]
+    assert answers[0].messages[-1] == Message("assistant", "echo: hello")
+    assert BatchJobs(str(sessions / "batches.json"), Parser()).jobs == []
+
+
+def test_anthropic_leaves_changed_sessions(
+    server: StandIn, sessions: Path
+) -> None:
+    client = _client("Anthropic", server.url)
+    jobs = BatchJobs(str(sessions / "batches.json"), Parser())
+    (sessions / "other.dcb").write_text("@@> user:\nhey\n\n")
+
+    job = jobs.submit(
+        "Anthropic",
+        client,
+        [str(sessions / "pending.dcb"), str(sessions / "other.dcb")]
+    )
+    assert job is not None
+    (sessions / "other.dcb").write_text("@@> user:\nhey there\n\n")
+    server.done = True
+
+    answers = {
+        os.path.basename(answer.filename): answer
+        for answer in jobs.collect(lambda service_name: client)
+    }
+
+    assert answers["pending.dcb"].messages[-1].content == "echo: hello"
+    assert answers["other.dcb"].error == "Session changed since it was sent"
+
+
+@patch("dotchatbot.dcb._get_api_key")
+def test_dcb_batch(
+    mock_get_api_key: MagicMock, server: StandIn, sessions: Path
+) -> None:
+    mock_get_api_key.return_value = "key"
+    options = [
+        "--batch-base-url", f"{server.url}/v1",
+        "--batch-state-file", str(sessions / "batches.json"),
+        "--session-history-file", str(sessions / "history"),
+        "--related-index-location", str(sessions / "related"),
+    ]
+    runner = CliRunner()
+
+    result = runner.invoke(
+        dotchatbot, [*options, "--batch-submit", str(sessions)]
+    )
+    assert result.exit_code == 0, result.output
+    server.done = True
+    result = runner.invoke(dotchatbot, [*options, "--batch-collect"])
+
+    assert result.exit_code == 0, result.output
+    assert (sessions / "pending.dcb").read_text() == (
+        "@@> user:\nhello\n\n@@> assistant:\necho: hello\n\n"
+    )
+    assert (sessions / "history").read_text() == (
+        f"{sessions / 'pending.dcb'}\n"
+    )
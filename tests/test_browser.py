@@ -0,0 +1,118 @@
+import threading
+from pathlib import Path
+from typing import List
+from typing import Optional
+
+from pytest import fixture
+from pytest import mark
+
+from dotchatbot.history.browser import Entry
+from dotchatbot.history.browser import HistoryPager
+from dotchatbot.history.browser import Preview
+from dotchatbot.history.browser import Window
+from dotchatbot.input.transformer import Message
+from dotchatbot.output.markdown import Renderer
+
+
+@fixture
+def history(tmp_path: Path) -> str:
+    filename = tmp_path / "history"
+    # oldest first, with repeats and a session that no longer exists
+    filename.write_text(
+        "".join(f"/s/{name}.dcb\n" for name in "aabbcxddeff") + "\n"
+    )
+    return str(filename)
+
+
+def _exists(filename: str) -> bool:
+    return filename != "/s/x.dcb"
+
+
+def _names(entries: List[Entry]) -> str:
+    return "".join(entry.filename[3] for entry in entries)
+
+
+@mark.parametrize("block_size", [1, 7, 1 << 16])
+def test_pages_newest_first(history: str, block_size: int) -> None:
+    pager = HistoryPager(history, _exists, block_size)
+
+    newest = pager.older(None, 3)
+    older = pager.older(newest[-1], 10)
+
+    assert _names(newest) == "fed"
+    assert _names(older) == "cba"
+    assert _names(pager.newer(older[0], 2)) == "ed"
+    assert _names(pager.newer(None, 2)) == "ba"
+    assert pager.newer(newest[0], 2) == []
+
+
+def test_entries_are_the_last_of_their_run(history: str) -> None:
+    pager = HistoryPager(history, _exists)
+
+    backward = pager.older(None, 10)
+    forward = pager.newer(None, 10)
+
+    assert backward == forward
+    assert backward[0].offset == len("/s/x.dcb\n") * 10
+
+
+def test_missing_history(tmp_path: Path) -> None:
+    window = Window(HistoryPager(str(tmp_path / "history")), 10)
+
+    window.move(1)
+
+    assert window.selected is None
+
+
+def test_window_scrolls_through_pages(history: str) -> None:
+    window = Window(HistoryPager(history, _exists), 2)
+
+    window.move(1)
+    assert (_names(window.entries), window.cursor) == ("fe", 1)
+    window.move(1)
+    assert (_names(window.entries), window.cursor) == ("ed", 1)
+    window.move(2)
+    assert (_names(window.entries), window.cursor) == ("cb", 1)
+    window.move(-2)
+    assert (_names(window.entries), window.cursor) == ("dc", 0)
+    window.bottom()
+    assert (_names(window.entries), window.cursor) == ("ba", 1)
+    window.move(10)
+    assert (_names(window.entries), window.cursor) == ("ba", 1)
+    window.top()
+    window.move(-1)
+    assert (_names(window.entries), window.cursor) == ("fe", 0)
+
+
+def test_preview_renders_the_selected_session() -> None:
+    loaded: List[str] = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def load(filename: str, count: int) -> List[Message]:
+        loaded.append(filename)
+        started.set()
+        release.wait(5)
+        return [Message("assistant", f"**{filename}**")][-count:]
+
+    def renderer() -> Renderer:
+        return Renderer("left", "monokai", False, plain=True)
+
+    preview = Preview(load, renderer)
+    assert preview.get("first.dcb") is None
+    started.wait(5)
+    assert preview.get("second.dcb") is None
+    assert preview.get("third.dcb") is None
+    release.set()
+
+    text: Optional[str] = None
+    for _ in range(100):
+        text = preview.get("third.dcb")
+        if text is not None:
+            break
+        threading.Event().wait(0.05)
+    preview.close()
+
+    assert text == "@@> assistant:\nthird.dcb\n"
+    # the second session was no longer selected by the time it was its turn
+    assert loaded == ["first.dcb", "third.dcb"]
@@ -1,6 +1,7 @@
 import os
 from typing import Any
 from typing import Generator
+from typing import List
 from unittest.mock import MagicMock
 from unittest.mock import mock_open
 from unittest.mock import patch
@@ -8,7 +9,15 @@ from unittest.mock import patch
 import pytest
 from click.testing import CliRunner
 
+from dotchatbot.client import transport
+from dotchatbot.client.transport import configure
+from dotchatbot.client.transport import TransportOptions
+from dotchatbot.dcb import _prompt_in_place
+from dotchatbot.dcb import _split_messages
 from dotchatbot.dcb import dotchatbot
+from dotchatbot.input.parser import Parser
+from dotchatbot.input.reader import SessionReader
+from dotchatbot.input.transformer import Message
 
 
 @pytest.fixture
@@ -101,7 +110,8 @@ def test_dcb_valid_execution(
         openai_model='gpt-4o',
         anthropic_model='claude-3-sonnet-latest',
         anthropic_max_tokens=16384,
-        google_model='gemini-2.5-flash-lite'
+        google_model='gemini-2.5-flash-lite',
+        max_retries=None
     )
 
 
@@ -143,3 +153,291 @@ def test_dcb_resume_session(
 
     result = runner.invoke(dotchatbot, ['-y', '-'])
     assert "Resuming from previous session:" in result.output
+
+
+@patch('dotchatbot.dcb._get_api_key')
+@patch('dotchatbot.dcb.create_client')
+def test_dcb_compare_saves_sibling_sessions(
+    mock_create_client: MagicMock,
+    mock_get_api_key: MagicMock,
+    runner: CliRunner
+) -> None:
+    """Test that --compare saves one session file per model."""
+    mock_get_api_key.return_value = 'fake_api_key'
+    mock_client = MagicMock()
+    mock_client.usage = None
+    mock_create_client.return_value = mock_client
+    mock_client.create_chat_completion.return_value = Message(
+        role='assistant', content='Hello!'
+    )
+
+    result = runner.invoke(
+        dotchatbot,
+        [
+            '-y',
+            '--compare', 'OpenAI',
+            '--compare', 'Google:gemini-2.5-flash',
+            'session.dcb',
+        ],
+        input='Hello!\n'
+    )
+
+    assert result.exit_code == 0
+    assert "==> OpenAI:gpt-4o" in result.output
+    assert os.path.exists('session-openai-gpt-4o.dcb')
+    assert os.path.exists('session-google-gemini-2.5-flash.dcb')
+    assert not os.path.exists('session.dcb')
+
+
+@patch('dotchatbot.dcb._get_api_key')
+@patch('dotchatbot.dcb.create_client')
+def test_dcb_in_place_updates_session_file(
+    mock_create_client: MagicMock,
+    mock_get_api_key: MagicMock,
+    runner: CliRunner
+) -> None:
+    """Test that --in-place writes the response to FILENAME itself."""
+    mock_get_api_key.return_value = 'fake_api_key'
+    mock_client = MagicMock()
+    mock_create_client.return_value = mock_client
+    mock_client.create_chat_completion.return_value = Message(
+        role='assistant', content='Hello!'
+    )
+    with open('session.dcb', 'w') as f:
+        f.write("@@> user:\nHi\n\n@@> assistant:\nHey\n\n")
+
+    result = runner.invoke(
+        dotchatbot, ['-y', '-i', 'session.dcb'], input='@@> user:\nHello?\n'
+    )
+
+    assert result.exit_code == 0
+    with open('session.dcb') as f:
+        content = f.read()
+    assert content.endswith("@@> user:\nHello?\n\n@@> assistant:\nHello!\n\n")
+
+
+def test_in_place_parses_after_editing(tmp_path: Any) -> None:
+    """Test that the parser is only needed once the editor is closed."""
+    filename = str(tmp_path / "session.dcb")
+    with open(filename, "w") as f:
+        f.write("@@> user:\nHi\n\n@@> assistant:\nHey\n\n")
+    events = []
+
+    def edit(editor: str, filename: str) -> None:
+        events.append("edit")
+        with open(filename, "a") as f:
+            f.write("Hello?\n")
+
+    def parser() -> Parser:
+        events.append("parser")
+        return Parser()
+
+    with patch("sys.stdin.isatty", return_value=True), \
+            patch("dotchatbot.dcb.click.edit", side_effect=edit):
+        tracked, messages = _prompt_in_place(filename, None, parser)
+
+    assert events == ["edit", "parser"]
+    assert messages[-1].role == "user"
+    assert messages[-1].content.strip() == "Hello?"
+    assert tracked.filename == filename
+
+
+def test_in_place_abandoned_edit_leaves_file_unchanged(
+    tmp_path: Any
+) -> None:
+    """Test that the user header is removed when nothing is written."""
+    filename = str(tmp_path / "session.dcb")
+    content = "@@> user:\nHi\n\n@@> assistant:\nHey\n\n"
+    with open(filename, "w") as f:
+        f.write(content)
+
+    with patch("sys.stdin.isatty", return_value=True), \
+            patch("dotchatbot.dcb.click.edit"):
+        _, messages = _prompt_in_place(filename, None, Parser)
+
+    assert messages[-1].role == "assistant"
+    with open(filename) as f:
+        assert f.read() == content
+
+
+def test_split_messages_reads_files_like_lists(tmp_path: Any) -> None:
+    """Test that --tail splits a session file like a list of messages."""
+    filename = str(tmp_path / "session.dcb")
+    with open(filename, "w") as f:
+        f.write("@@> user:\none\n@@> assistant:\ntwo\n@@> user:\nthree\n")
+    with SessionReader(filename) as reader:
+        messages = list(reader)
+        for tail in (None, 1, 2, 5):
+            shown, hidden = _split_messages(reader, tail)
+            expected_shown, expected_hidden = _split_messages(messages, tail)
+            assert shown == expected_shown
+            assert list(hidden) == list(expected_hidden)
+    with SessionReader(filename) as reader:
+        _, hidden = _split_messages(reader, 1)
+    # the hidden messages are still readable once the file is closed
+    assert list(hidden) == messages[:2]
+    assert _split_messages(messages, 2) == (messages[1:], messages[:1])
+
+
+def test_dcb_in_place_with_reverse_fails(runner: CliRunner) -> None:
+    result = runner.invoke(dotchatbot, ['-y', '-i', '-r', 'session.dcb'])
+    assert result.exit_code != 0
+    assert "--in-place cannot be used with --reverse" in result.output
+
+
+def test_dcb_invalid_quick_service_name(runner: CliRunner) -> None:
+    """Test invalid quick service name fails."""
+    result = runner.invoke(
+        dotchatbot, ["--quick-service-name", "InvalidService", "-y"]
+    )
+    assert result.exit_code == 2
+    assert "Invalid value for '--quick-service-name" in result.output
+
+
+@patch('dotchatbot.dcb._get_api_key')
+@patch('dotchatbot.dcb.create_client')
+def test_dcb_route_auto_answers_with_quick_model(
+    mock_create_client: MagicMock,
+    mock_get_api_key: MagicMock,
+    runner: CliRunner
+) -> None:
+    """Test that --route auto sends short prompts only to the quick model."""
+    mock_get_api_key.return_value = 'fake_api_key'
+    main_client, quick_client, summary_client = (
+        MagicMock(), MagicMock(), MagicMock()
+    )
+    mock_create_client.side_effect = [
+        main_client, summary_client, quick_client
+    ]
+    quick_client.usage = None
+    quick_client.latency = 0.5
+    quick_client.create_chat_completion.return_value = Message(
+        role='assistant', content='Paris'
+    )
+
+    result = runner.invoke(
+        dotchatbot,
+        [
+            '-y',
+            '--quick-service-name', 'OpenAI',
+            '--quick-openai-model', 'gpt-4o-mini',
+            '--route', 'auto',
+            '--route-stats-file', 'route-stats.json',
+            'session.dcb',
+        ],
+        input='What is the capital of France?\n'
+    )
+
+    assert result.exit_code == 0
+    assert "Routing to the quick model" in result.output
+    main_client.create_chat_completion.assert_not_called()
+    assert os.path.exists('route-stats.json')
+
+
+@patch('dotchatbot.dcb._get_api_key')
+@patch('dotchatbot.dcb.create_client')
+def test_dcb_jsonl(
+    mock_create_client: MagicMock,
+    mock_get_api_key: MagicMock,
+    runner: CliRunner
+) -> None:
+    """Test that --jsonl answers each line in order."""
+    mock_get_api_key.return_value = 'fake_api_key'
+    mock_client = MagicMock()
+    mock_create_client.return_value = mock_client
+    mock_client.create_chat_completion.side_effect = lambda messages: Message(
+        role='assistant', content=messages[-1].content.upper()
+    )
+
+    result = runner.invoke(
+        dotchatbot,
+        ['--jsonl', '--jsonl-concurrency', '32'],
+        input='[{"role": "user", "content": "one"}]\n'
+              '[{"role": "user", "content": "two"}]\n'
+    )
+
+    assert result.exit_code == 0
+    lines = [line for line in result.output.splitlines() if line[:1] == "{"]
+    assert lines == [
+        '{"index": 0, "message": {"role": "assistant", "content": "ONE"}}',
+        '{"index": 1, "message": {"role": "assistant", "content": "TWO"}}',
+    ]
+    assert transport.options().max_connections == 32
+    configure(TransportOptions())
+
+
+@patch('dotchatbot.dcb._get_api_key')
+@patch('dotchatbot.dcb.create_client')
+def test_dcb_missing_include(
+    mock_create_client: MagicMock,
+    mock_get_api_key: MagicMock,
+    runner: CliRunner
+) -> None:
+    """Test that a missing included file fails before the request."""
+    mock_get_api_key.return_value = 'fake_api_key'
+    os.mkdir("sessions")
+    with open(os.path.join("sessions", "notes.md"), "w") as f:
+        f.write("notes\n")
+    with open(os.path.join("sessions", "session.dcb"), "w") as f:
+        f.write("@@> user:\n@@< notes.md\n")
+
+    result = runner.invoke(
+        dotchatbot,
+        ['-y', os.path.join("sessions", "session.dcb")],
+        input='@@> user:\n@@< missing.md\n'
+    )
+
+    assert result.exit_code == 2
+    assert "Included file not found: missing.md" in result.output
+    mock_create_client.return_value.create_chat_completion.assert_not_called()
+
+
+def test_dcb_fork_refuses_existing_destination(runner: CliRunner) -> None:
+    with open("source.dcb", "w") as f:
+        f.write("@@> user:\nHello\n")
+    with open("destination.dcb", "w") as f:
+        f.write("@@> user:\nkeep me\n")
+
+    result = runner.invoke(
+        dotchatbot,
+        [
+            "--session-history-file", "history",
+            "--content-store-location", "store",
+            "--fork", "destination.dcb",
+            "source.dcb"
+        ]
+    )
+
+    assert result.exit_code != 0
+    assert "Cannot fork to the existing session" in result.output
+    with open("destination.dcb") as f:
+        assert f.read() == "@@> user:\nkeep me\n"
+
+
+@pytest.mark.parametrize("reverse", [[], ["--reverse"]])
+@patch('dotchatbot.dcb._get_api_key')
+@patch('dotchatbot.dcb.create_client')
+def test_dcb_tail_quit_without_saving_aborts(
+    mock_create_client: MagicMock,
+    mock_get_api_key: MagicMock,
+    reverse: List[str],
+    runner: CliRunner
+) -> None:
+    """Test that quitting the editor under --tail sends nothing."""
+    mock_get_api_key.return_value = 'fake_api_key'
+    content = "@@> user:\nA\n\n@@> assistant:\nB\n\n"
+    with open('session.dcb', 'w') as f:
+        f.write(content)
+
+    with patch(
+        "click.testing._NamedTextIOWrapper.isatty", return_value=True
+    ), patch("dotchatbot.dcb.click.edit", return_value=None):
+        result = runner.invoke(
+            dotchatbot, ['-y', '--tail', '1', *reverse, 'session.dcb']
+        )
+
+    assert result.exit_code != 0
+    assert "empty message" in result.output
+    mock_create_client.return_value.create_chat_completion.assert_not_called()
+    with open('session.dcb') as f:
+        assert f.read() == content
@@ -0,0 +1,167 @@
+import threading
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from typing import Tuple
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from click import Abort
+from pytest import raises
+
+from dotchatbot import dcb
+from dotchatbot.client.deferred import Deferred
+from dotchatbot.client.services import ServiceClient
+from dotchatbot.client.services import Usage
+from dotchatbot.input.transformer import Message
+
+
+def test_deferred_waits_for_the_client() -> None:
+    future: Future[ServiceClient] = Future()
+    client = MagicMock(spec=ServiceClient)
+    client.create_chat_completion.return_value = Message("assistant", "hi")
+    client.usage = Usage(input_tokens=3, output_tokens=4)
+    client.latency = 0.5
+    deferred = Deferred("", future)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        response = executor.submit(
+            deferred.create_chat_completion, [Message("user", "hello")]
+        )
+        assert not response.done()
+        future.set_result(client)
+
+        assert response.result(timeout=5) == Message("assistant", "hi")
+    assert deferred.usage == client.usage
+    assert deferred.latency == 0.5
+
+
+def test_deferred_raises_setup_errors() -> None:
+    future: Future[ServiceClient] = Future()
+    future.set_exception(ValueError("Invalid service name"))
+
+    with raises(ValueError, match="Invalid service name"):
+        list(Deferred("", future).stream_chat_completion([]))
+
+
+def _create_in_background() -> Tuple[ThreadPoolExecutor, Deferred]:
+    setup = dcb._start_setup(interactive=True)
+    client = dcb._create_client_in_background(
+        setup,
+        "OpenAI",
+        "",
+        openai_model="gpt-4o",
+        anthropic_model="claude-3-7-sonnet-latest",
+        anthropic_max_tokens=1024,
+        google_model="gemini-2.5-pro",
+    )
+    assert isinstance(client, Deferred)
+    return setup, client
+
+
+def test_setup_prompts_only_once_the_message_is_sent() -> None:
+    events: List[str] = []
+
+    def edit(**kwargs: str) -> str:
+        # setup gets every chance to prompt while the editor is open
+        threading.Event().wait(0.1)
+        events.append("edit")
+        return "@@> user:\nhello\n"
+
+    def getpass(prompt: str) -> str:
+        events.append("getpass")
+        return "key"
+
+    with (
+        patch("dotchatbot.dcb.click.edit", edit),
+        patch("dotchatbot.dcb.getpass", getpass),
+        patch("dotchatbot.dcb.create_client"),
+        patch("dotchatbot.dcb.keyring") as keyring,
+    ):
+        keyring.get_password.return_value = None
+        setup, client = _create_in_background()
+        dcb._edit("", ".dcb", False)
+        threading.Event().wait(0.1)
+        events.append("sent")
+        dcb._may_prompt.set()
+
+        client.future.result(timeout=5)
+        dcb._stop_setup(setup)
+    assert events == ["edit", "sent", "getpass"]
+
+
+def test_abandoned_setup_does_not_prompt() -> None:
+    getpass = MagicMock(return_value="key")
+
+    with (
+        patch("dotchatbot.dcb.getpass", getpass),
+        patch("dotchatbot.dcb.create_client"),
+        patch("dotchatbot.dcb.keyring") as keyring,
+    ):
+        keyring.get_password.return_value = None
+        setup, client = _create_in_background()
+        dcb._stop_setup(setup)
+
+        with raises(Abort):
+            client.future.result(timeout=5)
+    getpass.assert_not_called()
+    assert dcb._may_prompt.is_set()
+
+
+def test_missing_keys_are_asked_for_before_setup_may_prompt() -> None:
+    stored = {"anthropic": "anthropic-key"}
+    prompts: List[str] = []
+
+    def getpass(prompt: str) -> str:
+        prompts.append(f"{threading.current_thread().name}: {prompt}")
+        return "key"
+
+    with (
+        patch("dotchatbot.dcb.getpass", getpass),
+        patch("dotchatbot.dcb.create_client"),
+        patch("dotchatbot.dcb.keyring") as keyring,
+    ):
+        keyring.get_password.side_effect = lambda service, _: stored.get(
+            service
+        )
+        keyring.set_password.side_effect = (
+            lambda service, _, key: stored.__setitem__(service, key)
+        )
+        setup, client = _create_in_background()
+        dcb._ask_for_api_keys(["Anthropic", "OpenAI", "Local", None])
+        dcb._may_prompt.set()
+
+        client.future.result(timeout=5)
+        dcb._stop_setup(setup)
+    assert prompts == [
+        f"{threading.current_thread().name}: Enter your OpenAI API key: "
+    ]
+
+
+class Reporting(ServiceClient):
+    """Reports usage only for requests with more than one message"""
+
+    def create_chat_completion(self, messages: List[Message]) -> Message:
+        with self.timed():
+            if len(messages) > 1:
+                self.usage = Usage(input_tokens=1, output_tokens=2)
+        return Message("assistant", "hi")
+
+
+def test_deferred_latency_and_usage_are_of_the_last_request() -> None:
+    future: Future[ServiceClient] = Future()
+    deferred = Deferred("", future)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        response = executor.submit(
+            deferred.create_chat_completion, [Message("user", "a")] * 2
+        )
+        # waiting for setup is not part of the latency
+        threading.Event().wait(0.2)
+        future.set_result(Reporting(""))
+        response.result(timeout=5)
+    assert deferred.usage == Usage(input_tokens=1, output_tokens=2)
+    assert deferred.latency is not None and deferred.latency < 0.2
+
+    deferred.create_chat_completion([Message("user", "a")])
+    assert deferred.usage is None
@@ -0,0 +1,56 @@
+import threading
+from typing import Dict
+from typing import List
+
+from dotchatbot.client.fanout import fan_out
+from dotchatbot.client.services import ServiceClient
+from dotchatbot.client.services import Usage
+from dotchatbot.input.transformer import Message
+
+
+class GatedClient(ServiceClient):
+    """Answers once every client has been called and it is released"""
+
+    def __init__(
+        self, name: str, started: threading.Barrier, fail: bool = False
+    ) -> None:
+        super().__init__(system_prompt="")
+        self.name = name
+        self.started = started
+        self.release = threading.Event()
+        self.fail = fail
+
+    def create_chat_completion(self, messages: List[Message]) -> Message:
+        # only passes if all the calls are in flight at the same time
+        self.started.wait(5)
+        self.release.wait(5)
+        if self.fail:
+            raise ValueError("Empty response")
+        self.usage = Usage(input_tokens=len(messages), output_tokens=1)
+        return Message(role="assistant", content=self.name)
+
+
+def test_fan_out_runs_concurrently() -> None:
+    started = threading.Barrier(3)
+    gated = {
+        "slow": GatedClient("slow", started),
+        "fast": GatedClient("fast", started),
+        "broken": GatedClient("broken", started, fail=True),
+    }
+    clients: Dict[str, ServiceClient] = dict(gated)
+
+    results = fan_out(clients, [Message(role="user", content="hello")])
+    completed = []
+    for label in ("fast", "broken", "slow"):
+        gated[label].release.set()
+        completed.append(next(results))
+
+    assert next(results, None) is None
+    assert not started.broken
+    # results come in the order the calls complete
+    assert [result.label for result in completed] == [
+        "fast", "broken", "slow"
+    ]
+    assert completed[0].message == Message(role="assistant", content="fast")
+    assert completed[0].usage == Usage(input_tokens=1, output_tokens=1)
+    assert isinstance(completed[1].error, ValueError)
@@ -0,0 +1,161 @@
+import threading
+from pathlib import Path
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from dotchatbot.client.anthropic import _message_params
+from dotchatbot.client.files import account
+from dotchatbot.client.files import FileCache
+from dotchatbot.client.google import Google
+from dotchatbot.input.include import Include
+from dotchatbot.input.include import split_includes
+from dotchatbot.input.parser import Parser
+from dotchatbot.input.transformer import resolve_includes
+
+
+def test_parsed_messages_expose_includes() -> None:
+    messages = Parser().parse(
+        "@@> user:\n"
+        "Explain this:\n"
+        "@@< src/main.py\n"
+        "@@<   ~/logs/error.log  \n"
+        "@@> assistant:\n"
+        "It is broken.\n"
+    )
+
+    assert messages[0].includes == [
+        Include("src/main.py"), Include("~/logs/error.log")
+    ]
+    assert messages[1].includes == []
+    assert split_includes(messages[0].content) == [
+        "Explain this:\n",
+        Include("src/main.py"),
+        "\n",
+        Include("~/logs/error.log"),
+        "\n",
+    ]
+
+
+def test_includes_are_relative_to_the_session(tmp_path: Path) -> None:
+    (tmp_path / "main.py").write_text("print('hello')\n")
+    messages = Parser().parse("@@> user:\n@@< main.py\n")
+
+    resolved = resolve_includes(messages, str(tmp_path))
+
+    assert resolved == messages
+    assert resolved[0].includes[0].data == b"print('hello')\n"
+    assert resolved[0].includes[0].inline().startswith('<file name="main.py">')
+
+
+def test_file_cache_uploads_once(tmp_path: Path) -> None:
+    path = tmp_path / "main.py"
+    path.write_text("print('hello')\n")
+    cache = FileCache(str(tmp_path / "files.json"))
+    uploaded: List[str] = []
+
+    def upload(include: Include) -> Tuple[str, Optional[float]]:
+        uploaded.append(include.path)
+        return f"file-{len(uploaded)}", None
+
+    first = cache.upload("Google", Include(str(path)), upload)
+    second = cache.upload("Google", Include(str(path)), upload)
+    other = cache.upload("OpenAI", Include(str(path)), upload)
+
+    assert (first, second, other) == ("file-1", "file-1", "file-2")
+    assert FileCache(cache.filename).get(
+        "Google", Include(str(path)).digest
+    ) == "file-1"
+
+
+def test_file_cache_is_keyed_by_api_key(tmp_path: Path) -> None:
+    path = tmp_path / "main.py"
+    path.write_text("print('hello')\n")
+    cache = FileCache(str(tmp_path / "files.json"))
+    uploaded: List[str] = []
+
+    def upload(include: Include) -> Tuple[str, Optional[float]]:
+        uploaded.append(include.path)
+        return f"file-{len(uploaded)}", None
+
+    first = cache.upload(account("OpenAI", "key"), Include(str(path)), upload)
+    other = cache.upload(account("OpenAI", "new"), Include(str(path)), upload)
+
+    assert (first, other) == ("file-1", "file-2")
+    assert "key" not in account("OpenAI", "key")
+
+
+def test_file_caches_do_not_wait_for_uploads(tmp_path: Path) -> None:
+    path = tmp_path / "main.py"
+    path.write_text("print('hello')\n")
+    filename = str(tmp_path / "files.json")
+    uploading = threading.Event()
+    release = threading.Event()
+    uploaded: List[str] = []
+
+    def upload(include: Include) -> Tuple[str, Optional[float]]:
+        uploaded.append(include.path)
+        file_id = f"file-{len(uploaded)}"
+        if file_id == "file-1":
+            uploading.set()
+            release.wait(5)
+        return file_id, None
+
+    # separate caches on the same file, like the clients of two processes
+    ids: List[str] = []
+    threads = [
+        threading.Thread(target=lambda: ids.append(
+            FileCache(filename).upload("Google", Include(str(path)), upload)
+        ))
+        for _ in range(2)
+    ]
+    threads[0].start()
+    uploading.wait(5)
+    threads[1].start()
+    # the second upload is not held up by the first one
+    threads[1].join(5)
+    assert ids == ["file-2"]
+    release.set()
+    threads[0].join(5)
+
+    assert ids == ["file-2", "file-2"]
+    assert uploaded == [str(path), str(path)]
+    assert FileCache(filename).get(
+        "Google", Include(str(path)).digest
+    ) == "file-2"
+
+
+def test_anthropic_caches_up_to_last_include(tmp_path: Path) -> None:
+    path = tmp_path / "main.py"
+    path.write_text("print('hello')\n")
+    messages = Parser().parse(
+        f"@@> user:\nExplain this:\n@@< {path}\n"
+    )
+
+    params = _message_params(messages)
+
+    blocks = list(params[0]["content"])
+    assert blocks[0] == {"type": "text", "text": "Explain this:\n"}
+    assert blocks[1] == {
+        "type": "text",
+        "text": f'<file name="{path}">\nprint(\'hello\')\n</file>',
+        "cache_control": {"type": "ephemeral"},
+    }
+
+
+def test_google_only_expands_user_includes(tmp_path: Path) -> None:
+    messages = Parser().parse(
+        "@@> user:\nHow do I include a file?\n"
+        "@@> assistant:\nWrite a line like:\n@@< notes.md\n"
+        "@@> user:\nThanks\n"
+    )
+    google = Google(
+        system_prompt="",
+        api_key="key",
+        model="gemini-2.5-pro",
+        file_cache=FileCache(str(tmp_path / "files.json"))
+    )
+
+    contents = google._contents(messages)
+
+    assert contents[1] == "Write a line like:\n@@< notes.md\n"
@@ -1,8 +1,24 @@
+import dataclasses
+import io
+import re
+import zlib
 from unittest.mock import MagicMock
 
 from pytest import mark
+from pytest import raises
 
+from dotchatbot.client.local import Local
+from dotchatbot.input.transformer import Message
+from dotchatbot.output.file import _hash_messages
+from dotchatbot.output.file import generate_file_content
 from dotchatbot.output.file import generate_filename
+from dotchatbot.output.file import write_file_content
+
+MESSAGES = [
+    Message(role="user", content="  Hello, wörld\n\n"),
+    Message(role="assistant", content="Hi!\n```\ncode\n```"),
+    Message(role="user", content=""),
+]
 
 
 @mark.parametrize(
@@ -20,3 +36,57 @@ def test_generate_filename(summary: str, expected: str) -> None:
     assert generate_filename(
         mock_client, 'Summarize', [], '.dcb'
     ) == expected
+
+
+def test_generate_filename_local_summary() -> None:
+    messages = [
+        Message(
+            role="user",
+            content="How do I cancel an asyncio task in Python?"
+        ),
+        Message(
+            role="assistant",
+            content="Call task.cancel() and await the asyncio task; the "
+                    "task receives CancelledError. Python's asyncio "
+                    "handles the cancellation."
+        ),
+    ]
+
+    filename = generate_filename(
+        Local("system"), 'Summarize', messages, '.dcb'
+    )
+
+    assert re.fullmatch(r"[a-z0-9\-]+-[0-9a-f]{5}\.dcb", filename)
+    assert filename.startswith("task-asyncio-")
+
+
+def test_write_file_content_matches_generated_content() -> None:
+    f = io.StringIO()
+    write_file_content(MESSAGES, f)
+
+    assert f.getvalue() == generate_file_content(MESSAGES) == (
+        "@@> user:\nHello, wörld\n\n"
+        "@@> assistant:\nHi!\n```\ncode\n```\n\n"
+        "@@> user:\n\n\n"
+    )
+    assert generate_file_content([]) == ""
+
+
+def test_hash_messages_is_crc32_of_all_content() -> None:
+    data = "".join(message.content for message in MESSAGES).encode("utf-8")
+    expected = format(zlib.crc32(data), "x").zfill(5)[:5]
+
+    assert _hash_messages(MESSAGES) == expected
+    assert _hash_messages(iter(MESSAGES)) == expected
+
+
+def test_message_is_immutable_with_cached_digest() -> None:
+    message = Message(role="user", content="Hello")
+
+    with raises(dataclasses.FrozenInstanceError):
+        message.content = "Changed"  # type: ignore[misc]
+    assert not hasattr(message, "__dict__")
+    assert message.digest is message.digest
+    assert message == Message(role="user", content="Hello")
+    assert message.digest == Message(role="user", content="Hello").digest
+    assert message.digest != Message(role="assistant", content="Hello").digest
@@ -0,0 +1,117 @@
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Iterator
+from typing import List
+
+from pytest import raises
+
+from dotchatbot.client.anthropic import _message_params
+from dotchatbot.client.pipeline import complete_lines
+from dotchatbot.client.pipeline import parse_line
+from dotchatbot.client.services import ServiceClient
+from dotchatbot.input.transformer import Message
+
+
+class SlowEcho(ServiceClient):
+    def __init__(self) -> None:
+        super().__init__(system_prompt="")
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def create_chat_completion(self, messages: List[Message]) -> Message:
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        content = messages[-1].content
+        time.sleep(float(content) / 100)
+        with self.lock:
+            self.in_flight -= 1
+        return Message(role="assistant", content=content)
+
+
+def _line(content: str) -> str:
+    return json.dumps([{"role": "user", "content": content}]) + "\n"
+
+
+def _no_sessions(filename: str) -> List[Message]:
+    raise FileNotFoundError(filename)
+
+
+def test_results_keep_input_order_with_bounded_concurrency() -> None:
+    client = SlowEcho()
+    delays = ["5", "1", "4", "0", "3", "2", "1", "0"]
+
+    results = list(complete_lines(
+        client, map(_line, delays), _no_sessions, concurrency=3
+    ))
+
+    assert [result["index"] for result in results] == list(range(8))
+    assert [result["message"]["content"] for result in results] == delays
+    assert client.max_in_flight <= 3
+
+
+def test_errors_are_reported_per_line() -> None:
+    lines = [
+        _line("0"),
+        "\n",
+        "not json\n",
+        json.dumps([{"role": "robot", "content": "hi"}]) + "\n",
+        json.dumps("missing.dcb") + "\n",
+        _line("0"),
+    ]
+
+    results = list(complete_lines(SlowEcho(), lines, _no_sessions))
+
+    assert [result["index"] for result in results] == [0, 2, 3, 4, 5]
+    assert "message" in results[0] and "message" in results[-1]
+    assert "Invalid role: robot" == results[2]["error"]
+    assert "missing.dcb" in results[3]["error"]
+
+
+def test_stopping_early_cancels_the_rest() -> None:
+    client = SlowEcho()
+    read: List[int] = []
+    readers: List[threading.Thread] = []
+
+    def lines() -> Iterator[str]:
+        readers.append(threading.current_thread())
+        for index in range(100):
+            read.append(index)
+            yield _line("0")
+
+    results = complete_lines(client, lines(), _no_sessions, concurrency=2)
+    assert next(results)["index"] == 0
+    stopper = threading.Thread(target=results.close)
+    stopper.start()
+    stopper.join(5)
+
+    assert not stopper.is_alive()
+    # the thread reading the lines is not left waiting for a slot
+    readers[0].join(5)
+    assert not readers[0].is_alive()
+    # at most the lines holding a slot, and the one waiting for it
+    assert len(read) <= 4
+
+
+def test_parse_line_loads_session_paths() -> None:
+    messages = [Message(role="user", content="hello")]
+
+    assert parse_line('"session.dcb"', lambda path: messages) == messages
+    with raises(ValueError):
+        parse_line('{"role": "user"}', lambda path: messages)
+
+
+def test_json_messages_do_not_read_included_files(tmp_path: Path) -> None:
+    secret = tmp_path / "secret.txt"
+    secret.write_text("secret\n")
+    line = _line(f"@@< {secret}")
+
+    messages = parse_line(line, _no_sessions)
+
+    assert messages[0].includes == []
+    assert _message_params(messages) == [
+        {"role": "user", "content": f"@@< {secret}"}
+    ]
@@ -0,0 +1,221 @@
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from typing import Iterator
+from typing import List
+from unittest.mock import MagicMock
+
+import httpx
+import openai
+from pytest import raises
+
+from dotchatbot.client.factory import create_client
+from dotchatbot.client.ratelimit import RateLimited
+from dotchatbot.client.ratelimit import retry_after
+from dotchatbot.client.ratelimit import TokenBucket
+from dotchatbot.client.ratelimit import transient
+from dotchatbot.client.services import ServiceClient
+from dotchatbot.input.transformer import Message
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+        self.sleeps: List[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _rate_limit_error(headers: dict[str, str]) -> openai.RateLimitError:
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat")
+    response = httpx.Response(429, headers=headers, request=request)
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def _server_error() -> openai.InternalServerError:
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat")
+    response = httpx.Response(503, request=request)
+    return openai.InternalServerError(
+        "unavailable", response=response, body=None
+    )
+
+
+def _bucket(tmp_path: Path, clock: Clock) -> TokenBucket:
+    return TokenBucket(
+        str(tmp_path / "openai.json"), 60, clock=clock, sleep=clock.sleep
+    )
+
+
+def _client(**calls: Any) -> MagicMock:
+    client = MagicMock(spec=ServiceClient)
+    client.system_prompt = "system"
+    client.usage = None
+    client.latency = None
+    for name, side_effect in calls.items():
+        getattr(client, name).side_effect = side_effect
+    return client
+
+
+def test_bucket_is_shared_through_its_file(tmp_path: Path) -> None:
+    clock = Clock()
+    filename = str(tmp_path / "openai.json")
+    first = TokenBucket(filename, 2, clock=clock, sleep=clock.sleep)
+    second = TokenBucket(filename, 2, clock=clock, sleep=clock.sleep)
+
+    waits = [first.acquire(), second.acquire(), first.acquire()]
+
+    # two requests per minute: the third waits for half a minute
+    assert waits == [0, 0, 30]
+
+
+def test_block_holds_back_other_buckets(tmp_path: Path) -> None:
+    clock = Clock()
+    filename = str(tmp_path / "openai.json")
+    TokenBucket(filename, 60, clock=clock).block(5)
+
+    assert TokenBucket(filename, 60, clock=clock, sleep=clock.sleep) \
+        .acquire() == 5
+
+
+def test_retry_after() -> None:
+    assert retry_after(_rate_limit_error({"retry-after": "7"})) == 7
+    assert retry_after(_rate_limit_error({"retry-after-ms": "1500"})) == 1.5
+    assert retry_after(_rate_limit_error({})) == 0
+    assert retry_after(ValueError("Empty response")) is None
+    assert retry_after(_server_error()) is None
+
+
+def test_transient() -> None:
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat")
+    connection_error = openai.APIConnectionError(request=request)
+    connection_error.__cause__ = httpx.ConnectError("refused")
+
+    assert transient(_server_error())
+    assert transient(connection_error)
+    assert transient(httpx.ReadTimeout("timed out"))
+    assert not transient(_rate_limit_error({}))
+    assert not transient(ValueError("Empty response"))
+
+
+def test_rate_limited_retries_after_429(tmp_path: Path) -> None:
+    clock = Clock()
+    bucket = TokenBucket(
+        str(tmp_path / "openai.json"), 60, clock=clock, sleep=clock.sleep
+    )
+    client = MagicMock(spec=ServiceClient)
+    client.system_prompt = "system"
+    client.usage = None
+    client.latency = None
+    response = Message(role="assistant", content="hello")
+    client.create_chat_completion.side_effect = [
+        _rate_limit_error({"retry-after": "3"}), response
+    ]
+
+    assert RateLimited(client, bucket).create_chat_completion([]) == response
+    assert clock.sleeps == [3]
+
+    client.create_chat_completion.side_effect = ValueError("Empty response")
+    with raises(ValueError):
+        RateLimited(client, bucket).create_chat_completion([])
+
+
+def test_rate_limited_retries_server_errors(tmp_path: Path) -> None:
+    clock = Clock()
+    bucket = _bucket(tmp_path, clock)
+    response = Message(role="assistant", content="hello")
+    client = _client(create_chat_completion=[
+        _server_error(), httpx.ConnectError("refused"), response
+    ])
+
+    assert RateLimited(client, bucket).create_chat_completion([]) == response
+    assert clock.sleeps == [1, 2]
+    # only the failed request backed off, the bucket is not blocked
+    assert TokenBucket(bucket.filename, 60, clock=clock).acquire() == 0
+
+
+def test_rate_limited_stream_retries(tmp_path: Path) -> None:
+    clock = Clock()
+    bucket = _bucket(tmp_path, clock)
+    client = _client(stream_chat_completion=[
+        _rate_limit_error({"retry-after": "3"}), iter(["hel", "lo"])
+    ])
+
+    chunks = list(RateLimited(client, bucket).stream_chat_completion([]))
+
+    assert chunks == ["hel", "lo"]
+    assert clock.sleeps == [3]
+
+
+def test_rate_limited_stream_is_not_retried_once_started(
+    tmp_path: Path
+) -> None:
+    def interrupted(messages: List[Message]) -> Iterator[str]:
+        yield "hel"
+        raise _server_error()
+
+    clock = Clock()
+    client = _client(stream_chat_completion=interrupted)
+
+    with raises(openai.InternalServerError):
+        list(RateLimited(client, _bucket(tmp_path, clock))
+             .stream_chat_completion([]))
+    assert client.stream_chat_completion.call_count == 1
+
+
+def test_sdk_leaves_retries_to_the_wrapper(tmp_path: Path) -> None:
+    requests: List[str] = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:
+            requests.append(self.path)
+            self.rfile.read(int(self.headers["Content-Length"]))
+            body = b'{"error": {"message": "rate limited"}}'
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    client = create_client(
+        service_name="OpenAI",
+        system_prompt="system",
+        api_key="key",
+        openai_model="gpt-4o",
+        anthropic_model="claude-3-7-sonnet-latest",
+        anthropic_max_tokens=1024,
+        google_model="",
+        base_url=f"http://{host!s}:{port}/v1",
+        max_retries=0
+    )
+    clock = Clock()
+    bucket = TokenBucket(
+        str(tmp_path / "openai.json"), 60, clock=clock, sleep=clock.sleep
+    )
+
+    try:
+        with raises(openai.RateLimitError):
+            RateLimited(client, bucket, retries=2).create_chat_completion(
+                [Message(role="user", content="hello")]
+            )
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # one request per attempt: the first one and two retries
+    assert requests == ["/v1/chat/completions"] * 3
+    assert clock.sleeps == [1, 2]
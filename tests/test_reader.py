@@ -0,0 +1,70 @@
+from pathlib import Path
+
+from pytest import fixture
+from pytest import mark
+
+from dotchatbot.input.parser import Parser
+from dotchatbot.input.reader import SessionReader
+from dotchatbot.input.transformer import Message
+
+
+@fixture
+def parser() -> Parser:
+    return Parser()
+
+
+DOCUMENTS = [
+    "",
+    "\n\n",
+    "some content\n",
+    "\n\nsome content\n",
+    "@@> user:\n"
+    "test\n"
+    "this\n",
+    "@@> user:\n"
+    "one\n"
+    "@@> assistant:\n"
+    "two @@> not a header\n"
+    "@@> user:\n"
+    "three\n",
+    "@@> user:\n\n"
+    "one\n\n"
+    "@@> assistant:\n\n"
+    "two\n\n",
+]
+
+
+@mark.parametrize("content", DOCUMENTS)
+def test_reader_matches_parser(
+    parser: Parser, tmp_path: Path, content: str
+) -> None:
+    path = tmp_path / "session.dcb"
+    path.write_text(content)
+    expected = parser.parse(content)
+
+    with SessionReader(str(path)) as reader:
+        assert list(reader) == expected
+        assert list(reversed(reader)) == list(reversed(expected))
+        assert len(reader) == len(expected)
+
+
+def test_reader_tail(tmp_path: Path) -> None:
+    path = tmp_path / "session.dcb"
+    path.write_text(
+        "@@> user:\none\n"
+        "@@> assistant:\ntwo\n"
+        "@@> user:\nthree\n"
+    )
+
+    with SessionReader(str(path)) as reader:
+        assert reader.tail(2) == [
+            Message(role="assistant", content="two\n"),
+            Message(role="user", content="three\n"),
+        ]
+        assert reader.tail(10) == list(reader)
+        assert reader.tail(0) == []
+        assert reader.tail_offset(1) == 33
+        assert reader.tail_offset(2) == 14
+        assert reader.tail_offset(10) == 0
+        assert reader.tail_offset(0) == 49
+        assert list(reader.before(1)) == list(reader)[:2]
@@ -0,0 +1,119 @@
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import List
+from typing import Tuple
+from unittest.mock import patch
+
+from pytest import fixture
+
+from dotchatbot.history.related import RelatedIndex
+from dotchatbot.input.transformer import Message
+
+
+def _messages(content: str) -> list[Message]:
+    return [Message(role="user", content=content)]
+
+
+@fixture
+def index(tmp_path: Path) -> RelatedIndex:
+    index = RelatedIndex(str(tmp_path / "related"))
+    index.add("python.dcb", _messages("asyncio task cancellation in python"))
+    index.add("rust.dcb", _messages("rust borrow checker lifetimes"))
+    index.add("bread.dcb", _messages("sourdough bread starter hydration"))
+    return index
+
+
+def test_query_ranks_similar_sessions(index: RelatedIndex) -> None:
+    results = index.query("how do I cancel a python asyncio task?", 2)
+
+    assert len(results) == 2
+    assert Path(results[0][0]).name == "python.dcb"
+    assert results[0][1] > 0.5
+
+
+def test_add_updates_existing_session(index: RelatedIndex) -> None:
+    index.add("rust.dcb", _messages("baking bread with a sourdough starter"))
+
+    results = index.query("sourdough starter", 3)
+
+    assert len(index.paths()) == 3
+    assert {Path(path).name for path, _ in results[:2]} == {
+        "rust.dcb", "bread.dcb"
+    }
+
+
+def test_rebuild(index: RelatedIndex) -> None:
+    count = index.rebuild([("bread.dcb", _messages("sourdough"))])
+
+    assert count == 1
+    assert [Path(path).name for path in index.paths()] == ["bread.dcb"]
+
+
+def test_paths_appended_by_another_index(index: RelatedIndex) -> None:
+    other = RelatedIndex(index.location)
+    assert len(other.paths()) == 3
+
+    index.add("rust.dcb", _messages("rust traits"))
+    index.add("go.dcb", _messages("goroutines and channels"))
+    other.add("zig.dcb", _messages("comptime"))
+
+    assert [Path(path).name for path in other.paths()] == [
+        "python.dcb", "rust.dcb", "bread.dcb", "go.dcb", "zig.dcb"
+    ]
+    index.rebuild([("bread.dcb", _messages("sourdough"))])
+    assert [Path(path).name for path in other.paths()] == ["bread.dcb"]
+
+
+def test_query_during_rebuild_waits_for_it(index: RelatedIndex) -> None:
+    other = RelatedIndex(index.location)
+    replace = os.replace
+    results: List[List[Tuple[str, float]]] = []
+    waited: List[bool] = []
+
+    def replacing(source: str, destination: str) -> None:
+        replace(source, destination)
+        if destination == index.vectors_file:
+            # new vectors, old paths: the reader must not pair them
+            thread = threading.Thread(
+                target=lambda: results.append(other.query("sourdough", 3))
+            )
+            thread.start()
+            thread.join(0.2)
+            waited.append(thread.is_alive())
+            threads.append(thread)
+
+    threads: List[threading.Thread] = []
+    with patch("dotchatbot.history.related.os.replace", replacing):
+        index.rebuild([("bread.dcb", _messages("sourdough"))])
+    threads[0].join(5)
+
+    assert waited == [True]
+    assert [Path(path).name for path, _ in results[0]] == ["bread.dcb"]
+
+
+def test_add_drops_vectors_without_paths(index: RelatedIndex) -> None:
+    # an add interrupted between writing the vector and the path
+    with open(index.vectors_file, "ab") as f:
+        f.write(b"\0" * index.dimensions * 4)
+
+    index.add("go.dcb", _messages("goroutines and channels"))
+
+    assert Path(index.paths()[-1]).name == "go.dcb"
+    assert index.query("goroutines", 1)[0][0] == index.paths()[-1]
+
+
+def test_numpy_is_not_imported_at_startup() -> None:
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, dotchatbot.dcb; print('numpy' in sys.modules)"
+        ],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    assert result.stdout.strip() == "False"
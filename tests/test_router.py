@@ -0,0 +1,128 @@
+from pathlib import Path
+
+from pytest import fixture
+from pytest import mark
+
+from dotchatbot.client.router import LatencyStats
+from dotchatbot.client.router import Router
+from dotchatbot.client.services import Usage
+from dotchatbot.input.transformer import Message
+
+
+@fixture
+def stats(tmp_path: Path) -> LatencyStats:
+    return LatencyStats(str(tmp_path / "route-stats.json"))
+
+
+@fixture
+def router(stats: LatencyStats) -> Router:
+    return Router(quick="quick:model", main="main:model", stats=stats)
+
+
+@mark.parametrize("prompt, model", [
+    ("What is the capital of France?", "quick"),
+    ("Why does this fail?\n```\nimport foo\n```", "main"),
+    ("Explain how a B-tree is balanced", "main"),
+    ("Summarize this\n@@< notes.txt", "main"),
+    ("word " * 100, "main"),
+])
+def test_router_prompt_features(
+    router: Router, prompt: str, model: str
+) -> None:
+    messages = [Message(role="user", content=prompt)]
+    assert router.route(messages).model == model
+
+
+def test_router_long_conversation(router: Router) -> None:
+    messages = [Message(role="user", content="ok")] * 20
+    decision = router.route(messages)
+    assert decision.model == "main"
+    assert "20 messages" in decision.reason
+
+
+def test_router_prefers_main_when_quick_is_not_faster(
+    router: Router, stats: LatencyStats
+) -> None:
+    router.record("quick", 3.0)
+    router.record("main", 2.0)
+    messages = [Message(role="user", content="What time is it in Tokyo?")]
+    assert router.route(messages).model == "main"
+    assert stats.latency("quick/quick:model") == 3.0
+
+
+def test_router_with_the_same_model(stats: LatencyStats) -> None:
+    router = Router(quick="OpenAI:gpt-4o", main="OpenAI:gpt-4o", stats=stats)
+    router.record("quick", 1.0)
+    router.record("main", 2.0)
+    messages = [Message(role="user", content="What time is it in Tokyo?")]
+
+    decision = router.route(messages)
+
+    assert decision.model == "main"
+    assert "also OpenAI:gpt-4o" in decision.reason
+    assert stats.latency("quick/OpenAI:gpt-4o") == 1.0
+    assert stats.latency("main/OpenAI:gpt-4o") == 2.0
+
+
+def test_latency_stats_are_averaged_and_persisted(
+    stats: LatencyStats
+) -> None:
+    stats.record("main:model", 1.0, Usage(input_tokens=1, output_tokens=10))
+    stats.record("main:model", 2.0, Usage(input_tokens=1, output_tokens=20))
+
+    reloaded = LatencyStats(stats.filename)
+    assert reloaded.latency("main:model") == 1.2
+    assert reloaded.stats["main:model"]["count"] == 2
+    assert reloaded.stats["main:model"]["tokens"] == 12
+    assert reloaded.latency("quick:model") is None
+
+
+def test_router_compares_latency_per_output_token(
+    router: Router, stats: LatencyStats
+) -> None:
+    router.record("quick", 3.0, Usage(input_tokens=1, output_tokens=300))
+    router.record("main", 2.0, Usage(input_tokens=1, output_tokens=20))
+    messages = [Message(role="user", content="What time is it in Tokyo?")]
+
+    assert router.route(messages).model == "quick"
+
+
+def test_router_samples_the_quick_model_again(stats: LatencyStats) -> None:
+    router = Router(
+        quick="quick:model", main="main:model", stats=stats, sample_every=2
+    )
+    router.record("quick", 3.0)
+    router.record("main", 2.0)
+    messages = [Message(role="user", content="What time is it in Tokyo?")]
+
+    models = [router.route(messages).model for _ in range(3)]
+    router.record("quick", 1.0)
+
+    assert models == ["main", "main", "quick"]
+    assert router.route(messages).model == "main"
+    assert LatencyStats(stats.filename).skipped("quick/quick:model") == 1
+
+
+def test_latency_stats_without_usage_keep_the_time_per_token(
+    stats: LatencyStats
+) -> None:
+    stats.record("main:model", 2.0, Usage(input_tokens=1, output_tokens=20))
+    stats.record("main:model", 12.0)
+
+    assert stats.per_token("main:model") == 0.1
+    assert stats.latency("main:model") == 4.0
+    stats.record("quick:model", 1.0)
+    assert stats.per_token("quick:model") is None
+
+
+def test_latency_stats_drop_malformed_entries(stats: LatencyStats) -> None:
+    with open(stats.filename, "w") as f:
+        f.write(
+            '{"a": 1, "b": {"latency": "slow"}, "c": {"count": 1}, '
+            '"d": {"count": 1, "latency": 2.0}}'
+        )
+    assert stats.stats == {"d": {"count": 1, "latency": 2.0}}
+
+    with open(stats.filename, "w") as f:
+        f.write('[1, 2]')
+    assert LatencyStats(stats.filename).stats == {}
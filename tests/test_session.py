@@ -0,0 +1,89 @@
+import asyncio
+from pathlib import Path
+from typing import List
+
+from pytest import raises
+
+from dotchatbot.client.local import Local
+from dotchatbot.client.services import ServiceClient
+from dotchatbot.input.transformer import Message
+from dotchatbot.session import Session
+
+
+class EchoClient(ServiceClient):
+    def __init__(self) -> None:
+        super().__init__(system_prompt="")
+        self.calls = 0
+
+    def create_chat_completion(self, messages: List[Message]) -> Message:
+        self.calls += 1
+        return Message(role="assistant", content=messages[-1].content.upper())
+
+
+def test_session_complete_and_save(tmp_path: Path) -> None:
+    history = tmp_path / "history"
+    session = Session(
+        EchoClient(), summary_client=Local(""), history_file=str(history)
+    )
+
+    session.append("hello sourdough bread")
+    assert session.complete() == Message(
+        role="assistant", content="HELLO SOURDOUGH BREAD"
+    )
+    filename = session.save(location=str(tmp_path))
+
+    assert Path(filename).name.startswith("hello-sourdough-bread-")
+    assert history.read_text() == f"{filename}\n"
+    loaded = Session(EchoClient()).load(filename)
+    assert [m.content.strip() for m in loaded.messages] == [
+        "hello sourdough bread", "HELLO SOURDOUGH BREAD"
+    ]
+    assert loaded.filename == filename
+
+
+def test_session_reuses_client_across_calls() -> None:
+    client = EchoClient()
+    session = Session(client)
+
+    session.parse("@@> user:\none\n")
+    asyncio.run(session.acomplete())
+    session.append("two")
+    assert "".join(session.stream()) == "TWO"
+
+    assert client.calls == 2
+    assert [m.role for m in session.messages] == [
+        "user", "assistant", "user", "assistant"
+    ]
+
+
+def test_session_rejects_empty_message() -> None:
+    session = Session(EchoClient())
+    session.append("   ")
+
+    with raises(ValueError):
+        session.complete()
+
+
+def test_session_checks_includes_next_to_its_file(tmp_path: Path) -> None:
+    (tmp_path / "notes.md").write_text("notes\n")
+    session = Session(EchoClient(), filename=str(tmp_path / "session.dcb"))
+    session.append("Summarize\n@@< notes.md\n")
+
+    session.check()
+    assert session.messages[-1].includes[0].data == b"notes\n"
+
+    session.append("And this\n@@< missing.md\n")
+    with raises(ValueError, match="Included file not found: missing.md"):
+        session.complete()
+
+
+def test_session_create_passes_options(tmp_path: Path) -> None:
+    history = tmp_path / "history"
+    session = Session.create(
+        "Local", history_file=str(history), extension=".md"
+    )
+
+    session.record("notes.md", [])
+
+    assert session.extension == ".md"
+    assert history.read_text() == f"{Path('notes.md').absolute()}\n"
@@ -0,0 +1,78 @@
+import os
+from pathlib import Path
+
+from pytest import fixture
+from pytest import raises
+
+from dotchatbot.input.reader import SessionReader
+from dotchatbot.input.transformer import Message
+from dotchatbot.output.store import is_manifest
+from dotchatbot.output.store import MessageStore
+
+MESSAGES = [
+    Message(role="user", content="one\n"),
+    Message(role="assistant", content="two\n"),
+]
+
+
+@fixture
+def store(tmp_path: Path) -> MessageStore:
+    return MessageStore(str(tmp_path / "store"))
+
+
+def _objects(store: MessageStore) -> list[str]:
+    return [
+        os.path.join(directory, name)
+        for directory, _, names in os.walk(store.location)
+        for name in names
+    ]
+
+
+def test_store_deduplicates_messages(store: MessageStore) -> None:
+    assert store.put(MESSAGES[0]) == store.put(MESSAGES[0])
+    assert len(_objects(store)) == 1
+    assert store.get(store.put(MESSAGES[0])) == MESSAGES[0]
+
+
+def test_manifest_roundtrip(store: MessageStore, tmp_path: Path) -> None:
+    path = str(tmp_path / "session.dcb")
+    store.write_manifest(path, MESSAGES)
+
+    assert is_manifest(path)
+    with store.open(path) as reader:
+        assert list(reader) == MESSAGES
+        assert list(reversed(reader)) == list(reversed(MESSAGES))
+        assert reader.tail(1) == MESSAGES[-1:]
+        assert list(reader.before(1)) == MESSAGES[:-1]
+
+
+def test_fork_plain_session(store: MessageStore, tmp_path: Path) -> None:
+    source = tmp_path / "source.dcb"
+    source.write_text("@@> user:\none\n@@> assistant:\ntwo\n")
+    first = str(tmp_path / "first.dcb")
+    second = str(tmp_path / "second.dcb")
+
+    with SessionReader(str(source)) as reader:
+        store.fork(reader, first)
+    with store.open(first) as reader:
+        store.fork(reader, second)
+
+    assert not is_manifest(str(source))
+    assert Path(first).read_text() == Path(second).read_text()
+    assert len(_objects(store)) == 2
+    with store.open(second) as reader:
+        assert list(reader) == MESSAGES
+
+
+def test_fork_refuses_existing_destination(
+    store: MessageStore, tmp_path: Path
+) -> None:
+    source = str(tmp_path / "source.dcb")
+    destination = tmp_path / "destination.dcb"
+    store.write_manifest(source, MESSAGES)
+    destination.write_text("@@> user:\nkeep me\n")
+
+    with store.open(source) as reader, raises(FileExistsError):
+        store.fork(reader, str(destination))
+
+    assert destination.read_text() == "@@> user:\nkeep me\n"
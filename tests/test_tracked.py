@@ -0,0 +1,98 @@
+from pathlib import Path
+from typing import List
+from typing import Optional
+
+from pytest import fixture
+
+from dotchatbot.input.parser import Parser
+from dotchatbot.input.tracked import TrackedSession
+from dotchatbot.input.transformer import Message
+from dotchatbot.output.file import generate_file_content
+
+
+class RecordingParser(Parser):
+    def __init__(self) -> None:
+        super().__init__()
+        self.documents: List[Optional[str]] = []
+
+    def parse(self, document: Optional[str]) -> List[Message]:
+        self.documents.append(document)
+        return super().parse(document)
+
+
+@fixture
+def parser() -> RecordingParser:
+    return RecordingParser()
+
+
+CONTENT = (
+    "@@> user:\none\n\n"
+    "@@> assistant:\ntwo\n\n"
+    "@@> user:\nthree\n"
+)
+
+
+def test_tracked_reparses_only_the_tail(
+    parser: RecordingParser, tmp_path: Path
+) -> None:
+    path = tmp_path / "session.dcb"
+    path.write_text(CONTENT)
+    tracked = TrackedSession(str(path), parser)
+    first = tracked.refresh()
+    assert first == parser.parse(CONTENT)
+
+    parser.documents.clear()
+    path.write_text(CONTENT + "three and a half\n")
+    messages = tracked.refresh()
+
+    assert messages == Parser().parse(CONTENT + "three and a half\n")
+    assert messages[0] is first[0]
+    assert parser.documents == ["@@> user:\nthree\nthree and a half\n"]
+
+
+def test_tracked_reparses_everything_after_earlier_edits(
+    parser: RecordingParser, tmp_path: Path
+) -> None:
+    path = tmp_path / "session.dcb"
+    path.write_text(CONTENT)
+    tracked = TrackedSession(str(path), parser)
+    tracked.refresh()
+
+    edited = CONTENT.replace("one", "uno")
+    path.write_text(edited)
+
+    assert tracked.refresh() == Parser().parse(edited)
+
+
+def test_tracked_unchanged_file_is_not_read(
+    parser: RecordingParser, tmp_path: Path
+) -> None:
+    path = tmp_path / "session.dcb"
+    path.write_text(CONTENT)
+    tracked = TrackedSession(str(path), parser)
+    tracked.refresh()
+    parser.documents.clear()
+
+    tracked.refresh()
+
+    assert parser.documents == []
+
+
+def test_tracked_append_and_saved(
+    parser: RecordingParser, tmp_path: Path
+) -> None:
+    path = tmp_path / "session.dcb"
+    path.write_text("@@> user:\none\n")
+    tracked = TrackedSession(str(path), parser)
+    tracked.refresh()
+
+    messages = [*tracked.messages, Message(role="assistant", content="two")]
+    path.write_text(generate_file_content(messages))
+    tracked.saved(messages)
+    tracked.append("@@> user:\n\n")
+    path.write_text(path.read_text() + "three\n")
+    messages = tracked.refresh()
+
+    assert [(m.role, m.content.strip()) for m in messages] == [
+        ("user", "one"), ("assistant", "two"), ("user", "three")
+    ]
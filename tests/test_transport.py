@@ -0,0 +1,91 @@
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import Any
+from typing import Generator
+from typing import List
+
+from pytest import fixture
+from pytest import MonkeyPatch
+
+from dotchatbot.client import transport
+from dotchatbot.client.openai import OpenAI
+from dotchatbot.client.transport import configure
+from dotchatbot.client.transport import http_client
+from dotchatbot.client.transport import TransportOptions
+from dotchatbot.client.transport import warm_up
+
+
+@fixture(autouse=True)
+def reset() -> Generator[None, Any, None]:
+    transport.close()
+    yield
+    transport.close()
+    configure(TransportOptions())
+
+
+@fixture
+def server() -> Generator[ThreadingHTTPServer, Any, None]:
+    requests: List[str] = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_HEAD(self) -> None:
+            requests.append(f"{self.command} {self.path}")
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.requests = requests  # type: ignore[attr-defined]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_clients_of_a_provider_share_a_transport() -> None:
+    first = OpenAI(system_prompt="", api_key="key", model="gpt-4o")
+    second = OpenAI(system_prompt="", api_key="key", model="gpt-4o-mini")
+
+    assert first.client._client._transport is transport.transport("OpenAI")
+    assert second.client._client._transport is transport.transport("OpenAI")
+    assert transport.transport("Google") is not transport.transport("OpenAI")
+
+
+def test_closing_a_client_keeps_the_shared_transport() -> None:
+    shared = transport.transport("Anthropic")
+    http_client("Anthropic").close()
+
+    assert transport.transport("Anthropic") is shared
+
+
+def test_configured_timeouts() -> None:
+    configure(TransportOptions(timeout=30.0, connect_timeout=2.0))
+
+    client = http_client("OpenAI")
+
+    assert client.timeout.read == 30.0
+    assert client.timeout.connect == 2.0
+
+
+def test_warm_up_leaves_a_pooled_connection(
+    server: ThreadingHTTPServer, monkeypatch: MonkeyPatch
+) -> None:
+    host, port = server.server_address[:2]
+    monkeypatch.setitem(
+        transport.BASE_URLS, "OpenAI", f"http://{host!s}:{port}"
+    )
+
+    for thread in warm_up(["OpenAI", "OpenAI", "Local"]):
+        thread.join()
+
+    assert server.requests == ["HEAD /"]  # type: ignore[attr-defined]
+    pool = transport.transport("OpenAI").transport._pool
+    assert len(pool.connections) == 1
@@ -0,0 +1,84 @@
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from pytest import mark
+from pytest import param
+
+from dotchatbot.dcb import _watch_turn
+from dotchatbot.history.related import RelatedIndex
+from dotchatbot.input.parser import Parser
+from dotchatbot.input.tracked import TrackedSession
+from dotchatbot.input.transformer import Message
+from dotchatbot.input.watch import Watcher
+from dotchatbot.session import Session
+
+BACKENDS = [
+    param(False, id="polling"),
+    param(
+        True,
+        id="inotify",
+        marks=mark.skipif(
+            not sys.platform.startswith("linux"),
+            reason="inotify is Linux only"
+        )
+    ),
+]
+
+
+@mark.parametrize("inotify", BACKENDS)
+def test_watcher_reports_changed_session_files(
+    tmp_path: Path, inotify: bool
+) -> None:
+    session = tmp_path / "session.dcb"
+    session.write_text("@@> user:\n")
+    watcher = Watcher(
+        [str(tmp_path)], debounce=0.05, interval=0.01, inotify=inotify
+    )
+    try:
+        assert watcher.backend == ("inotify" if inotify else "polling")
+        (tmp_path / "notes.txt").write_text("ignored")
+        session.write_text("@@> user:\nHello\n")
+        session.write_text("@@> user:\nHello!\n")
+
+        assert next(iter(watcher)) == [str(session)]
+        assert watcher.wait(0.05) == set()
+    finally:
+        watcher.close()
+
+
+def test_watch_turn_appends_response(tmp_path: Path) -> None:
+    path = tmp_path / "session.dcb"
+    path.write_text("@@> user:\nHello\n")
+    client = MagicMock()
+    client.create_chat_completion.return_value = Message(
+        role="assistant", content="Hi!"
+    )
+    parser = Parser()
+    session = Session(client, parser=parser)
+    tracked = TrackedSession(str(path), parser)
+
+    assert _watch_turn(session, tracked) == Message(
+        role="assistant", content="Hi!"
+    )
+    assert path.read_text() == (
+        "@@> user:\nHello\n\n@@> assistant:\nHi!\n\n@@> user:\n\n"
+    )
+    assert _watch_turn(session, tracked) is None
+    assert client.create_chat_completion.call_count == 1
+
+
+def test_watch_turn_indexes_the_session(tmp_path: Path) -> None:
+    path = tmp_path / "session.dcb"
+    path.write_text("@@> user:\nsourdough starter\n")
+    client = MagicMock()
+    client.create_chat_completion.return_value = Message(
+        role="assistant", content="Feed it daily."
+    )
+    parser = Parser()
+    related_index = RelatedIndex(str(tmp_path / "related"))
+    session = Session(client, parser=parser, related_index=related_index)
+
+    _watch_turn(session, TrackedSession(str(path), parser))
+
+    assert related_index.query("sourdough", 1)[0][0] == str(path)